@@ -0,0 +1,269 @@
+"""
+RBroker 压测与崩溃恢复测试.
+
+模拟多个消费者副本消费同一个 topic, 回调的耗时与失败率可配置, 并周期性地强制终止
+(不提交 ACK) 一个副本后再启动新的副本. 最终输出吞吐量、端到端延迟 p50/p99、重复投递次数、
+死信数量与崩溃后的恢复时间.
+
+用法:
+    ENV=local python -m benchmarks.broker_soak --backend memory --messages 5000
+    ENV=local python -m benchmarks.broker_soak --backend sentinel --kill-every 10
+"""
+
+import os
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import functools
+import logging
+import statistics
+from dataclasses import dataclass, field
+from typing import Any
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="RBroker soak test")
+    parser.add_argument("--backend", choices=["memory", "sentinel"], default="memory")
+    parser.add_argument("--messages", type=int, default=5000, help="消息总数")
+    parser.add_argument("--rate", type=float, default=0, help="每秒发送数, 0 为不限速")
+    parser.add_argument("--latency-ms", type=float, default=20, help="回调平均耗时")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="回调失败率")
+    parser.add_argument("--max-attempts", type=int, default=3, help="最大尝试次数")
+    parser.add_argument("--replicas", type=int, default=2, help="消费者副本数")
+    parser.add_argument("--count", type=int, default=2, help="每个副本的监听者数量")
+    parser.add_argument("--max-workers", type=int, default=10)
+    parser.add_argument("--min-workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--claim-idle-ms", type=int, default=3000)
+    parser.add_argument(
+        "--kill-every", type=float, default=0, help="每隔多少秒终止一个副本, 0 为不终止"
+    )
+    parser.add_argument("--timeout", type=float, default=300, help="最长运行秒数")
+    parser.add_argument(
+        "--recovery-timeout",
+        type=float,
+        default=60,
+        help="崩溃后等待未完成消息恢复的最长秒数, 超时计为未恢复",
+    )
+    return parser.parse_args()
+
+
+@dataclass
+class SoakStats:
+    deliveries: dict[int, int] = field(default_factory=dict)
+    latencies: dict[int, float] = field(default_factory=dict)
+    recoveries: list[float] = field(default_factory=list)
+    dead_lettered: set[int] = field(default_factory=set)
+    # 崩溃时未完成、最终进入死信队列的消息数
+    recovery_dead_lettered: int = 0
+    # 超过 recovery_timeout 仍未恢复的崩溃次数
+    unrecovered: int = 0
+    kills: int = 0
+
+    @property
+    def completed(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def redeliveries(self) -> int:
+        return sum(self.deliveries.values()) - len(self.deliveries)
+
+
+@dataclass
+class SoakReplica:
+    broker: Any
+    # 回调已开始但尚未完成的消息序号
+    active: set[int] = field(default_factory=set)
+
+
+class Soak:
+    def __init__(self, args: argparse.Namespace):
+        # 在导入 core 之前选择 Redis 后端
+        os.environ["REDIS_BACKEND"] = args.backend
+
+        from core.shared.components.redis.broker import RBroker, RbrokerRetryPolicy
+
+        self.args = args
+        self.topic = f"soak-{uuid.uuid4().hex[:8]}"
+        self.stats = SoakStats()
+        self.replicas: list[SoakReplica] = []
+        self.recoveries: set[asyncio.Task[None]] = set()
+        self.dlq_cursor = "-"
+        self.broker_class = RBroker
+        self.retry_policy = RbrokerRetryPolicy(
+            max_attempts=args.max_attempts, base_delay=0.2, max_delay=2.0
+        )
+        self.producer = RBroker()
+
+    async def callback(self, replica: SoakReplica, message: dict[str, Any]):
+        seq = message["seq"]
+        self.stats.deliveries[seq] = self.stats.deliveries.get(seq, 0) + 1
+
+        replica.active.add(seq)
+        try:
+            await asyncio.sleep(random.expovariate(1000 / self.args.latency_ms))
+            if random.random() < self.args.failure_rate:
+                raise RuntimeError(f"Synthetic failure on {seq}")
+
+            self.stats.latencies.setdefault(seq, time.time() - message["sent_at"])
+        finally:
+            replica.active.discard(seq)
+
+    async def start_replica(self):
+        replica = SoakReplica(broker=self.broker_class())
+        await replica.broker.consumer(
+            topic=self.topic,
+            callback=functools.partial(self.callback, replica),
+            count=self.args.count,
+            max_workers=self.args.max_workers,
+            min_workers=self.args.min_workers,
+            batch_size=self.args.batch_size,
+            claim_idle_ms=self.args.claim_idle_ms,
+            retry_policy=self.retry_policy,
+        )
+        self.replicas.append(replica)
+
+    async def crash_replica(self, replica: SoakReplica) -> set[int]:
+        """
+        强制终止副本, 不提交缓冲中的 ACK. 返回崩溃时回调正在处理的消息序号,
+        已读取但尚未开始处理的消息同样会被接管, 但不计入恢复时间.
+        """
+        unfinished = set(replica.active)
+        await replica.broker.shutdown(flush=False)
+
+        self.replicas.remove(replica)
+        self.stats.kills += 1
+        return unfinished
+
+    async def collect_dead_letters(self):
+        """增量读取死信队列中的消息序号."""
+        while entries := await self.producer.dlq_range(
+            self.topic, start=self.dlq_cursor, count=1000
+        ):
+            entries = [e for e in entries if e[0] != self.dlq_cursor]
+            if not entries:
+                break
+            for _, payload in entries:
+                self.stats.dead_lettered.add(payload.content["seq"])
+            self.dlq_cursor = entries[-1][0]
+
+    async def track_recovery(self, unfinished: set[int], killed_at: float):
+        """等待崩溃时未完成的消息完成或进入死信队列, 超过 recovery_timeout 计为未恢复."""
+        deadline = killed_at + self.args.recovery_timeout
+        while pending := unfinished - self.stats.latencies.keys():
+            if not pending - self.stats.dead_lettered:
+                break
+            if time.monotonic() >= deadline:
+                logging.warning(
+                    f"{len(pending)} messages were not recovered "
+                    f"within {self.args.recovery_timeout}s"
+                )
+                self.stats.unrecovered += 1
+                return
+            await asyncio.sleep(0.05)
+
+        self.stats.recovery_dead_lettered += len(unfinished & self.stats.dead_lettered)
+        self.stats.recoveries.append(time.monotonic() - killed_at)
+
+    async def chaos(self):
+        while True:
+            await asyncio.sleep(self.args.kill_every)
+            if not self.replicas:
+                continue
+
+            victim = random.choice(self.replicas)
+            killed_at = time.monotonic()
+            unfinished = await self.crash_replica(victim)
+            logging.warning(
+                f"Killed a replica with {len(unfinished)} unfinished messages"
+            )
+            recovery = asyncio.create_task(self.track_recovery(unfinished, killed_at))
+            self.recoveries.add(recovery)
+            recovery.add_done_callback(self.recoveries.discard)
+            await self.start_replica()
+
+    async def produce(self):
+        interval = 1 / self.args.rate if self.args.rate else 0
+        for seq in range(self.args.messages):
+            await self.producer.send(
+                self.topic, {"seq": seq, "sent_at": time.time()}
+            )
+            if interval:
+                await asyncio.sleep(interval)
+
+    async def run(self) -> dict[str, Any]:
+        for _ in range(self.args.replicas):
+            await self.start_replica()
+
+        started = time.monotonic()
+        producer = asyncio.create_task(self.produce())
+        chaos = (
+            asyncio.create_task(self.chaos()) if self.args.kill_every > 0 else None
+        )
+
+        while time.monotonic() - started < self.args.timeout:
+            await asyncio.sleep(0.2)
+            await self.collect_dead_letters()
+            finished = self.stats.latencies.keys() | self.stats.dead_lettered
+            if len(finished) >= self.args.messages:
+                break
+
+        elapsed = time.monotonic() - started
+
+        if chaos:
+            chaos.cancel()
+        producer.cancel()
+        # 恢复尚在等待中的崩溃在超时前已无法完成
+        self.stats.unrecovered += len(self.recoveries)
+        for recovery in list(self.recoveries):
+            recovery.cancel()
+        backlog = await self.producer.backlog([self.topic])
+        for replica in self.replicas:
+            await replica.broker.shutdown()
+
+        return self.report(elapsed, backlog)
+
+    def report(self, elapsed: float, backlog: int) -> dict[str, Any]:
+        latencies = sorted(self.stats.latencies.values())
+        quantiles = (
+            statistics.quantiles(latencies, n=100) if len(latencies) > 1 else []
+        )
+
+        return {
+            "backend": self.args.backend,
+            "messages": self.args.messages,
+            "completed": self.stats.completed,
+            "dead_lettered": len(self.stats.dead_lettered),
+            "lost": self.args.messages
+            - len(self.stats.latencies.keys() | self.stats.dead_lettered),
+            "backlog": backlog,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_s": round(self.stats.completed / elapsed, 1),
+            "latency_p50_ms": round(quantiles[49] * 1000, 1) if quantiles else None,
+            "latency_p99_ms": round(quantiles[98] * 1000, 1) if quantiles else None,
+            "redeliveries": self.stats.redeliveries,
+            "kills": self.stats.kills,
+            "unrecovered": self.stats.unrecovered,
+            "recovery_dead_lettered": self.stats.recovery_dead_lettered,
+            "recovery_max_s": round(max(self.stats.recoveries), 2)
+            if self.stats.recoveries
+            else None,
+            "recovery_avg_s": round(statistics.mean(self.stats.recoveries), 2)
+            if self.stats.recoveries
+            else None,
+        }
+
+
+async def main():
+    logging.basicConfig(level=logging.WARNING)
+    report = await Soak(parse_args()).run()
+
+    width = max(len(key) for key in report)
+    for key, value in report.items():
+        print(f"{key.ljust(width)}  {value}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
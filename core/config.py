@@ -53,6 +53,69 @@ class Settings(GlobalBaseEnv):
         examples=["..."], default=xyz_celery_env.CELERY_REDIS_SENTINEL_PASSWORD
     )
     REDIS_DB: str = Field(examples=["1"], default=xyz_celery_env.CELERY_REDIS_DB)
+    REDIS_BACKEND: Literal["sentinel", "memory"] = Field(
+        examples=["sentinel", "memory"],
+        default="sentinel",
+        description="Redis 后端. memory 为进程内实现, 仅用于本地基准测试与测试",
+    )
+
+    BROKER_DLQ_REPLAY_RATE: int = Field(
+        examples=[10], default=10, description="死信重放时每秒最多投递的消息数"
+    )
+    BROKER_RETENTION_MAX_AGE: int | None = Field(
+        examples=[604800],
+        default=None,
+        description="Stream 消息的最长保留秒数, 为空时仅裁剪已被 ACK 的消息",
+    )
+    BROKER_RETENTION_MAXLEN: int | None = Field(
+        examples=[1000000],
+        default=None,
+        description="Stream 的最大长度, 为空时仅裁剪已被 ACK 的消息",
+    )
+    LLM_LIMITS: dict[str, dict[str, int | None]] = Field(
+        examples=[{"gpt-4o": {"concurrency": 20, "tokensPerMinute": 300000}}],
+        default_factory=dict,
+        description=(
+            "按模型名称配置的 LLM 限流策略, 同一模型的每个 API Key 分别计数. "
+            "concurrency 为最大并发调用数, tokensPerMinute 为每分钟最多消耗的 token 数"
+        ),
+    )
+    LLM_DEFAULT_CONCURRENCY: int | None = Field(
+        examples=[10],
+        default=None,
+        description="未在 LLM_LIMITS 中配置的模型的最大并发调用数, 为空时不限制",
+    )
+    LLM_DEFAULT_TOKENS_PER_MINUTE: int | None = Field(
+        examples=[200000],
+        default=None,
+        description="未在 LLM_LIMITS 中配置的模型每分钟最多消耗的 token 数, 为空时不限制",
+    )
+    DISPATCH_REPLICAS: int = Field(
+        examples=[1, 3],
+        default=1,
+        description="调度器的副本数, 用于将集群内的会话并发与工作者槽位分摊到各副本",
+    )
+    DISPATCH_READY_WORKER_SLOTS: int | None = Field(
+        examples=[150],
+        default=None,
+        description=(
+            "集群内处理就绪任务的工作者槽位总数, 通常为副本数 × 单个副本的就绪消费者容量. "
+            "为空时按 DISPATCH_REPLICAS × 单个副本的容量 (监听者数 × 每个监听者的工作者数) 计算"
+        ),
+    )
+    BROKER_OUTBOX_ENABLED: bool = Field(
+        examples=[False, True],
+        default=False,
+        description=(
+            "就绪任务是否经由事务性发件箱投递. 启用前需在 xyz_databases 中完成 "
+            "broker_outbox 表的迁移 (表缺失时启动报错), 未启用时事务提交后直接发送到 Broker"
+        ),
+    )
+    BROKER_CODEC: Literal["json", "msgpack"] = Field(
+        examples=["json", "msgpack"],
+        default="json",
+        description="消息负载的编码格式. 所有副本都能解码各种格式, 切换前无需停机",
+    )
 
 
 env_helper = Settings()  # pyright: ignore[reportCallIssue]
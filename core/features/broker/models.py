@@ -0,0 +1,75 @@
+import datetime
+from typing import Any, Literal
+
+from pydantic import Field
+
+from core.shared.base.models import BaseModel
+from core.shared.components.redis.broker import RbrokerPayload
+
+
+class BrokerDLQEntryModel(BaseModel):
+    id: str
+    failed_at: datetime.datetime
+    exc_type: str | None = None
+    exc_message: str | None = None
+    metadata: dict[str, Any]
+    content: Any
+
+    @classmethod
+    def from_payload(
+        cls, message_id: str, rbroker_message: RbrokerPayload
+    ) -> "BrokerDLQEntryModel":
+        exc_info = rbroker_message.exc_info
+        # Stream ID 的前半部分即为写入死信队列时的毫秒时间戳
+        failed_at = datetime.datetime.fromtimestamp(
+            int(message_id.split("-")[0]) / 1000, tz=datetime.timezone.utc
+        )
+
+        return cls(
+            id=message_id,
+            failed_at=failed_at,
+            exc_type=exc_info.type if exc_info else None,
+            exc_message=exc_info.message if exc_info else None,
+            metadata=rbroker_message.metadata,
+            content=rbroker_message.content,
+        )
+
+
+class BrokerDLQPageModel(BaseModel):
+    entries: list[BrokerDLQEntryModel] = Field(default_factory=list)
+    next_cursor: str | None = Field(
+        default=None, description="下一页的游标, 为空表示已无更多记录"
+    )
+
+
+class BrokerDLQReplayModel(BaseModel):
+    message_ids: list[str] | None = Field(
+        default=None, description="需要重放的死信 ID, 为空表示重放所有符合筛选条件的死信"
+    )
+    exc_type: str | None = Field(default=None, description="按异常类型筛选")
+    start_time: datetime.datetime | None = Field(
+        default=None, description="按进入死信队列的时间筛选, 起始时间"
+    )
+    end_time: datetime.datetime | None = Field(
+        default=None, description="按进入死信队列的时间筛选, 结束时间"
+    )
+    rate_limit: int | None = Field(
+        default=None, ge=1, description="每秒最多重放的消息数, 为空时使用默认配置"
+    )
+
+
+class BrokerDLQReplayJobModel(BaseModel):
+    id: str
+    topic: str
+    state: Literal["running", "finished", "failed"] = "running"
+    rate_limit: int
+    scanned: int = Field(default=0, description="已扫描的死信数量")
+    replayed: int = Field(default=0, description="已重放的死信数量")
+    remaining: int | None = Field(default=None, description="死信队列中剩余的消息数量")
+    error: str | None = None
+    created_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc)
+    )
+    updated_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc)
+    )
@@ -0,0 +1,87 @@
+import datetime
+
+import fastapi
+
+from core.shared.models.http import ResponseModel
+from core.shared.components.redis.broker import RbrokerTopicInfo
+
+from . import service
+from .models import (
+    BrokerDLQPageModel,
+    BrokerDLQReplayModel,
+    BrokerDLQReplayJobModel,
+)
+
+
+controller = fastapi.APIRouter(prefix="/broker", tags=["Broker"])
+
+
+@controller.get(
+    path="/inspect",
+    name="查看 topic 的积压、挂起消息与消费者状态",
+    status_code=fastapi.status.HTTP_200_OK,
+    response_model=ResponseModel[list[RbrokerTopicInfo]],
+)
+async def inspect(
+    topic: str | None = fastapi.Query(default=None, description="为空时返回所有 topic"),
+) -> ResponseModel[list[RbrokerTopicInfo]]:
+    result = await service.inspect(topic=topic)
+    return ResponseModel(result=result)
+
+
+@controller.get(
+    path="/dlq/{topic}",
+    name="分页查看某个 topic 的死信队列",
+    status_code=fastapi.status.HTTP_200_OK,
+    response_model=ResponseModel[BrokerDLQPageModel],
+)
+async def get_dlq_page(
+    topic: str = fastapi.Path(description="Topic 名称, 如 ready-tasks"),
+    size: int = fastapi.Query(default=20, ge=1, le=100, description="单页数量"),
+    cursor: str | None = fastapi.Query(
+        default=None, description="上一页返回的 nextCursor"
+    ),
+    exc_type: str | None = fastapi.Query(default=None, description="异常类型"),
+    start_time: datetime.datetime | None = fastapi.Query(
+        default=None, description="进入死信队列的起始时间"
+    ),
+    end_time: datetime.datetime | None = fastapi.Query(
+        default=None, description="进入死信队列的结束时间"
+    ),
+) -> ResponseModel[BrokerDLQPageModel]:
+    page = await service.get_dlq_page(
+        topic=topic,
+        size=size,
+        cursor=cursor,
+        exc_type=exc_type,
+        start_time=start_time,
+        end_time=end_time,
+    )
+    return ResponseModel(result=page)
+
+
+@controller.post(
+    path="/dlq/{topic}/replay",
+    name="将死信重放回原 topic",
+    status_code=fastapi.status.HTTP_202_ACCEPTED,
+    response_model=ResponseModel[BrokerDLQReplayJobModel],
+)
+async def replay_dlq(
+    replay_model: BrokerDLQReplayModel,
+    topic: str = fastapi.Path(description="Topic 名称, 如 ready-tasks"),
+) -> ResponseModel[BrokerDLQReplayJobModel]:
+    job = await service.replay_dlq(topic=topic, replay_model=replay_model)
+    return ResponseModel(result=job)
+
+
+@controller.get(
+    path="/dlq-replay/{job_id}",
+    name="查看死信重放进度",
+    status_code=fastapi.status.HTTP_200_OK,
+    response_model=ResponseModel[BrokerDLQReplayJobModel],
+)
+async def get_replay_job(
+    job_id: str = fastapi.Path(description="重放任务 ID"),
+) -> ResponseModel[BrokerDLQReplayJobModel]:
+    job = await service.get_replay_job(job_id=job_id)
+    return ResponseModel(result=job)
@@ -0,0 +1,222 @@
+import time
+import asyncio
+import logging
+import datetime
+from collections.abc import AsyncGenerator
+
+from core.config import env_helper
+from core.shared.globals import broker, cacher
+from core.shared.components import RLease
+from core.shared.components.redis.broker import RbrokerPayload, RbrokerTopicInfo
+from core.shared.exceptions import (
+    ServiceNotFoundException,
+    ServiceInvalidMessageException,
+)
+from .models import (
+    BrokerDLQEntryModel,
+    BrokerDLQPageModel,
+    BrokerDLQReplayModel,
+    BrokerDLQReplayJobModel,
+)
+
+logger = logging.getLogger("Broker-Admin")
+
+# 单次分页最多扫描的死信数量, 避免筛选条件过窄时扫描整个死信队列
+DLQ_MAX_SCAN = 1000
+# 重放任务信息的保留时间
+REPLAY_JOB_TTL = 86400
+# 重放任务的 topic 锁, 任务每批次会续期, 进程退出后将自动过期
+REPLAY_LOCK_TTL = 60
+# 以 SET NX 原子地获取 topic 锁, 租约的 token 即为重放任务 ID
+replay_lease = RLease(prefix="broker-dlq-replay-lock", ttl_ms=REPLAY_LOCK_TTL * 1000)
+
+
+def _job_key(job_id: str) -> str:
+    return f"broker-dlq-replay-job:{job_id}"
+
+
+def _to_stream_id(dt: datetime.datetime) -> str:
+    return str(int(dt.timestamp() * 1000))
+
+
+def _is_match(rbroker_message: RbrokerPayload, exc_type: str | None) -> bool:
+    if exc_type is None:
+        return True
+    return (
+        rbroker_message.exc_info is not None
+        and rbroker_message.exc_info.type == exc_type
+    )
+
+
+def ensure_topic(topic: str) -> None:
+    if topic not in broker.topics:
+        raise ServiceNotFoundException(f"Topic: {topic} 不存在")
+
+
+async def get_dlq_page(
+    topic: str,
+    size: int,
+    cursor: str | None = None,
+    exc_type: str | None = None,
+    start_time: datetime.datetime | None = None,
+    end_time: datetime.datetime | None = None,
+) -> BrokerDLQPageModel:
+    """
+    按进入死信队列的时间正序分页查看死信.
+    """
+    ensure_topic(topic)
+
+    if cursor:
+        start = f"({cursor}"
+    else:
+        start = _to_stream_id(start_time) if start_time else "-"
+    end = _to_stream_id(end_time) if end_time else "+"
+
+    page = BrokerDLQPageModel()
+    scanned = 0
+
+    while scanned < DLQ_MAX_SCAN:
+        entries = await broker.dlq_range(topic, start=start, end=end, count=size)
+        if not entries:
+            return page
+
+        for message_id, rbroker_message in entries:
+            scanned += 1
+            page.next_cursor = message_id
+
+            if _is_match(rbroker_message, exc_type):
+                page.entries.append(
+                    BrokerDLQEntryModel.from_payload(message_id, rbroker_message)
+                )
+                if len(page.entries) >= size:
+                    return page
+
+        if len(entries) < size:
+            page.next_cursor = None
+            return page
+
+        start = f"({entries[-1][0]}"
+
+    # 扫描数量达到上限, 由调用方通过 next_cursor 继续翻页
+    return page
+
+
+async def _iter_replay_batches(
+    job: BrokerDLQReplayJobModel, replay_model: BrokerDLQReplayModel
+) -> AsyncGenerator[tuple[int, list[tuple[str, RbrokerPayload]]]]:
+    """按批次产出 (扫描数量, 符合条件的死信)."""
+    topic, batch_size = job.topic, job.rate_limit
+
+    if replay_model.message_ids is not None:
+        for i in range(0, len(replay_model.message_ids), batch_size):
+            message_ids = replay_model.message_ids[i : i + batch_size]
+            entries = await broker.dlq_get(topic, message_ids)
+            yield (
+                len(message_ids),
+                [
+                    entry
+                    for entry in entries
+                    if _is_match(entry[1], replay_model.exc_type)
+                ],
+            )
+        return
+
+    start = (
+        _to_stream_id(replay_model.start_time) if replay_model.start_time else "-"
+    )
+    # 重放后再次失败的消息会追加到死信队列末尾, 故只扫描任务创建前进入死信队列的消息
+    end = _to_stream_id(min(replay_model.end_time or job.created_at, job.created_at))
+
+    while True:
+        entries = await broker.dlq_range(topic, start=start, end=end, count=batch_size)
+        if not entries:
+            return
+
+        yield (
+            len(entries),
+            [entry for entry in entries if _is_match(entry[1], replay_model.exc_type)],
+        )
+
+        start = f"({entries[-1][0]}"
+
+
+async def _save_job(job: BrokerDLQReplayJobModel) -> None:
+    job.updated_at = datetime.datetime.now(datetime.timezone.utc)
+    await cacher.set(_job_key(job.id), job.model_dump(mode="json"), ttl=REPLAY_JOB_TTL)
+
+
+async def _run_replay(
+    job: BrokerDLQReplayJobModel, replay_model: BrokerDLQReplayModel
+) -> None:
+    try:
+        async for scanned, entries in _iter_replay_batches(job, replay_model):
+            started_at = time.monotonic()
+
+            job.scanned += scanned
+            job.replayed += await broker.dlq_replay(job.topic, entries)
+            job.remaining = await broker.dlq_length(job.topic)
+            await _save_job(job)
+            await replay_lease.renew(job.topic, job.id)
+
+            # 每秒最多重放 rate_limit 条
+            if entries:
+                await asyncio.sleep(max(0.0, 1 - (time.monotonic() - started_at)))
+
+        job.state = "finished"
+    except Exception as exc:
+        logger.error(f"重放死信队列 {job.topic} 失败: {exc}", exc_info=True)
+        job.state = "failed"
+        job.error = str(exc)
+    finally:
+        await _save_job(job)
+        await replay_lease.release(job.topic, job.id)
+
+
+async def replay_dlq(
+    topic: str, replay_model: BrokerDLQReplayModel
+) -> BrokerDLQReplayJobModel:
+    """
+    在后台按速率限制重放死信, 返回重放任务.
+    """
+    ensure_topic(topic)
+
+    job_id = await replay_lease.acquire(topic)
+    if job_id is None:
+        running_job_id = await replay_lease.holder(topic)
+        raise ServiceInvalidMessageException(
+            f"Topic: {topic} 已有正在进行的重放任务: {running_job_id}"
+        )
+
+    try:
+        job = BrokerDLQReplayJobModel(
+            id=job_id,
+            topic=topic,
+            rate_limit=replay_model.rate_limit or env_helper.BROKER_DLQ_REPLAY_RATE,
+            remaining=await broker.dlq_length(topic),
+        )
+        await _save_job(job)
+    except BaseException:
+        await replay_lease.release(topic, job_id)
+        raise
+
+    asyncio.create_task(_run_replay(job, replay_model))
+    return job
+
+
+async def get_replay_job(job_id: str) -> BrokerDLQReplayJobModel:
+    job = await cacher.get(_job_key(job_id))
+    if not job:
+        raise ServiceNotFoundException(f"重放任务: {job_id} 不存在")
+
+    return BrokerDLQReplayJobModel.model_validate(job)
+
+
+async def inspect(topic: str | None = None) -> list[RbrokerTopicInfo]:
+    """
+    查看 broker 所管理 topic 的运行状况.
+    """
+    if topic is None:
+        return await broker.inspect_all()
+
+    ensure_topic(topic)
+    return [await broker.inspect(topic)]
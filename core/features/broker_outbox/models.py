@@ -0,0 +1,9 @@
+from typing import Any
+
+from core.shared.base.models import BaseModel
+
+
+class BrokerOutboxCreateModel(BaseModel):
+    topic: str
+    message: dict[str, Any]
+    dedup_key: str | None = None
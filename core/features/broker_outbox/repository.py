@@ -0,0 +1,34 @@
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from core.shared.base.repository import BaseCRUDRepository
+from .scheme import BrokerOutbox
+
+
+class BrokerOutboxRepository(BaseCRUDRepository[BrokerOutbox]):
+    async def has_table(self) -> bool:
+        return await self.session.run_sync(
+            lambda session: sa.inspect(session.connection()).has_table(
+                self.model.__tablename__
+            )
+        )
+
+    async def get_pending(self, limit: int) -> Sequence[BrokerOutbox]:
+        stmt = (
+            sa.select(self.model)
+            .where(sa.not_(self.model.is_deleted))
+            .order_by(self.model.id.asc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        result = await self.session.execute(stmt)
+
+        return result.scalars().all()
+
+    async def remove(self, outbox_ids: list[int]) -> None:
+        # 已投递的记录直接物理删除, 避免发件箱无限增长
+        await self.session.execute(
+            sa.delete(self.model).where(self.model.id.in_(outbox_ids))
+        )
@@ -0,0 +1,28 @@
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.shared.base.scheme import BaseTableScheme
+
+
+class BrokerOutbox(BaseTableScheme):
+    """
+    Broker 发件箱. 与业务数据在同一个事务中写入, 事务提交后由 relay 批量投递到 RBroker.
+    表结构迁移与其他业务表一同在 xyz_databases 中维护, 迁移完成前不要开启 BROKER_OUTBOX_ENABLED.
+    """
+
+    __tablename__ = "broker_outbox"
+
+    topic: Mapped[str] = mapped_column(
+        sa.String(255), nullable=False, comment="目标 topic"
+    )
+    message: Mapped[dict[str, Any]] = mapped_column(
+        sa.JSON, nullable=False, comment="消息内容"
+    )
+    dedup_key: Mapped[str | None] = mapped_column(
+        sa.String(255), nullable=True, comment="去重键, 为空时使用发件箱记录 ID"
+    )
+
+
+__all__ = ["BrokerOutbox"]
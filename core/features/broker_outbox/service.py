@@ -0,0 +1,129 @@
+import asyncio
+import logging
+
+from core.shared.globals import broker
+from core.shared.database.redis import get_client
+from core.shared.components.redis.lease import RLeader
+from core.shared.database.session import (
+    AsyncTxSession,
+    get_async_session_direct,
+    get_async_tx_session_direct,
+)
+from .scheme import BrokerOutbox
+from .models import BrokerOutboxCreateModel
+from .repository import BrokerOutboxRepository
+
+logger = logging.getLogger("Broker-Outbox")
+
+# 单批次最多投递的记录数
+RELAY_BATCH_SIZE = 100
+# 唤醒 relay 的广播频道. 任意副本提交记录后广播, 由当选 leader 的副本投递
+RELAY_CHANNEL = "broker-outbox-relay"
+# 没有唤醒信号时的兜底轮询间隔 (如订阅重连期间错过的广播)
+RELAY_INTERVAL = 10.0
+
+_relay_event = asyncio.Event()
+
+
+async def create(
+    create_model: BrokerOutboxCreateModel, session: AsyncTxSession
+) -> BrokerOutbox:
+    """写入发件箱. 必须与业务数据使用同一个事务, 提交后调用 notify 唤醒 relay"""
+    repo = BrokerOutboxRepository(session=session)
+    return await repo.create(create_model)
+
+
+async def check_table():
+    """
+    启用发件箱前检查表结构已经迁移.
+    表缺失时每次认领都会因写入失败而回滚, 任务一直无法投递, 因此在启动时直接报错
+    """
+    async with get_async_session_direct() as session:
+        repo = BrokerOutboxRepository(session=session)
+        if not await repo.has_table():
+            raise RuntimeError(
+                f"BROKER_OUTBOX_ENABLED is set but table "
+                f"{BrokerOutbox.__tablename__} does not exist, migrate it first"
+            )
+
+
+async def notify():
+    """广播唤醒 relay, 立即投递刚提交的记录. 广播失败时由兜底轮询投递"""
+    try:
+        await get_client().publish(RELAY_CHANNEL, "1")
+    except Exception as e:
+        logger.warning(f"Outbox relay notify error: {e}")
+
+
+async def listen_relay():
+    """订阅唤醒广播, 连接异常时重新订阅"""
+    while True:
+        try:
+            async with get_client().pubsub() as pubsub:
+                await pubsub.subscribe(RELAY_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        _relay_event.set()
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Outbox relay listen error: {e}")
+            await asyncio.sleep(1)
+
+
+async def relay_once() -> int:
+    """
+    投递一批发件箱记录, 返回投递数量.
+    投递与删除记录在同一个事务中: 投递失败时记录保留, 下次重试. 重复投递由去重键过滤.
+    """
+    async with get_async_tx_session_direct() as session:
+        repo = BrokerOutboxRepository(session=session)
+        outboxes = await repo.get_pending(limit=RELAY_BATCH_SIZE)
+        if not outboxes:
+            return 0
+
+        await broker.send_many(
+            [
+                (
+                    outbox.topic,
+                    outbox.message,
+                    outbox.dedup_key or f"outbox-{outbox.id}",
+                )
+                for outbox in outboxes
+            ]
+        )
+
+        await repo.remove(outbox_ids=[outbox.id for outbox in outboxes])
+
+    return len(outboxes)
+
+
+async def start_relay(leader: RLeader):
+    """只在当选 leader 的副本中持续将发件箱投递到 RBroker"""
+    listener = asyncio.create_task(listen_relay())
+    try:
+        await _relay(leader)
+    finally:
+        listener.cancel()
+
+
+async def _relay(leader: RLeader):
+    while True:
+        try:
+            await leader.wait()
+            _relay_event.clear()
+
+            # 整批投递满了, 说明还有积压, 立即进行下一轮
+            if await relay_once() >= RELAY_BATCH_SIZE:
+                continue
+
+            try:
+                await asyncio.wait_for(_relay_event.wait(), timeout=RELAY_INTERVAL)
+            except TimeoutError:
+                pass
+
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Outbox relay error: {e}", exc_info=True)
+            await asyncio.sleep(RELAY_INTERVAL)
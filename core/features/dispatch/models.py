@@ -102,6 +102,11 @@ class TaskDispatchExecuteUnitInput(BaseModel):
             "Produce a clear meeting presentation. It should include an analysis of Q3 sales performance, product optimization directions, and the final expected revenue."
         ],
     )
+    depends_on: list[str] = Field(
+        default_factory=list,
+        description="The exact names of other units in this list that must be completed before this unit can start. Do not list units that are already completed. Empty if the unit can start immediately.",
+        examples=[["Collect Q3 sales data"]],
+    )
 
 
 class TaskUnitDispatchInput(BaseModel):
@@ -398,22 +398,27 @@ Task and user conversation history: {chats}
 """
 
 
-def task_get_unit_prompt(output_cls: type[LLMOutputModel]):
+def task_get_unit_prompt(
+    output_cls: type[LLMOutputModel], running_units: list[str] | None = None
+):
     utc_now = datetime.datetime.now(datetime.timezone.utc)
     formatted = utc_now.strftime("%Y-%m-%d %H:%M:%S")
+    running = "\n".join(f"- {name}" for name in running_units or []) or "None"
 
     return f"""
 # Task Unit Decomposition
 
 ## Role
-Task Unit Decomposition Expert, who reads the `Process.md` document to analyze and break down **all currently and immediately executable** units.
+Task Unit Decomposition Expert, who reads the `Process.md` document to analyze and break down **all executable** units together with the dependencies between them. The units are executed as a dependency graph: each unit starts as soon as the units in its `depends_on` are completed.
 
 ## Operational Steps
 
 1.  **Identify Candidate Units**: Scan `Process.md` to find all items starting with `- [ ]`.
 2.  **Analyze Dependencies and Filter**:
     - No dependency tag: Check if the current unit is executable. If so, add it to the output list.
-    - With dependency tag: Check if all dependent units are completed (`- [x]`). The unit is only executable if none of its dependencies are in an incomplete state (`- [ ]`).
+    - With dependency tag: The unit is executable if every dependent unit is either completed (`- [x]`) or also added to the output list. Dependencies on units in the output list must be declared in `depends_on` with their exact names.
+    - The dependencies in the output list must not form a cycle.
+    - Units listed in **Running Units** are already being executed: never output them again, and do not output units that depend on them.
 3.  **Format Output**: Output the filtered executable units in JSON format. Return an empty list if there are no executable units.
 
 ## Output Format
@@ -424,6 +429,9 @@ Task Unit Decomposition Expert, who reads the `Process.md` document to analyze a
 
 ## Current Information
 **Current UTC Time: {formatted}**
+
+**Running Units:**
+{running}
 """
 
 
@@ -3,7 +3,9 @@ import json
 import uuid
 import asyncio
 import logging
-from collections.abc import Sequence
+import functools
+from collections.abc import AsyncIterator, Awaitable, Callable, Coroutine, Sequence
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from typing import Any, override
 from dataclasses import dataclass
@@ -15,9 +17,27 @@ from core.shared.database.session import AsyncTxSession
 from core.shared.base.models import LLMTimeField
 from core.shared.components.openai.agent import (
     Tokens,
+    AgentRetryPolicy,
+)
+from core.shared.globals import (
+    broker,
+    cacher,
+    lease,
+    limiter,
+    canceller,
+    Agent,
+    RSession,
+)
+from core.shared.components.redis.cancel import RCancelledError
+from core.config import env_helper
+from core.shared.components.redis.lease import (
+    RLease,
+    RLeader,
+    RLeaseLostError,
+    RLeaseTable,
 )
-from core.shared.globals import broker, Agent, RSession
 from core.shared.components.openai.agent import OutputSchemaType
+from core.shared.components.redis.broker import RbrokerRetryPolicy
 from core.shared.database.session import (
     get_async_session_direct,
     get_async_tx_session_direct,
@@ -37,6 +57,8 @@ from ..tasks_chat import service as tasks_chat_service
 from ..tasks_history import service as tasks_history_service
 from ..tasks_workspace import service as tasks_workspace_service
 from ..audits_log import service as audits_log_service
+from ..broker_outbox.models import BrokerOutboxCreateModel
+from ..broker_outbox import service as broker_outbox_service
 from .models import (
     TaskDispatchLLMModel,
     TaskDispatchCreateModel,
@@ -67,11 +89,14 @@ model_adapter = ModelAdapter()
 logger = logging.getLogger("Dispatch-Task")
 
 
-async def get_llm_model(session_id: str) -> Model:
+async def get_llm_model_data(session_id: str) -> TaskDispatchLLMModel:
     model_info = await XyzPlatformServer.get_model_info_by_session_id(
         session_id=session_id
     )
-    model_data = TaskDispatchLLMModel.model_validate(model_info)
+    return TaskDispatchLLMModel.model_validate(model_info)
+
+
+def get_llm_model(model_data: TaskDispatchLLMModel) -> Model:
     return model_adapter.get_model(
         model_name=model_data.model_name, api_key=model_data.api_key
     )
@@ -79,41 +104,296 @@ async def get_llm_model(session_id: str) -> Model:
 
 # ---- 调度器核心方法
 class Dispatch:
-    # 正常调度器驱动任务
+    # 正常调度器驱动任务, 按任务优先级分为多个通道, 值为通道权重
     ready_tasks_topic = "ready-tasks"
+    ready_tasks_high_topic = "ready-tasks-high"
+    ready_tasks_low_topic = "ready-tasks-low"
+    ready_tasks_lanes = {
+        ready_tasks_high_topic: 4,
+        ready_tasks_topic: 2,
+        ready_tasks_low_topic: 1,
+    }
+    # 通道每等待 30s, 得分增加一倍权重, 避免低优先级任务饥饿
+    ready_tasks_lane_aging = 30.0
+
+    # 同一会话在集群内最多同时运行的任务数, 避免单个会话的突发任务占满所有工作者
+    session_concurrency = 2
+    # 公平调度只在单个副本的单个消费者队列内限制并发, 由各副本的就绪、执行两个消费者分摊.
+    # 至少为 1, 副本数超过 session_concurrency / 2 时集群内的实际上限为 副本数 × 2
+    session_fair_limit = max(
+        1, session_concurrency // (env_helper.DISPATCH_REPLICAS * 2)
+    )
     # 异常调度器检查任务
     review_tasks_topic = "review-tasks"
     # Unit 核心驱动任务
     running_tasks_topic = "running-tasks"
+    # 定时任务到期驱动
+    scheduled_tasks_topic = "scheduled-tasks"
+
+    # 到期任务由延迟消息驱动, 轮询仅作为兜底 (如历史数据、延迟消息丢失等)
+    ready_producer_interval = 600
+    # 就绪任务消费者的监听者数量与每个监听者的工作者数量
+    ready_consumer_count = 5
+    ready_consumer_workers = 10
+    # 集群内处理就绪任务的工作者槽位. 认领数量受限于空闲槽位, 避免停机恢复后一次性认领所有任务
+    ready_worker_slots = (
+        env_helper.DISPATCH_READY_WORKER_SLOTS
+        or env_helper.DISPATCH_REPLICAS * ready_consumer_count * ready_consumer_workers
+    )
+    # 单次认领上限
+    ready_claim_batch = 50
+    # 仍有积压时的认领间隔
+    ready_catchup_interval = 2.0
+
+    # 消费失败 (如模型、数据库的瞬时异常) 时的重试策略, 超过次数后进入死信队列
+    retry_policy = RbrokerRetryPolicy(max_attempts=3, base_delay=2.0, max_delay=60.0)
+
+    # 生产者选主, 所有副本中只有 leader 轮询数据库. leader 宕机后 5s 内租约过期并完成接任
+    producer_lease = RLease(prefix="dispatch-leader", ttl_ms=5_000)
+    ready_producer_leader = RLeader(producer_lease, "ready-producer")
+    review_producer_leader = RLeader(producer_lease, "review-producer")
+    outbox_relay_leader = RLeader(producer_lease, "outbox-relay")
+    coordinator_tasks: list[asyncio.Task[None]] = []
+
+    # 任务执行租约, 由执行任务的工作者在运行期间 (包括 LLM 调用) 持续续期
+    task_leases = RLeaseTable("dispatch-task-leases", ttl_ms=15_000)
+    # 检查过期执行租约的间隔, 由检查任务的 leader 执行
+    task_lease_watch_interval = 3.0
+    # 执行租约丢失达到该次数后任务置为失败, 否则重新投递
+    task_lease_max_losses = 3
+
+    # 各阶段的执行预算 (秒), execute_unit 为单个执行单元的预算.
+    # 超出预算时取消正在进行的 LLM 调用并关闭 MCP 连接, 释放工作者
+    stage_budgets: dict[str, float] = {
+        "planning": 300.0,
+        "generate_unit": 300.0,
+        "execute_unit": 600.0,
+        "next_state": 300.0,
+        "result": 300.0,
+    }
+    # 阶段超时后重新投递的次数上限, 超过后任务置为失败
+    stage_timeout_retries = 2
+
+    # LLM 调用的超时、瞬时异常重试与对冲策略, 多次尝试仍受所在阶段的预算约束
+    agent_retry_policy = AgentRetryPolicy(timeout=120.0, max_attempts=3, hedge=True)
+    # 执行单元会调用有副作用的 MCP 工具, 任何一次模型调用失败时之前的工具调用可能已经生效,
+    # 因此只设置超时, 不在调用内重试也不发起对冲请求, 由阶段超时的重新投递兜底
+    unit_retry_policy = AgentRetryPolicy(timeout=280.0)
 
     @classmethod
     async def start_ready_producer(cls):
         """开始调度就绪任务"""
+        leader = cls.ready_producer_leader
         while True:
-            tasks_id = await get_dispatch_tasks_id()
-            for task_id in tasks_id:
-                await cls.send_to_ready_topic(task_id=task_id)
-            await asyncio.sleep(60)
+            try:
+                interval = await cls.produce_ready_tasks(leader)
+            except Exception as e:
+                logging.error(f"Ready producer error: {e}", exc_info=True)
+                interval = cls.ready_catchup_interval
+            await asyncio.sleep(interval)
+
+    @classmethod
+    async def produce_ready_tasks(cls, leader: RLeader) -> float:
+        """认领一批到期任务并投递, 返回距下一轮的秒数"""
+        fence = await leader.wait()
+
+        backlog = await broker.backlog(list(cls.ready_tasks_lanes))
+        free = cls.ready_worker_slots - backlog
+        if free <= 0:
+            return cls.ready_catchup_interval
+
+        limit = min(free, cls.ready_claim_batch)
+        try:
+            tasks = await get_dispatch_tasks(
+                limit=limit, guard=functools.partial(leader.validate, fence)
+            )
+        except RLeaseLostError:
+            logging.warning(f"Ready producer fence {fence} expired, skip round")
+            return leader.interval
+
+        for task_id, priority, session_id in tasks:
+            await cls.send_to_ready_topic(
+                task_id=task_id, priority=priority, session_id=session_id
+            )
+
+        # 认领已满说明数据库中仍有到期任务, 尽快进行下一轮
+        if len(tasks) >= limit:
+            return cls.ready_catchup_interval
+        return cls.ready_producer_interval
+
+    @classmethod
+    async def has_ready_capacity(cls) -> bool:
+        """就绪任务的积压是否仍低于集群内的工作者槽位"""
+        backlog = await broker.backlog(list(cls.ready_tasks_lanes))
+        return backlog < cls.ready_worker_slots
 
     @classmethod
     async def start_review_producer(cls):
         """开始调度检查任务"""
+        leader = cls.review_producer_leader
         while True:
-            tasks_id = await get_review_tasks_id()
-            for task_id in tasks_id:
-                await cls.send_to_review_topic(task_id=task_id)
+            fence = await leader.wait()
+            try:
+                tasks_id = await get_review_tasks_id()
+                if not await leader.validate(fence):
+                    logging.warning(f"Review producer fence {fence} expired, skip round")
+                    await asyncio.sleep(leader.interval)
+                    continue
+
+                # 执行租约仍然有效的任务正在执行某一跳, 无论已运行多久都不检查.
+                # 两跳之间不持有租约, 但每一跳开始时都会刷新调度时间
+                alive = await cls.task_leases.alive(
+                    [str(task_id) for task_id in tasks_id]
+                )
+                for task_id in tasks_id:
+                    if str(task_id) not in alive:
+                        await cls.send_to_review_topic(task_id=task_id)
+            except Exception as e:
+                logging.error(f"Review producer error: {e}", exc_info=True)
             # 10min
             await asyncio.sleep(1200)
 
     @classmethod
-    async def send_to_ready_topic(cls, task_id: int):
+    async def start_task_lease_watchdog(cls):
+        """回收过期的任务执行租约, 重新投递或置为失败"""
+        leader = cls.review_producer_leader
+        while True:
+            await leader.wait()
+            try:
+                for task_id, topic, losses in await cls.task_leases.reap():
+                    await recover_task(task_id=int(task_id), topic=topic, losses=losses)
+            except Exception as e:
+                logging.error(f"Task lease watchdog error: {e}", exc_info=True)
+            await asyncio.sleep(cls.task_lease_watch_interval)
+
+    @classmethod
+    def get_ready_topic(cls, priority: int) -> str:
+        """根据任务优先级选择就绪任务通道"""
+        if priority > 0:
+            return cls.ready_tasks_high_topic
+        if priority < 0:
+            return cls.ready_tasks_low_topic
+        return cls.ready_tasks_topic
+
+    @classmethod
+    async def get_task_epoch(cls, task_id: int) -> int:
+        """
+        任务的执行世代, 即执行租约的丢失次数.
+        消息携带发送时的世代, 租约被回收后, 回收前发出的消息失效.
+        """
+        return await cls.task_leases.losses(str(task_id))
+
+    @classmethod
+    def get_ready_outbox(
+        cls,
+        task_id: int,
+        priority: int = 0,
+        session_id: str | None = None,
+        epoch: int = 0,
+        timeouts: int = 0,
+    ) -> BrokerOutboxCreateModel:
+        """就绪任务消息. timeouts 为该任务已发生的阶段超时次数"""
+        return BrokerOutboxCreateModel(
+            topic=cls.get_ready_topic(priority=priority),
+            message={
+                "task_id": task_id,
+                "session_id": session_id,
+                "epoch": epoch,
+                "timeouts": timeouts,
+            },
+            dedup_key=f"{cls.ready_tasks_topic}-{task_id}",
+        )
+
+    @classmethod
+    async def send_to_ready_topic(
+        cls, task_id: int, priority: int = 0, session_id: str | None = None
+    ):
         """发送到就绪任务"""
-        await broker.send(topic=cls.ready_tasks_topic, message={"task_id": task_id})
+        outbox = cls.get_ready_outbox(
+            task_id=task_id,
+            priority=priority,
+            session_id=session_id,
+            epoch=await cls.get_task_epoch(task_id),
+        )
+        await broker.send(
+            topic=outbox.topic, message=outbox.message, dedup_key=outbox.dedup_key
+        )
 
     @classmethod
-    async def send_to_running_topic(cls, task_id: int):
-        """发送到运行任务"""
-        await broker.send(topic=cls.running_tasks_topic, message={"task_id": task_id})
+    async def enqueue_to_ready_topic(
+        cls,
+        task_id: int,
+        priority: int,
+        session_id: str,
+        session: AsyncTxSession,
+        timeouts: int = 0,
+        epoch: int | None = None,
+    ) -> BrokerOutboxCreateModel:
+        """
+        启用发件箱时在当前事务中写入发件箱. 返回的消息需在事务提交后
+        通过 publish_ready_topic 发送. epoch 为空时使用任务当前世代
+        """
+        if epoch is None:
+            epoch = await cls.get_task_epoch(task_id)
+        outbox = cls.get_ready_outbox(
+            task_id=task_id,
+            priority=priority,
+            session_id=session_id,
+            epoch=epoch,
+            timeouts=timeouts,
+        )
+        if env_helper.BROKER_OUTBOX_ENABLED:
+            await broker_outbox_service.create(create_model=outbox, session=session)
+        return outbox
+
+    @classmethod
+    async def publish_ready_topic(cls, outbox: BrokerOutboxCreateModel):
+        """事务提交后发送就绪任务. 启用发件箱时唤醒 relay, 否则直接发送"""
+        if env_helper.BROKER_OUTBOX_ENABLED:
+            await broker_outbox_service.notify()
+            return
+        await broker.send(
+            topic=outbox.topic, message=outbox.message, dedup_key=outbox.dedup_key
+        )
+
+    @classmethod
+    async def send_to_running_topic(
+        cls,
+        task_id: int,
+        session_id: str | None = None,
+        timeouts: int = 0,
+        epoch: int | None = None,
+    ):
+        """
+        发送到运行任务. epoch 为发送方持有执行租约时的世代, 为空时使用任务当前世代.
+        租约在执行期间被回收时, 该消息随旧世代一起失效
+        """
+        if epoch is None:
+            epoch = await cls.get_task_epoch(task_id)
+        await broker.send(
+            topic=cls.running_tasks_topic,
+            message={
+                "task_id": task_id,
+                "session_id": session_id,
+                "epoch": epoch,
+                "timeouts": timeouts,
+            },
+            dedup_key=f"{cls.running_tasks_topic}-{task_id}",
+        )
+
+    @staticmethod
+    def get_fair_key(message: dict[str, Any]) -> str:
+        """公平调度的 key, 历史消息没有会话 ID 时按任务区分"""
+        return message.get("session_id") or f"task-{message['task_id']}"
+
+    @staticmethod
+    def get_task_lease_key(task_id: int) -> str:
+        """任务租约的 key. 同一任务的 Broker 消息、用户补充信息、重构任务互斥执行"""
+        return f"task-{task_id}"
+
+    @classmethod
+    def get_partition_key(cls, message: dict[str, Any]) -> str:
+        return cls.get_task_lease_key(task_id=message["task_id"])
 
     @classmethod
     async def send_to_review_topic(cls, task_id: int):
@@ -121,49 +401,190 @@ class Dispatch:
         await broker.send(topic=cls.review_tasks_topic, message={"task_id": task_id})
 
     @classmethod
-    async def start_ready_consumer(cls, message: dict[str, int]):
+    async def send_to_scheduled_topic(cls, task_id: int, deliver_at: datetime):
+        """在 deliver_at 时投递到定时任务. 同一任务重复调度时以最后一次为准"""
+        await broker.send(
+            topic=cls.scheduled_tasks_topic,
+            message={"task_id": task_id},
+            deliver_at=deliver_at,
+            delay_key=f"task-{task_id}",
+        )
+
+    @classmethod
+    @asynccontextmanager
+    async def hold_task_lease(
+        cls, message: dict[str, Any], topic: str
+    ) -> AsyncIterator[int | None]:
+        """
+        持有任务执行租约并在上下文中自动续期, 返回获取租约时的世代.
+        消息的世代落后于任务当前世代时, 说明该任务已被租约检查重新投递,
+        返回 None 且不持有租约. 执行期间租约被回收时取消执行, 由重新投递的消息接管.
+        """
+        task_id = message["task_id"]
+        epoch = await cls.get_task_epoch(task_id)
+        if message.get("epoch", 0) < epoch:
+            logger.info(f"任务 {task_id} 的消息已过期 (世代 {epoch}), 放弃该消息")
+            yield None
+            return
+
+        try:
+            async with cls.task_leases.keep(str(task_id), data=topic):
+                # 每一跳开始执行时刷新调度时间, 检查任务不会将两跳之间的任务视为停滞
+                await touch_task(task_id=task_id)
+                yield epoch
+        except RLeaseLostError:
+            logger.warning(f"任务 {task_id} 的执行租约已被回收 (世代 {epoch}), 中止执行")
+
+    @staticmethod
+    async def run_cancellable(task_id: int, coro: Coroutine[Any, Any, Any]) -> Any:
+        """以可取消的方式执行任务, 任务被用户取消时中止执行并释放工作者"""
+        try:
+            return await canceller.run(str(task_id), coro)
+        except RCancelledError:
+            logger.info(f"任务 {task_id} 已被取消, 中止执行")
+
+    @classmethod
+    async def start_ready_consumer(cls, message: dict[str, Any]):
         """消费就绪任务"""
-        await execute_task(task_id=message["task_id"])
+        task_id = message["task_id"]
+        async with cls.hold_task_lease(message, cls.ready_tasks_topic) as epoch:
+            if epoch is not None:
+                await cls.run_cancellable(
+                    task_id,
+                    execute_task(
+                        task_id=task_id,
+                        timeouts=message.get("timeouts", 0),
+                        epoch=epoch,
+                    ),
+                )
 
     @classmethod
-    async def start_running_consumer(cls, message: dict[str, int]):
+    async def start_running_consumer(cls, message: dict[str, Any]):
         """消费运行任务"""
-        await running_task(task_id=message["task_id"])
+        task_id = message["task_id"]
+        async with cls.hold_task_lease(message, cls.running_tasks_topic) as epoch:
+            if epoch is not None:
+                await cls.run_cancellable(
+                    task_id,
+                    running_task(
+                        task_id=task_id,
+                        timeouts=message.get("timeouts", 0),
+                        epoch=epoch,
+                    ),
+                )
 
     @classmethod
     async def start_review_consumer(cls, message: dict[str, int]):
         """消费检查任务"""
-        await review_task(task_id=message["task_id"])
+        task_id = message["task_id"]
+        if await cls.task_leases.alive([str(task_id)]):
+            return
+        await review_task(task_id=task_id)
+
+    @classmethod
+    async def start_scheduled_consumer(cls, message: dict[str, int]):
+        """消费定时任务"""
+        await scheduled_task(task_id=message["task_id"])
 
     @classmethod
     async def start(cls):
         """启动调度器"""
-        asyncio.create_task(cls.start_ready_producer())
-        asyncio.create_task(cls.start_review_producer())
+        if env_helper.BROKER_OUTBOX_ENABLED:
+            await broker_outbox_service.check_table()
+
+        cls.coordinator_tasks = [
+            asyncio.create_task(cls.review_producer_leader.run()),
+            asyncio.create_task(canceller.listen()),
+            asyncio.create_task(cls.ready_producer_leader.run()),
+            asyncio.create_task(cls.start_ready_producer()),
+            asyncio.create_task(cls.start_review_producer()),
+            asyncio.create_task(cls.start_task_lease_watchdog()),
+        ]
+        if env_helper.BROKER_OUTBOX_ENABLED:
+            cls.coordinator_tasks += [
+                asyncio.create_task(cls.outbox_relay_leader.run()),
+                asyncio.create_task(
+                    broker_outbox_service.start_relay(cls.outbox_relay_leader)
+                ),
+            ]
 
         await broker.consumer(
-            topic=cls.ready_tasks_topic, callback=cls.start_ready_consumer, count=5
+            topic=cls.ready_tasks_topic,
+            callback=cls.start_ready_consumer,
+            count=cls.ready_consumer_count,
+            max_workers=cls.ready_consumer_workers,
+            batch_size=10,
+            retry_policy=cls.retry_policy,
+            min_workers=5,
+            lanes=cls.ready_tasks_lanes,
+            lane_aging=cls.ready_tasks_lane_aging,
+            fair_key=cls.get_fair_key,
+            fair_limit=cls.session_fair_limit,
+            partition_key=cls.get_partition_key,
+        )
+        await broker.consumer(
+            topic=cls.running_tasks_topic,
+            callback=cls.start_running_consumer,
+            count=5,
+            batch_size=10,
+            retry_policy=cls.retry_policy,
+            min_workers=5,
+            fair_key=cls.get_fair_key,
+            fair_limit=cls.session_fair_limit,
+            partition_key=cls.get_partition_key,
         )
+
         await broker.consumer(
-            topic=cls.running_tasks_topic, callback=cls.start_running_consumer, count=5
+            topic=cls.review_tasks_topic,
+            callback=cls.start_review_consumer,
+            count=1,
+            retry_policy=cls.retry_policy,
         )
 
         await broker.consumer(
-            topic=cls.review_tasks_topic, callback=cls.start_review_consumer, count=1
+            topic=cls.scheduled_tasks_topic,
+            callback=cls.start_scheduled_consumer,
+            count=1,
+            retry_policy=cls.retry_policy,
         )
 
     @classmethod
     async def shutdown(cls):
         """关闭调度器"""
+        # 停止生产者与 relay, 并主动释放 leader 租约, 其他副本无需等待过期即可接任
+        for task in cls.coordinator_tasks:
+            task.cancel()
+        await asyncio.gather(*cls.coordinator_tasks, return_exceptions=True)
         await broker.shutdown()
 
 
-async def get_dispatch_tasks_id() -> Sequence[int]:
+async def get_dispatch_tasks(
+    limit: int,
+    guard: Callable[[], Awaitable[bool]] | None = None,
+) -> Sequence[tuple[int, int, str]]:
     """
-    获取调度任务
+    获取最多 limit 个调度任务及其优先级、会话.
+    guard 在提交前校验调用方仍是 leader, 失败时回滚并抛出 RLeaseLostError.
     """
     async with get_async_tx_session_direct() as session:
-        return await tasks_service.get_dispatch_tasks_id(session=session)
+        tasks = await tasks_service.get_dispatch_tasks(limit=limit, session=session)
+        if guard is not None and not await guard():
+            raise RLeaseLostError("Dispatch producer leadership lost")
+        return tasks
+
+
+async def touch_task(task_id: int):
+    """
+    刷新任务的最后调度时间
+    """
+    async with get_async_tx_session_direct() as session:
+        await tasks_service.update(
+            task_id=task_id,
+            update_model=TaskUpdateModel(
+                lasted_execute_time=datetime.now(timezone.utc)
+            ),
+            session=session,
+        )
 
 
 async def get_review_tasks_id() -> Sequence[int]:
@@ -176,6 +597,77 @@ async def get_review_tasks_id() -> Sequence[int]:
 
 # ---- Task Agent ----
 
+# 执行单元依赖关系的缓存时间. 依赖关系只在该轮次执行 (包括重试) 期间使用
+ROUND_UNIT_DEPS_TTL = 86400
+
+
+def resolve_unit_deps(
+    units: list[tuple[int, TaskDispatchExecuteUnitInput]],
+) -> dict[int, list[int]]:
+    """
+    将 LLM 输出的依赖名称解析为执行单元 ID. 忽略未知名称与自依赖, 存在环时退化为无依赖
+    """
+    units_id = {unit.name: unit_id for unit_id, unit in units}
+    deps = {
+        unit_id: sorted(
+            {
+                units_id[name]
+                for name in unit.depends_on
+                if units_id.get(name, unit_id) != unit_id
+            }
+        )
+        for unit_id, unit in units
+    }
+
+    resolved: set[int] = set()
+    remaining = dict(deps)
+    while remaining:
+        ready = [unit_id for unit_id, d in remaining.items() if resolved.issuperset(d)]
+        if not ready:
+            logger.warning(f"执行单元依赖存在环, 忽略依赖关系: {remaining}")
+            return {unit_id: [] for unit_id in deps}
+        for unit_id in ready:
+            resolved.add(unit_id)
+            del remaining[unit_id]
+
+    return deps
+
+
+def resolve_unit_branches(deps: dict[int, list[int]]) -> dict[int, int]:
+    """
+    将执行单元划分为互不依赖的分支 (依赖关系的连通分量), 返回执行单元 ID 到分支 ID 的映射.
+    分支 ID 为分支中最小的执行单元 ID
+    """
+    parents = {unit_id: unit_id for unit_id in deps}
+
+    def _find(unit_id: int) -> int:
+        while parents[unit_id] != unit_id:
+            parents[unit_id] = parents[parents[unit_id]]
+            unit_id = parents[unit_id]
+        return unit_id
+
+    for unit_id, deps_id in deps.items():
+        for dep_id in deps_id:
+            if dep_id in parents:
+                a, b = sorted((_find(unit_id), _find(dep_id)))
+                parents[b] = a
+
+    return {unit_id: _find(unit_id) for unit_id in deps}
+
+
+async def set_round_unit_deps(round_id: uuid.UUID, deps: dict[int, list[int]]):
+    await cacher.set(
+        f"task-round-deps:{round_id}",
+        {str(unit_id): deps_id for unit_id, deps_id in deps.items()},
+        ttl=ROUND_UNIT_DEPS_TTL,
+    )
+
+
+async def get_round_unit_deps(round_id: uuid.UUID) -> dict[int, list[int]]:
+    """轮次中各执行单元依赖的执行单元 ID. 缓存丢失时所有执行单元并发执行"""
+    deps = await cacher.get(f"task-round-deps:{round_id}", default={})
+    return {int(unit_id): deps_id for unit_id, deps_id in deps.items()}
+
 
 @dataclass
 class XyzContext:
@@ -199,6 +691,29 @@ async def get_xyz_contenxt(wrapper: RunContextWrapper[XyzContext]) -> str:
     )
 
 
+class TaskStageTimeoutError(TimeoutError):
+    """任务阶段超出执行预算"""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Task stage '{stage}' exceeded its {budget}s budget")
+        self.stage = stage
+        self.budget = budget
+
+
+@asynccontextmanager
+async def stage_budget(stage: str) -> AsyncIterator[None]:
+    """
+    在阶段预算内运行. 超时会取消上下文中的 LLM 调用 (MCP 连接随之关闭),
+    并抛出 TaskStageTimeoutError
+    """
+    budget = Dispatch.stage_budgets[stage]
+    try:
+        async with asyncio.timeout(budget):
+            yield
+    except TimeoutError as exc:
+        raise TaskStageTimeoutError(stage=stage, budget=budget) from exc
+
+
 class TaskAgent(Agent):
     @override
     async def run(
@@ -361,9 +876,10 @@ class TaskAgent(Agent):
                     )
                 )
 
-    async def execute_task_unit(self, task_id: int):
+    async def execute_task_unit(self, task_id: int, epoch: int | None = None):
         """
-        开始执行所有执行单元
+        按依赖关系执行本轮次的执行单元. 其他分支仍在运行时, 完成的分支立即推进下一跳
+        并追加新的执行单元. epoch 为持有执行租约时的世代, 随下一轮的运行消息发送
         """
 
         async def _execute_unit(
@@ -372,7 +888,7 @@ class TaskAgent(Agent):
             chats: list[dict[str, Any]],
             prd: str,
             prd_created_time: datetime,
-        ):
+        ) -> dict[str, Any]:
             async with get_async_tx_session_direct() as session:
                 unit: TasksUnit = await tasks_unit_service.get(
                     unit_id=unit_id, session=session
@@ -384,25 +900,27 @@ class TaskAgent(Agent):
                 )
 
             # 运行执行单元
-            response_model, tokens = await self.run(
-                input=[
-                    {
-                        "role": MessageRole.SYSTEM,
-                        "content": prompt.task_run_unit_prompt(
-                            output_cls=TaskDispatchExecuteUnitOutput,
-                            unit_content=prev_units_content,
-                            prd=prd,
-                            chats=chats,
-                            prd_created_time=prd_created_time,
-                        ),
-                    },
-                    {
-                        "role": MessageRole.USER,
-                        "content": unit.objective,
-                    },
-                ],
-                output_type=TaskDispatchExecuteUnitOutput,
-            )
+            async with stage_budget("execute_unit"):
+                response_model, tokens = await self.run(
+                    input=[
+                        {
+                            "role": MessageRole.SYSTEM,
+                            "content": prompt.task_run_unit_prompt(
+                                output_cls=TaskDispatchExecuteUnitOutput,
+                                unit_content=prev_units_content,
+                                prd=prd,
+                                chats=chats,
+                                prd_created_time=prd_created_time,
+                            ),
+                        },
+                        {
+                            "role": MessageRole.USER,
+                            "content": unit.objective,
+                        },
+                    ],
+                    output_type=TaskDispatchExecuteUnitOutput,
+                    retry_policy=Dispatch.unit_retry_policy,
+                )
             response_model: TaskDispatchExecuteUnitOutput
 
             async with get_async_tx_session_direct() as session:
@@ -424,6 +942,8 @@ class TaskAgent(Agent):
                     session=session,
                 )
 
+                unit_content = TaskUnitDispatchInput.model_validate(unit).model_dump()
+
             asyncio.create_task(
                 store_usage_by_session(
                     source="Task-Executor-Unit",
@@ -435,6 +955,8 @@ class TaskAgent(Agent):
                 )
             )
 
+            return unit_content
+
         # 拿到所有的执行单元
         async with get_async_session_direct() as session:
             task = await tasks_service.get(task_id=task_id, session=session)
@@ -453,6 +975,14 @@ class TaskAgent(Agent):
                 for unit in prev_units
             ]
 
+            # 本轮次已完成的 Unit 不再执行, 其输出直接作为下游 Unit 的输入
+            outputs: dict[int, dict[str, Any]] = {
+                unit.id: TaskUnitDispatchInput.model_validate(unit).model_dump()
+                for unit in await tasks_unit_service.get_round_units(
+                    round_id=task.curr_round_id, session=session
+                )
+            }
+
             workspace = await tasks_workspace_service.get(
                 workspace_id=task.workspace_id, session=session
             )
@@ -464,20 +994,127 @@ class TaskAgent(Agent):
                 for chat in task.chats
             ]
 
-        await asyncio.gather(
-            *[
-                asyncio.create_task(
-                    _execute_unit(
-                        unit_id, prev_units_content, chats, prd, prd_created_time
+        deps = await get_round_unit_deps(round_id=task.curr_round_id)
+        units: dict[int, asyncio.Task[None]] = {}
+        # 各分支尚未完成的执行单元, 以及分支中全部执行单元
+        pending: dict[int, set[int]] = {}
+        branches: dict[int, list[int]] = {}
+        # 正在为已完成的分支推进下一跳的数量
+        advancing = 0
+        advance_lock = asyncio.Lock()
+
+        async def _execute_after_deps(
+            unit_id: int, branch: int, inputs: list[dict[str, Any]]
+        ):
+            # 依赖的 Unit 完成后立即开始, 互不依赖的分支之间没有屏障
+            deps_id = deps.get(unit_id, [])
+            for dep_id in deps_id:
+                if dep_id in units:
+                    await units[dep_id]
+
+            unit_content = inputs + [
+                outputs[dep_id] for dep_id in deps_id if dep_id in outputs
+            ]
+            outputs[unit_id] = await _execute_unit(
+                unit_id, unit_content, chats, prd, prd_created_time
+            )
+
+            pending[branch].discard(unit_id)
+            # 其他分支仍在运行时, 分支完成后立即推进该分支的下一跳, 不等待整个轮次
+            if not pending[branch]:
+                del pending[branch]
+                if pending or advancing:
+                    await _advance_branch(branch)
+
+        async def _advance_branch(branch: int):
+            nonlocal advancing
+            branch_content = [outputs[unit_id] for unit_id in branches[branch]]
+
+            advancing += 1
+            try:
+                # 同一任务的 process 依次推进
+                async with advance_lock:
+                    async with get_async_session_direct() as session:
+                        workspace = await tasks_workspace_service.get(
+                            workspace_id=task.workspace_id, session=session
+                        )
+                        running_units = [
+                            (
+                                await tasks_unit_service.get(
+                                    unit_id=unit_id, session=session
+                                )
+                            ).name
+                            for unit_id in sorted(set().union(*pending.values()))
+                        ]
+
+                    response_model = await self.advance_process(
+                        task=task,
+                        process=workspace.process,
+                        units_content=branch_content,
                     )
+                    # 完成、等待、定时等任务级的状态变更需要等待其他分支,
+                    # 由本轮次全部完成后的下一跳决定
+                    if response_model.state != AgentTaskState.ACTIVATING:
+                        return
+
+                    async with stage_budget("generate_unit"):
+                        branch_deps = await self.generator_task_unit(
+                            task_id=task_id,
+                            round_id=task.curr_round_id,
+                            running_units=running_units,
+                        )
+                deps.update(branch_deps)
+                _schedule(branch_deps, branch_content)
+            finally:
+                advancing -= 1
+
+        def _schedule(
+            round_deps: dict[int, list[int]], inputs: list[dict[str, Any]]
+        ):
+            units_branch = resolve_unit_branches(round_deps)
+            for unit_id, branch in units_branch.items():
+                pending.setdefault(branch, set()).add(unit_id)
+                branches.setdefault(branch, []).append(unit_id)
+            for unit_id, branch in units_branch.items():
+                units[unit_id] = asyncio.create_task(
+                    _execute_after_deps(unit_id, branch, inputs)
                 )
-                for unit_id in curr_units
-            ]
+
+        _schedule(
+            {unit_id: deps.get(unit_id, []) for unit_id in curr_units},
+            prev_units_content,
         )
-        # 这一批全部运行完后, 我们会开启下一轮
-        await Dispatch.send_to_running_topic(task_id=task_id)
 
-    async def generator_task_unit(self, task_id: int):
+        try:
+            # 已完成的分支可能追加新的执行单元, 直到所有分支都完成
+            while True:
+                for unit in units.values():
+                    if unit.done():
+                        unit.result()
+                running = [unit for unit in units.values() if not unit.done()]
+                if not running:
+                    break
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            # 任一执行单元失败或超时时取消同一轮次的其他执行单元, 不再占用工作者
+            for unit in units.values():
+                unit.cancel()
+            raise
+        # 所有分支都完成后, 由下一跳决定任务的状态
+        await Dispatch.send_to_running_topic(
+            task_id=task_id, session_id=task.session_id, epoch=epoch
+        )
+
+    async def generator_task_unit(
+        self,
+        task_id: int,
+        round_id: uuid.UUID | None = None,
+        running_units: list[str] | None = None,
+    ) -> dict[int, list[int]]:
+        """
+        拆解执行单元, 返回新执行单元的依赖关系. round_id 为空时派发新的轮次,
+        否则追加到该轮次 (如分支完成后推进的下一跳), running_units 为该轮次中仍在运行的执行单元
+        """
         async with get_async_tx_session_direct() as session:
             task = await tasks_service.get(task_id=task_id, session=session)
 
@@ -494,7 +1131,8 @@ class TaskAgent(Agent):
                 {
                     "role": MessageRole.SYSTEM,
                     "content": prompt.task_get_unit_prompt(
-                        output_cls=TaskDispatchGeneratorExecuteUnitOutput
+                        output_cls=TaskDispatchGeneratorExecuteUnitOutput,
+                        running_units=running_units,
                     ),
                 },
                 {"role": MessageRole.USER, "content": process},
@@ -504,38 +1142,48 @@ class TaskAgent(Agent):
 
         async with get_async_tx_session_direct() as session:
             # 派发轮次
-            task = await tasks_service.update(
-                task_id=task.id,
-                update_model=TaskUpdateModel(
-                    prev_round_id=task.curr_round_id,
-                    curr_round_id=uuid.uuid4(),
-                ),
-                session=session,
-            )
+            if round_id is None:
+                task = await tasks_service.update(
+                    task_id=task.id,
+                    update_model=TaskUpdateModel(
+                        prev_round_id=task.curr_round_id,
+                        curr_round_id=uuid.uuid4(),
+                    ),
+                    session=session,
+                )
+                round_id = task.curr_round_id
 
             await audits_log_service.create(
                 create_model=AuditLLMlogModel(
                     session_id=task.session_id,
                     thinking=response_model.thinking,
-                    message=f"任务执行单元拆解成功, 派发批次 {task.curr_round_id}",
+                    message=f"任务执行单元拆解成功, 派发批次 {round_id}",
                     tokens=tokens.model_dump(),
                 ).to_audit_log(),
                 session=session,
             )
 
             # 创建执行单元
+            units: list[tuple[int, TaskDispatchExecuteUnitInput]] = []
             for unit in response_model.unit_list:
                 unit: TaskDispatchExecuteUnitInput
 
-                await tasks_unit_service.create(
+                db_unit = await tasks_unit_service.create(
                     create_model=TaskUnitCreateModel(
                         task_id=task.id,
                         name=unit.name,
                         objective=unit.objective,
-                        round_id=task.curr_round_id,
+                        round_id=round_id,
                     ),
                     session=session,
                 )
+                units.append((db_unit.id, unit))
+
+        deps = resolve_unit_deps(units=units)
+        await set_round_unit_deps(
+            round_id=round_id,
+            deps=await get_round_unit_deps(round_id=round_id) | deps,
+        )
 
         asyncio.create_task(
             store_usage_by_session(
@@ -548,6 +1196,8 @@ class TaskAgent(Agent):
             )
         )
 
+        return deps
+
     async def waiting_task(self, task_id: int, user_message: str):
         try:
             # 处理用户反馈的信息. 更新 Process 并将任务重新入队.
@@ -657,36 +1307,13 @@ class TaskAgent(Agent):
 
         await XyzPlatformServer.send_task_refresh(session_id=task.session_id)
 
-    async def running_task(self, task_id: int):
+    async def advance_process(
+        self, task: Tasks, process: str, units_content: list[dict[str, Any]]
+    ) -> TaskDispatchGeneratorNextStateOutput:
         """
-        Unit 触发任务继续执行.
+        根据执行单元的输出更新 process, 返回 LLM 给出的任务新状态 (不修改任务状态)
         """
-
-        try:
-            # 获取当前的执行单元的 output, 并根据 output 来更新 process.
-            async with get_async_tx_session_direct() as session:
-                task = await tasks_service.get(task_id=task_id, session=session)
-
-                # 任务正在被重构. 这里不要再继续了.
-                if task.state == TaskState.UPDATING:
-                    return
-
-                workspace = await tasks_workspace_service.get(
-                    workspace_id=task.workspace_id, session=session
-                )
-
-                process = workspace.process
-
-                curr_units = await tasks_unit_service.get_round_units(
-                    round_id=task.curr_round_id, session=session
-                )
-
-                curr_units_content = [
-                    TaskUnitDispatchInput.model_validate(unit).model_dump()
-                    for unit in curr_units
-                ]
-
-            # 根据 units 的反馈, 来更新当前的 process 以及任务状态
+        async with stage_budget("next_state"):
             response_model, tokens = await self.run(
                 output_type=TaskDispatchGeneratorNextStateOutput,
                 input=[
@@ -694,7 +1321,7 @@ class TaskAgent(Agent):
                         "role": MessageRole.SYSTEM,
                         "content": prompt.task_run_next_prompt(
                             output_cls=TaskDispatchGeneratorNextStateOutput,
-                            unit_content=curr_units_content,
+                            unit_content=units_content,
                             chats=[
                                 TaskChatInCrudModel.model_validate(chat).model_dump()
                                 for chat in task.chats
@@ -704,48 +1331,85 @@ class TaskAgent(Agent):
                     {"role": MessageRole.USER, "content": process},
                 ],
             )
-            response_model: TaskDispatchGeneratorNextStateOutput
+        response_model: TaskDispatchGeneratorNextStateOutput
 
-            asyncio.create_task(
-                store_usage_by_session(
-                    source="Task-Execute-Continue",
-                    model_name=self.model.model,
-                    input_token=tokens.input_tokens,
-                    output_token=tokens.output_tokens,
-                    cache_token=tokens.cached_tokens,
+        asyncio.create_task(
+            store_usage_by_session(
+                source="Task-Execute-Continue",
+                model_name=self.model.model,
+                input_token=tokens.input_tokens,
+                output_token=tokens.output_tokens,
+                cache_token=tokens.cached_tokens,
+                session_id=task.session_id,
+            )
+        )
+
+        async with get_async_tx_session_direct() as session:
+            await tasks_history_service.create(
+                create_model=TaskHistoryCreateModel(
+                    task_id=task.id,
+                    state=TaskState(response_model.state),
+                    thinking=response_model.thinking,
+                    process=response_model.process,
+                ),
+                session=session,
+            )
+
+            await audits_log_service.create(
+                create_model=AuditLLMlogModel(
                     session_id=task.session_id,
-                )
+                    thinking=response_model.thinking,
+                    message=f"任务的状态和 Process 更新推进, 新状态为: {response_model.state}",
+                    tokens=tokens.model_dump(),
+                ).to_audit_log(),
+                session=session,
+            )
+
+            await tasks_workspace_service.update(
+                workspace_id=task.workspace_id,
+                update_model=TaskWorkspaceUpdateModel(process=response_model.process),
+                session=session,
             )
 
+        return response_model
+
+    async def running_task(
+        self, task_id: int, timeouts: int = 0, epoch: int | None = None
+    ):
+        """
+        Unit 触发任务继续执行. timeouts 为该任务已发生的阶段超时次数,
+        epoch 为持有执行租约时的世代.
+        """
+
+        try:
+            # 获取当前的执行单元的 output, 并根据 output 来更新 process.
             async with get_async_tx_session_direct() as session:
-                await tasks_history_service.create(
-                    create_model=TaskHistoryCreateModel(
-                        task_id=task.id,
-                        state=TaskState(response_model.state),
-                        thinking=response_model.thinking,
-                        process=response_model.process,
-                    ),
-                    session=session,
-                )
+                task = await tasks_service.get(task_id=task_id, session=session)
 
-                await audits_log_service.create(
-                    create_model=AuditLLMlogModel(
-                        session_id=task.session_id,
-                        thinking=response_model.thinking,
-                        message=f"任务的状态和 Process 更新推进, 新状态为: {response_model.state}",
-                        tokens=tokens.model_dump(),
-                    ).to_audit_log(),
-                    session=session,
+                # 任务正在被重构或已被取消. 这里不要再继续了.
+                if task.state in [TaskState.UPDATING, TaskState.CANCELLED]:
+                    return
+
+                workspace = await tasks_workspace_service.get(
+                    workspace_id=task.workspace_id, session=session
                 )
 
-                await tasks_workspace_service.update(
-                    workspace_id=task.workspace_id,
-                    update_model=TaskWorkspaceUpdateModel(
-                        process=response_model.process
-                    ),
-                    session=session,
+                process = workspace.process
+
+                curr_units = await tasks_unit_service.get_round_units(
+                    round_id=task.curr_round_id, session=session
                 )
 
+                curr_units_content = [
+                    TaskUnitDispatchInput.model_validate(unit).model_dump()
+                    for unit in curr_units
+                ]
+
+            # 根据 units 的反馈, 来更新当前的 process 以及任务状态
+            response_model = await self.advance_process(
+                task=task, process=process, units_content=curr_units_content
+            )
+
             if response_model.state == AgentTaskState.ACTIVATING:
                 async with get_async_tx_session_direct() as session:
                     await self.next_state(
@@ -753,9 +1417,10 @@ class TaskAgent(Agent):
                     )
 
                 # 生成执行单元
-                await self.generator_task_unit(task_id=task_id)
-                # 运行执行单元
-                await self.execute_task_unit(task_id=task_id)
+                async with stage_budget("generate_unit"):
+                    await self.generator_task_unit(task_id=task_id)
+                # 运行执行单元, 每个执行单元单独计算预算
+                await self.execute_task_unit(task_id=task_id, epoch=epoch)
             elif response_model.state == AgentTaskState.SCHEDULING:
                 async with get_async_tx_session_direct() as session:
                     await tasks_service.update(
@@ -770,6 +1435,9 @@ class TaskAgent(Agent):
                     await self.next_state(
                         task_id, new_state=response_model.state, session=session
                     )
+
+                # 按下次执行时间投递延迟消息
+                await call_soon_task(task_id=task_id)
             elif response_model.state == AgentTaskState.WAITING:
                 async with get_async_tx_session_direct() as session:
                     # waiting 需要用户补充信息
@@ -810,25 +1478,26 @@ class TaskAgent(Agent):
                         TaskUnitDispatchInput.model_validate(unit) for unit in all_units
                     ]
 
-                result_model, tokens = await self.run(
-                    output_type=TaskDispatchGeneratorResultOutput,
-                    input=[
-                        {
-                            "role": MessageRole.SYSTEM,
-                            "content": prompt.task_run_result_prompt(
-                                TaskDispatchGeneratorResultOutput
-                            ),
-                        },
-                        {
-                            "role": MessageRole.USER,
-                            "content": TaskDispatchGeneratorResultInput(
-                                prd=workspace.prd,
-                                process=workspace.process,
-                                all_units=all_units,
-                            ).to_json_markdown(),
-                        },
-                    ],
-                )
+                async with stage_budget("result"):
+                    result_model, tokens = await self.run(
+                        output_type=TaskDispatchGeneratorResultOutput,
+                        input=[
+                            {
+                                "role": MessageRole.SYSTEM,
+                                "content": prompt.task_run_result_prompt(
+                                    TaskDispatchGeneratorResultOutput
+                                ),
+                            },
+                            {
+                                "role": MessageRole.USER,
+                                "content": TaskDispatchGeneratorResultInput(
+                                    prd=workspace.prd,
+                                    process=workspace.process,
+                                    all_units=all_units,
+                                ).to_json_markdown(),
+                            },
+                        ],
+                    )
                 result_model: TaskDispatchGeneratorResultOutput
 
                 asyncio.create_task(
@@ -873,6 +1542,14 @@ class TaskAgent(Agent):
                     session_id=task.session_id,
                 )
 
+        except TaskStageTimeoutError as exc:
+            await handle_stage_timeout(
+                task_id=task_id,
+                topic=Dispatch.running_tasks_topic,
+                timeouts=timeouts,
+                exc=exc,
+                epoch=epoch,
+            )
         except Exception:
             logger.error(f"执行任务时失败: {traceback.format_exc()}")
 
@@ -902,7 +1579,9 @@ class TaskAgent(Agent):
 
             await XyzPlatformServer.send_task_refresh(session_id=task.session_id)
 
-    async def execute_task(self, task_id: int):
+    async def execute_task(
+        self, task_id: int, timeouts: int = 0, epoch: int | None = None
+    ):
         try:
             logger.info(f"就绪队列消费: {task_id}")
 
@@ -930,13 +1609,23 @@ class TaskAgent(Agent):
             await XyzPlatformServer.send_task_refresh(session_id=task.session_id)
 
             # 生成执行计划
-            await self.generator_task_planning(task_id=task_id)
+            async with stage_budget("planning"):
+                await self.generator_task_planning(task_id=task_id)
 
             # 生成执行单元
-            await self.generator_task_unit(task_id=task_id)
+            async with stage_budget("generate_unit"):
+                await self.generator_task_unit(task_id=task_id)
 
-            # 运行执行单元
-            await self.execute_task_unit(task_id=task_id)
+            # 运行执行单元, 每个执行单元单独计算预算
+            await self.execute_task_unit(task_id=task_id, epoch=epoch)
+        except TaskStageTimeoutError as exc:
+            await handle_stage_timeout(
+                task_id=task_id,
+                topic=Dispatch.ready_tasks_topic,
+                timeouts=timeouts,
+                exc=exc,
+                epoch=epoch,
+            )
         except Exception:
             logger.error(f"执行任务时失败: {traceback.format_exc()}")
 
@@ -1069,22 +1758,20 @@ async def get_agent_factory(
     session_id: str | None = None,
     mcp_server_infos: dict[str, Any] | None = None,
 ) -> TaskAgent:
-    model = None
     mcp_server_infos = mcp_server_infos or {}
 
     if not session_id and not task_id:
         raise Exception("缺少 SessionID 和 TaskID. 无法获取模型信息")
 
-    if session_id:
-        model = await get_llm_model(session_id=session_id)
-    elif task_id:
+    if not session_id and task_id:
         async with get_async_session_direct() as session:
             task = await tasks_service.get(task_id=task_id, session=session)
-            model = await get_llm_model(task.session_id)
             mcp_server_infos = task.mcp_server_infos
             session_id = task.session_id
 
     session_id = typing.cast("str", session_id)
+    model_data = await get_llm_model_data(session_id=session_id)
+    model = get_llm_model(model_data)
     convsess_info = await XyzPlatformServer.get_info_by_session_id(
         session_id=session_id
     )
@@ -1094,6 +1781,9 @@ async def get_agent_factory(
         instructions=prompt.get_instructions(),
         model=model,
         mcp_server_infos=mcp_server_infos,
+        limiter=limiter,
+        limit_key=(model_data.model_name, model_data.api_key),
+        retry_policy=Dispatch.agent_retry_policy,
         tools=[send_a2a_message, get_xyz_contenxt],
         ctx=XyzContext(
             session_id=session_id,
@@ -1109,6 +1799,7 @@ async def call_soon_task(task_id: int):
     尝试将任务添加到调度中
     """
 
+    outbox: BrokerOutboxCreateModel | None = None
     async with get_async_tx_session_direct() as session:
         task = await tasks_service.get(task_id=task_id, session=session)
         expect_execute_time = task.expect_execute_time.replace(tzinfo=timezone.utc)
@@ -1122,10 +1813,61 @@ async def call_soon_task(task_id: int):
                 ),
                 session=session,
             )
+            # 启用发件箱时与状态变更在同一事务中写入, 避免提交后、发送前崩溃导致任务丢失
+            outbox = await Dispatch.enqueue_to_ready_topic(
+                task_id=task.id,
+                priority=task.priority,
+                session_id=task.session_id,
+                session=session,
+            )
+
+    if outbox is not None:
+        await Dispatch.publish_ready_topic(outbox)
+        await XyzPlatformServer.send_task_refresh(session_id=task.session_id)
+    else:
+        await Dispatch.send_to_scheduled_topic(
+            task_id=task.id, deliver_at=expect_execute_time
+        )
+
+
+async def scheduled_task(task_id: int):
+    """
+    定时任务到期. 没有空闲的工作者时保持原状态, 由就绪任务生产者按空闲槽位认领
+    """
+    now = datetime.now(timezone.utc)
+    capacity = await Dispatch.has_ready_capacity()
+
+    outbox: BrokerOutboxCreateModel | None = None
+    async with get_async_tx_session_direct() as session:
+        claimed = capacity and await tasks_service.claim_dispatch_task(
+            task_id=task_id, now=now, session=session
+        )
+        task = await tasks_service.get(task_id=task_id, session=session)
+
+        if claimed:
+            outbox = await Dispatch.enqueue_to_ready_topic(
+                task_id=task.id,
+                priority=task.priority,
+                session_id=task.session_id,
+                session=session,
+            )
 
-    if expect_execute_time <= datetime.now(timezone.utc):
+    if outbox is not None:
+        await Dispatch.publish_ready_topic(outbox)
         await XyzPlatformServer.send_task_refresh(session_id=task.session_id)
-        await Dispatch.send_to_ready_topic(task_id=task.id)
+        return
+
+    if task.state not in [TaskState.INITIAL, TaskState.SCHEDULING]:
+        return
+
+    # 执行时间被推后了, 按新的执行时间重新调度
+    expect_execute_time = task.expect_execute_time.replace(tzinfo=timezone.utc)
+    if expect_execute_time > now:
+        await Dispatch.send_to_scheduled_topic(
+            task_id=task.id, deliver_at=expect_execute_time
+        )
+    elif not capacity:
+        logger.info(f"任务 {task_id} 已到期, 暂无空闲的工作者, 由就绪任务生产者认领")
 
 
 async def create_task(create_model: TaskDispatchCreateModel) -> Tasks | str:
@@ -1140,28 +1882,124 @@ async def create_task(create_model: TaskDispatchCreateModel) -> Tasks | str:
     return await agent.create_task(create_model=create_model)
 
 
+async def run_with_task_lease(
+    task_id: int, func: Callable[..., Coroutine[Any, Any, Any]], *args: Any
+) -> Any:
+    """
+    持有任务租约执行, 与该任务的 ready/running 消息互斥. 租约丢失时中止执行
+    """
+    try:
+        async with lease.hold(Dispatch.get_task_lease_key(task_id=task_id)):
+            return await Dispatch.run_cancellable(task_id, func(*args))
+    except RLeaseLostError:
+        logger.warning(f"任务 {task_id} 的租约已丢失, 中止执行")
+
+
 async def refactor_task(update_model: TaskDispatchRefactorModel) -> None:
     """
     重构任务
     """
     agent = await get_agent_factory(task_id=update_model.task_id)
-    asyncio.create_task(agent.refactor_task(update_model))
+    asyncio.create_task(
+        run_with_task_lease(update_model.task_id, agent.refactor_task, update_model)
+    )
 
 
-async def execute_task(task_id: int):
+async def execute_task(task_id: int, timeouts: int = 0, epoch: int | None = None):
     """
     开始执行任务
     """
     agent = await get_agent_factory(task_id=task_id)
-    return await agent.execute_task(task_id=task_id)
+    return await agent.execute_task(task_id=task_id, timeouts=timeouts, epoch=epoch)
 
 
-async def running_task(task_id: int):
+async def running_task(task_id: int, timeouts: int = 0, epoch: int | None = None):
     """
     继续运行任务
     """
     agent = await get_agent_factory(task_id=task_id)
-    return await agent.running_task(task_id=task_id)
+    return await agent.running_task(task_id=task_id, timeouts=timeouts, epoch=epoch)
+
+
+async def handle_stage_timeout(
+    task_id: int,
+    topic: str,
+    timeouts: int,
+    exc: TaskStageTimeoutError,
+    epoch: int | None = None,
+):
+    """
+    阶段超时: 记录超时, 未达到重试上限时按原阶段重新投递, 否则置为失败.
+    重新投递的消息携带持有执行租约时的世代 epoch
+    """
+    timeouts += 1
+    retry = timeouts <= Dispatch.stage_timeout_retries
+    logger.warning(f"任务 {task_id} 第 {timeouts} 次超时: {exc}, 重试: {retry}")
+
+    outbox: BrokerOutboxCreateModel | None = None
+    async with get_async_tx_session_direct() as session:
+        task = await tasks_service.get(task_id=task_id, session=session)
+
+        # 超时的阶段已被取消, 该轮次中未完成的 Unit 不会再运行.
+        # 就绪任务重试时会重新生成执行单元, 不会复用该轮次的 Unit
+        await tasks_unit_service.clear_round_units(
+            round_id=task.curr_round_id, session=session
+        )
+
+        if retry and topic == Dispatch.ready_tasks_topic:
+            # 就绪任务从头开始执行, 需要重新入队
+            await tasks_service.update(
+                task_id=task_id,
+                update_model=TaskUpdateModel(
+                    state=TaskState.QUEUING,
+                    lasted_execute_time=datetime.now(timezone.utc),
+                ),
+                session=session,
+            )
+            outbox = await Dispatch.enqueue_to_ready_topic(
+                task_id=task.id,
+                priority=task.priority,
+                session_id=task.session_id,
+                session=session,
+                timeouts=timeouts,
+                epoch=epoch,
+            )
+        elif not retry:
+            task = await tasks_service.update(
+                task_id=task_id,
+                update_model=TaskUpdateModel(state=TaskState.FAILED),
+                session=session,
+            )
+
+        await audits_log_service.create(
+            create_model=AuditLLMlogModel(
+                session_id=task.session_id,
+                thinking="任务阶段超过执行预算, 已取消该阶段."
+                + (" 将重新执行." if retry else " 超时次数过多, 将其置为 failed."),
+                message=f"任务 {task_id} 的 {exc.stage} 阶段超过 {exc.budget}s 预算 (第 {timeouts} 次)",
+                tokens=Tokens().model_dump(),
+            ).to_audit_log(),
+            session=session,
+        )
+
+    if retry and topic == Dispatch.running_tasks_topic:
+        await Dispatch.send_to_running_topic(
+            task_id=task_id,
+            session_id=task.session_id,
+            timeouts=timeouts,
+            epoch=epoch,
+        )
+    elif outbox is not None:
+        await Dispatch.publish_ready_topic(outbox)
+    elif not retry:
+        await XyzPlatformServer.send_task_result_notify(
+            task_id=str(task.id),
+            task_name=task.name,
+            state=task.state,
+            session_id=task.session_id,
+        )
+
+    await XyzPlatformServer.send_task_refresh(session_id=task.session_id)
 
 
 async def add_user_message(task_id: int, user_message: str) -> None:
@@ -1169,10 +2007,12 @@ async def add_user_message(task_id: int, user_message: str) -> None:
     用户补充任务信息
     """
     agent = await get_agent_factory(task_id=task_id)
-    asyncio.create_task(agent.waiting_task(task_id=task_id, user_message=user_message))
+    asyncio.create_task(
+        run_with_task_lease(task_id, agent.waiting_task, task_id, user_message)
+    )
 
 
-async def review_task(task_id: int):
+async def review_task(task_id: int, reason: str | None = None):
     """
     检查任务
     """
@@ -1189,10 +2029,40 @@ async def review_task(task_id: int):
             create_model=AuditLLMlogModel(
                 session_id=task.session_id,
                 thinking="任务超时了.",
-                message=f"任务 {task_id} 调度超过特定时间. 最后进入调度队列的时间: {task.lasted_execute_time}",
+                message=reason
+                or f"任务 {task_id} 调度超过特定时间. 最后调度的时间: {task.lasted_execute_time}",
                 tokens=Tokens().model_dump(),
             ).to_audit_log(),
             session=session,
         )
 
     await XyzPlatformServer.send_task_refresh(session_id=task.session_id)
+
+
+async def recover_task(task_id: int, topic: str, losses: int):
+    """
+    执行租约过期 (如工作者崩溃) 的任务. 丢失次数未达到上限时按原阶段重新投递, 否则置为失败
+    """
+    async with get_async_session_direct() as session:
+        task = await tasks_service.get(task_id=task_id, session=session)
+
+    if task.state not in [TaskState.QUEUING, TaskState.ACTIVATING]:
+        return
+
+    if losses >= Dispatch.task_lease_max_losses:
+        logger.warning(f"任务 {task_id} 的执行租约已丢失 {losses} 次, 置为失败")
+        await review_task(
+            task_id=task_id,
+            reason=f"任务 {task_id} 的执行租约已丢失 {losses} 次, 执行该任务的工作者多次异常退出",
+        )
+        return
+
+    logger.warning(f"任务 {task_id} 的执行租约已过期 (第 {losses} 次), 重新投递")
+    if topic == Dispatch.running_tasks_topic:
+        await Dispatch.send_to_running_topic(
+            task_id=task_id, session_id=task.session_id
+        )
+    else:
+        await Dispatch.send_to_ready_topic(
+            task_id=task_id, priority=task.priority, session_id=task.session_id
+        )
@@ -0,0 +1,22 @@
+import fastapi
+
+from core.shared.models.http import ResponseModel
+from core.shared.components.redis.limiter import RLimiterInfo
+
+from . import service
+
+
+controller = fastapi.APIRouter(prefix="/llm-limiter", tags=["LLM-Limiter"])
+
+
+@controller.get(
+    path="/inspect",
+    name="查看 LLM 限流的槽位、令牌与本进程的等待时间",
+    status_code=fastapi.status.HTTP_200_OK,
+    response_model=ResponseModel[list[RLimiterInfo]],
+)
+async def inspect(
+    name: str | None = fastapi.Query(default=None, description="为空时返回所有模型"),
+) -> ResponseModel[list[RLimiterInfo]]:
+    result = await service.inspect(name=name)
+    return ResponseModel(result=result)
@@ -0,0 +1,9 @@
+from core.shared.globals import limiter
+from core.shared.components.redis.limiter import RLimiterInfo
+
+
+async def inspect(name: str | None = None) -> list[RLimiterInfo]:
+    infos = await limiter.inspect()
+    if name is not None:
+        infos = [info for info in infos if info.name == name]
+    return infos
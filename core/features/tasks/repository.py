@@ -1,5 +1,5 @@
 import asyncio
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import override, Any
 from collections.abc import Sequence
 
@@ -237,9 +237,10 @@ class TasksCrudRepository(BaseCRUDRepository[Tasks]):
             stmt=query_stmt,
         )
 
-    async def get_dispatch_tasks_id(self) -> Sequence[int]:
+    async def get_dispatch_tasks(self, limit: int) -> Sequence[tuple[int, int, str]]:
+        """获取最多 limit 个到期任务并置为 QUEUING. 返回 (任务 ID, 优先级, 会话 ID)."""
         stmt = (
-            sa.select(self.model.id)
+            sa.select(self.model.id, self.model.priority, self.model.session_id)
             .where(
                 sa.not_(self.model.is_deleted),
                 self.model.state.in_([TaskState.INITIAL, TaskState.SCHEDULING]),
@@ -250,23 +251,39 @@ class TasksCrudRepository(BaseCRUDRepository[Tasks]):
                 self.model.priority.desc(),
                 self.model.created_at.asc(),
             )
+            .limit(limit)
             .with_for_update(skip_locked=True)
         )
 
         result = await self.session.execute(stmt)
 
-        tasks_id = result.scalars().unique().all()
+        tasks = [(row.id, row.priority, row.session_id) for row in result.all()]
 
         await self.session.execute(
             sa.update(self.model)
-            .where(self.model.id.in_(tasks_id))
+            .where(self.model.id.in_([task[0] for task in tasks]))
             .values(state=TaskState.QUEUING, lasted_execute_time=sa.func.now())
         )
 
-        return tasks_id
+        return tasks
+
+    async def claim_dispatch_task(self, task_id: int, now: datetime) -> bool:
+        """原子地将一个到期的 INITIAL/SCHEDULING 任务置为 QUEUING. 返回是否抢占成功."""
+        result = await self.session.execute(
+            sa.update(self.model)
+            .where(
+                self.model.id == task_id,
+                sa.not_(self.model.is_deleted),
+                self.model.state.in_([TaskState.INITIAL, TaskState.SCHEDULING]),
+                self.model.expect_execute_time <= now,
+            )
+            .values(state=TaskState.QUEUING, lasted_execute_time=sa.func.now())
+        )
+
+        return result.rowcount > 0  # pyright: ignore[reportAttributeAccessIssue]
 
     async def get_review_tasks_id(self) -> Sequence[int]:
-        # 入队时间或者 ACTIVATING 运行超过 20 分钟的
+        # 最后调度 (入队或开始执行某一跳) 超过 20 分钟的
         stmt = sa.select(self.model.id).where(
             sa.not_(self.model.is_deleted),
             self.model.state.in_([TaskState.ACTIVATING, TaskState.QUEUING]),
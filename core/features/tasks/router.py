@@ -3,6 +3,7 @@ from fastapi import Depends
 from typing import Literal
 
 from core.shared.enums import TaskState
+from core.shared.globals import canceller
 from core.shared.database.session import (
     get_async_session,
     get_async_tx_session,
@@ -17,6 +18,7 @@ from core.shared.models.http import (
 )
 
 from . import service
+from ..tasks_unit import service as tasks_unit_service
 from .models import (
     TaskInXyzModel,
     TaskInCrudModel,
@@ -149,12 +151,19 @@ async def create(
 )
 async def update(
     update_model: TaskUpdateModel,
+    background_tasks: fastapi.BackgroundTasks,
     task_id: int = fastapi.Path(description="任务 ID"),
     session: AsyncTxSession = Depends(get_async_tx_session),
 ) -> ResponseModel[TaskInCrudModel]:
     db_obj = await service.update(
         task_id=task_id, update_model=update_model, session=session
     )
+
+    if update_model.state == TaskState.CANCELLED:
+        await tasks_unit_service.cancel_by_task(task_id=task_id, session=session)
+        # 事务提交后广播取消, 中止所有进程中该任务正在进行的 LLM 调用
+        background_tasks.add_task(canceller.cancel, str(task_id))
+
     return ResponseModel(result=TaskInCrudModel.model_validate(db_obj))
 
 
@@ -1,3 +1,4 @@
+from datetime import datetime
 from collections.abc import Sequence
 
 from core.shared.enums import TaskState
@@ -66,9 +67,18 @@ async def upget_paginator(paginator: Paginator, session: AsyncSession) -> Pagina
     return await repo.upget_paginator(paginator=paginator)
 
 
-async def get_dispatch_tasks_id(session: AsyncTxSession) -> Sequence[int]:
+async def get_dispatch_tasks(
+    limit: int, session: AsyncTxSession
+) -> Sequence[tuple[int, int, str]]:
     repo = TasksCrudRepository(session=session)
-    return await repo.get_dispatch_tasks_id()
+    return await repo.get_dispatch_tasks(limit=limit)
+
+
+async def claim_dispatch_task(
+    task_id: int, now: datetime, session: AsyncTxSession
+) -> bool:
+    repo = TasksCrudRepository(session=session)
+    return await repo.claim_dispatch_task(task_id=task_id, now=now)
 
 
 async def get_review_tasks_id(session: AsyncTxSession) -> Sequence[int]:
@@ -55,6 +55,20 @@ class TasksUnitRepository(BaseCRUDRepository[TasksUnit]):
             .values(state=TaskUnitState.CANCELLED)
         )
 
+    async def cancel_by_task(self, task_id: int):
+        """将任务所有未结束的执行单元置为 CANCELLED"""
+        await self.session.execute(
+            sa.update(self.model)
+            .where(
+                self.model.task_id == task_id,
+                sa.not_(self.model.is_deleted),
+                self.model.state.not_in(
+                    [TaskUnitState.COMPLETE, TaskUnitState.CANCELLED]
+                ),
+            )
+            .values(state=TaskUnitState.CANCELLED)
+        )
+
     async def get_by_task(self, task_id: int) -> Sequence[TasksUnit]:
         stmt = sa.select(self.model).where(
             self.model.task_id == task_id,
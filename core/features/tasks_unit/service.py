@@ -72,3 +72,8 @@ async def clear_round_units(
 
     repo = TasksUnitRepository(session=session)
     return await repo.clear_round_units(round_id=round_id)
+
+
+async def cancel_by_task(task_id: int, session: AsyncTxSession) -> None:
+    repo = TasksUnitRepository(session=session)
+    return await repo.cancel_by_task(task_id=task_id)
@@ -8,6 +8,8 @@ from .features.tasks_history.router import controller as histories_controller
 from .features.tasks_workspace.router import controller as workspaces_controller
 
 from .features.audits_log.router import controller as audits_log_controller
+from .features.broker.router import controller as broker_controller
+from .features.llm_limiter.router import controller as llm_limiter_controller
 
 
 api_router = fastapi.APIRouter()
@@ -18,3 +20,5 @@ api_router.include_router(chats_controller)
 api_router.include_router(histories_controller)
 api_router.include_router(workspaces_controller)
 api_router.include_router(audits_log_controller)
+api_router.include_router(broker_controller)
+api_router.include_router(llm_limiter_controller)
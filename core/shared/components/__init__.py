@@ -3,5 +3,19 @@ from .openai.agent import Agent
 from .redis.broker import RBroker
 from .redis.cacher import RCacher
 from .redis.session import RSession
+from .redis.lease import RLease, RLeader, RLeaseTable
+from .redis.cancel import RCancelRegistry
+from .redis.limiter import RLimiter, RLimiterPolicy
 
-__all__ = ["Agent", "RBroker", "RCacher", "RSession"]
+__all__ = [
+    "Agent",
+    "RBroker",
+    "RCacher",
+    "RSession",
+    "RLease",
+    "RLeader",
+    "RLeaseTable",
+    "RCancelRegistry",
+    "RLimiter",
+    "RLimiterPolicy",
+]
@@ -1,4 +1,10 @@
-from collections.abc import Callable
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Callable, AsyncIterator, Awaitable
 from typing import Any, TypeVar
 from contextlib import AsyncExitStack, asynccontextmanager
 
@@ -14,12 +20,30 @@ from agents.items import TResponseInputItem
 from agents.result import RunResult, RunResultStreaming
 from agents.util._types import MaybeAwaitable
 from agents.mcp import MCPServerStdio, MCPServerSse, MCPServerSseParams, MCPServer
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from pydantic import Field
 
 from core.shared.base.models import LLMOutputModel, BaseModel
 
 from ..redis.session import RSession
+from ..redis.limiter import RLimiter, RLimiterPermit
 
 OutputSchemaType = TypeVar("OutputSchemaType", LLMOutputModel, AgentOutputSchemaBase)
+T = TypeVar("T")
+
+# 可重试的瞬时异常: 单次调用超时, 以及模型服务的连接、超时、限流与 5xx 错误
+RETRYABLE_ERRORS: tuple[type[Exception], ...] = (
+    TimeoutError,
+    APIConnectionError,
+    APITimeoutError,
+    RateLimitError,
+    InternalServerError,
+)
 
 
 class Tokens(BaseModel):
@@ -53,6 +77,57 @@ async def get_mcp_servers(mcp_servers: dict[str, Any]):
     return servers
 
 
+class AgentRetryPolicy(BaseModel):
+    """
+    Agent.run 的超时、重试与对冲策略.
+    对冲仅用于没有会话的调用: 首个请求耗时超过历史分位数后发起第二个请求,
+    先成功者胜出, 另一个被取消, token 用量只计入胜出的请求.
+    """
+
+    timeout: float | None = Field(
+        default=None, gt=0, description="单次调用的超时秒数, 为空时不限制"
+    )
+    max_attempts: int = Field(default=1, ge=1, description="最大尝试次数, 1 为不重试")
+    base_delay: float = Field(default=1.0, gt=0, description="首次重试的延迟秒数")
+    max_delay: float = Field(default=30.0, gt=0, description="重试延迟的上限秒数")
+    hedge: bool = Field(default=False, description="是否启用对冲请求")
+    hedge_quantile: float = Field(
+        default=0.95, gt=0, lt=1, description="发起对冲请求的耗时分位数"
+    )
+    hedge_min_samples: int = Field(
+        default=20, ge=1, description="耗时样本不足该数量时不发起对冲请求"
+    )
+    hedge_min_delay: float = Field(
+        default=1.0, ge=0, description="发起对冲请求前的最短等待秒数"
+    )
+
+    def backoff(self, attempts: int) -> float:
+        """第 attempts 次失败后的重试延迟 (指数退避 + equal jitter)."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+class AgentLatencyWindow:
+    """本进程内最近若干次成功调用的耗时, 用于计算对冲请求的触发时间."""
+
+    def __init__(self, size: int = 256):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def estimate_tokens(input: str | list[Any]) -> int:
+    """粗略估算输入的 token 数, 用于限流预扣, 调用结束后按实际用量结算."""
+    if not isinstance(input, str):
+        input = json.dumps(input, ensure_ascii=False, default=str)
+    return len(input) // 3
+
+
 async def close_mcp_servers(mcp_servers: list[MCPServer]):
     for server in reversed(mcp_servers):
         await server.cleanup()
@@ -64,8 +139,13 @@ class Agent:
 
     - 支持 Agent 多轮会话 session (每次会话用不同的 session 或统一用 Agent 创建时的 session 实现关联对话).
     - 支持 Agent 每次 run 的时候生成不同的结构化对象.
+    - 支持通过 limiter 按 limit_key (模型名称, API Key) 限制跨进程的并发数与 token 速率.
+    - 支持通过 retry_policy 为每次 run 设置超时、瞬时异常重试与对冲请求.
     """
 
+    # 按模型与输出类型统计的调用耗时, 同一进程内的所有 Agent 共享
+    latencies: dict[str, AgentLatencyWindow] = {}
+
     @asynccontextmanager
     async def _build_agent(self, output_type: type[OutputSchemaType] | None = None):
         servers: list[MCPServer] = []
@@ -116,6 +196,9 @@ class Agent:
         mcp_server_infos: dict[str, Any] | None = None,
         session: RSession | None = None,
         ctx: Any | None = None,
+        limiter: RLimiter | None = None,
+        limit_key: tuple[str, str] | None = None,
+        retry_policy: AgentRetryPolicy | None = None,
         **kwargs: Any,
     ):
         self.name = name
@@ -124,7 +207,43 @@ class Agent:
         self.mcp_server_infos = mcp_server_infos or {}
         self.session = session
         self.ctx = ctx
+        self.limiter = limiter
+        self.limit_key = limit_key
+        self.retry_policy = retry_policy or AgentRetryPolicy()
         self.kwargs = kwargs
+        self._streams: set[asyncio.Task[None]] = set()
+
+    @asynccontextmanager
+    async def _limit(
+        self, input: str | list[Any]
+    ) -> AsyncIterator[RLimiterPermit | None]:
+        if self.limiter is None or self.limit_key is None:
+            yield None
+            return
+
+        name, scope = self.limit_key
+        async with self.limiter.acquire(
+            name, scope, tokens=estimate_tokens(input)
+        ) as permit:
+            yield permit
+
+    @staticmethod
+    async def _settle_streamed(
+        result: RunResultStreaming, permit: RLimiterPermit | None, stack: AsyncExitStack
+    ):
+        """流式运行结束后结算 token 并释放限流许可."""
+        try:
+            while not result.is_complete:
+                await asyncio.sleep(0.5)
+            if permit is not None:
+                usage = result.context_wrapper.usage
+                await permit.settle(
+                    (usage.input_tokens or 0) + (usage.output_tokens or 0)
+                )
+        except Exception as e:
+            logging.error(f"Settle streamed run error: {e}")
+        finally:
+            await stack.aclose()
 
     async def run_streamed(
         self,
@@ -133,32 +252,138 @@ class Agent:
         output_type: type[OutputSchemaType] | None = None,
         **kwargs: Any,
     ) -> RunResultStreaming:
-        async with self._build_agent(output_type) as agent:
-            return Runner.run_streamed(
-                agent, input=input, session=session or self.session, context=self.ctx
+        stack = AsyncExitStack()
+        permit = await stack.enter_async_context(self._limit(input))
+        try:
+            async with self._build_agent(output_type) as agent:
+                result = Runner.run_streamed(
+                    agent,
+                    input=input,
+                    session=session or self.session,
+                    context=self.ctx,
+                )
+        except BaseException:
+            await stack.aclose()
+            raise
+
+        # 许可在流式运行结束后才释放
+        settle = asyncio.create_task(self._settle_streamed(result, permit, stack))
+        self._streams.add(settle)
+        settle.add_done_callback(self._streams.discard)
+        return result
+
+    def _latency(self, output_type: type[Any] | None) -> AgentLatencyWindow:
+        model = self.limit_key[0] if self.limit_key else self.model
+        model = getattr(model, "model", model)
+        key = f"{model}:{output_type.__name__ if output_type else ''}"
+        return self.latencies.setdefault(key, AgentLatencyWindow())
+
+    async def _run_once(
+        self,
+        input: str | list[dict[str, Any]],
+        session: RSession | None,
+        output_type: type[OutputSchemaType] | None,
+        timeout: float | None,
+    ) -> tuple[RunResult, Tokens]:
+        async with self._limit(input) as permit:
+            # 耗时不含限流排队, 避免排队时误触发对冲请求
+            started = time.monotonic()
+            async with asyncio.timeout(timeout):
+                async with self._build_agent(output_type) as agent:
+                    run_result = await Runner.run(
+                        agent,
+                        input=input,  # pyright: ignore[reportArgumentType]
+                        session=session,
+                        context=self.ctx,
+                    )
+
+            usage = run_result.context_wrapper.usage
+            tokens = Tokens(
+                input_tokens=usage.input_tokens or 0,
+                output_tokens=usage.output_tokens or 0,
+                cached_tokens=usage.input_tokens_details.cached_tokens or 0,
             )
+            if permit is not None:
+                await permit.settle(tokens.input_tokens + tokens.output_tokens)
+
+        self._latency(output_type).record(time.monotonic() - started)
+        return run_result, tokens
+
+    @staticmethod
+    async def _hedged(call: Callable[[], Awaitable[T]], delay: float) -> T:
+        """delay 秒内 call 未完成时再发起一次, 返回先成功的结果并取消另一个."""
+        tasks = {asyncio.ensure_future(call())}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tasks.add(asyncio.ensure_future(call()))
+
+            error: BaseException | None = None
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def run(
         self,
         input: str | list[dict[str, Any]],
         session: RSession | None = None,
         output_type: type[OutputSchemaType] | None = None,
+        retry_policy: AgentRetryPolicy | None = None,
         **kwargs: Any,
     ) -> tuple[RunResult | OutputSchemaType, Tokens]:
-        async with self._build_agent(output_type) as agent:
-            run_result = await Runner.run(
-                agent,
-                input=input,  # pyright: ignore[reportArgumentType]
-                session=session or self.session,
-                context=self.ctx,
-            )
+        """
+        运行 Agent. 瞬时异常按 retry_policy 退避重试, 有会话时重试前回滚本次写入的会话记录.
+        """
+        policy = retry_policy or self.retry_policy
+        session = session or self.session
+        latency = self._latency(output_type)
+
+        attempts = 0
+        while True:
+            attempts += 1
+            saved = len(await session.get_items()) if session else 0
 
-        tokens = Tokens(
-            input_tokens=run_result.context_wrapper.usage.input_tokens or 0,
-            output_tokens=run_result.context_wrapper.usage.output_tokens or 0,
-            cached_tokens=run_result.context_wrapper.usage.input_tokens_details.cached_tokens
-            or 0,
-        )
+            def call() -> Awaitable[tuple[RunResult, Tokens]]:
+                return self._run_once(input, session, output_type, policy.timeout)
+
+            try:
+                if (
+                    policy.hedge
+                    and session is None
+                    and len(latency.samples) >= policy.hedge_min_samples
+                ):
+                    delay = max(
+                        policy.hedge_min_delay, latency.quantile(policy.hedge_quantile)
+                    )
+                    run_result, tokens = await self._hedged(call, delay)
+                else:
+                    run_result, tokens = await call()
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempts >= policy.max_attempts:
+                    raise
+
+                if session:
+                    for _ in range(len(await session.get_items()) - saved):
+                        await session.pop_item()
+
+                delay = policy.backoff(attempts)
+                logging.warning(
+                    f"Agent '{self.name}' run failed ({type(e).__name__}: {e}), "
+                    f"retry {attempts}/{policy.max_attempts - 1} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
 
         if output_type is not None:
             return run_result.final_output_as(output_type), tokens
@@ -1,18 +1,135 @@
+import os
+import uuid
+import time
+import random
+import socket
 import logging
 import asyncio
+import functools
 from asyncio import Queue
+from collections import OrderedDict, deque
 from typing import Any, TypeAlias
 from collections.abc import Callable, Coroutine
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 from redis.typing import FieldT, EncodableT
 from redis.exceptions import ResponseError
 from pydantic import BaseModel, Field
 
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+from core.shared.base import models as base_models
+from core.shared.database import memory
 from core.shared.database.redis import get_client
 
+from .lease import RLease
+
 RbrokerMessage: TypeAlias = Any
 
+# 将到期的延迟消息原子地从 ZSET 搬运到 Stream 中.
+# KEYS[1]: 延迟 ZSET, KEYS[2]: 延迟消息负载 HASH, KEYS[3]: 目标 Stream
+# ARGV[1]: 当前时间戳 (ms), ARGV[2]: 单次最多搬运数量
+PROMOTE_DELAYED_SCRIPT = """
+local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(members) do
+    local payload = redis.call('HGET', KEYS[2], member)
+    if payload then
+        redis.call('XADD', KEYS[3], '*', 'message', payload)
+    end
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('HDEL', KEYS[2], member)
+end
+return #members
+"""
+
+# 去重投递: 仅当去重键不存在时写入 Stream, 二者原子执行.
+# KEYS[1]: 去重键, KEYS[2]: 目标 Stream
+# ARGV[1]: 本次投递的 token, ARGV[2]: 去重键过期时间 (ms), ARGV[3]: 消息负载
+DEDUP_SEND_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return redis.call('XADD', KEYS[2], '*', 'message', ARGV[3])
+end
+return false
+"""
+
+# 开始消费去重消息: 已有完成标记时返回 0, 否则释放去重键 (仍属于本次投递时) 并返回 1.
+# 去重键在消费开始时释放, 使处理过程中产生的下一步消息可以正常投递.
+# KEYS[1]: 去重键, KEYS[2]: 完成标记
+# ARGV[1]: 本次投递的 token
+DEDUP_BEGIN_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+# 将死信消息重新投递到原 topic. 仅当消息仍在死信队列中时才会投递, 保证同一条死信只被重放一次.
+# KEYS[1]: 死信 Stream, KEYS[2]: 原 topic Stream
+# ARGV[1]: 死信消息 ID, ARGV[2]: 重放的消息负载
+REPLAY_DLQ_SCRIPT = """
+if redis.call('XDEL', KEYS[1], ARGV[1]) == 1 then
+    redis.call('XADD', KEYS[2], '*', 'message', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+# ---- 内存后端中与上述 Lua 脚本等价的实现
+
+
+@memory.script_fallback(PROMOTE_DELAYED_SCRIPT)
+async def _promote_delayed(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> int:
+    members = await client.zrangebyscore(
+        keys[0], "-inf", args[0], start=0, num=int(args[1])
+    )
+    for member in members:
+        payload = await client.hget(keys[1], member)
+        if payload is not None:
+            await client.xadd(keys[2], {"message": payload})
+        await client.zrem(keys[0], member)
+        await client.hdel(keys[1], member)
+    return len(members)
+
+
+@memory.script_fallback(DEDUP_SEND_SCRIPT)
+async def _dedup_send(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> str | None:
+    if await client.set(keys[0], args[0], nx=True, px=int(args[1])):
+        return await client.xadd(keys[1], {"message": args[2]})
+    return None
+
+
+@memory.script_fallback(DEDUP_BEGIN_SCRIPT)
+async def _dedup_begin(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> int:
+    if await client.exists(keys[1]):
+        return 0
+    if await client.get(keys[0]) == args[0]:
+        await client.delete(keys[0])
+    return 1
+
+
+@memory.script_fallback(REPLAY_DLQ_SCRIPT)
+async def _replay_dlq(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> int:
+    if await client.xdel(keys[0], args[0]) == 1:
+        await client.xadd(keys[1], {"message": args[1]})
+        return 1
+    return 0
+
 
 class RbrokerPayloadMetadata(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -30,41 +147,764 @@ class RbrokerPayload(BaseModel):
     exc_info: RbrokerPayloadExcInfo | None = Field(default=None)
 
 
+class RbrokerCodec:
+    """
+    消息负载编解码器. 编码结果以 tag 开头以便识别格式, tag 为空表示 JSON (兼容无前缀的历史消息).
+    所有副本都能解码全部格式, 因此切换编码格式时新旧副本可以共存.
+    """
+
+    name: str = ""
+    tag: bytes = b""
+
+    def encode(self, payload: RbrokerPayload) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> RbrokerPayload:
+        raise NotImplementedError
+
+
+class RbrokerJsonCodec(RbrokerCodec):
+    name = "json"
+
+    def encode(self, payload: RbrokerPayload) -> bytes:
+        return payload.model_dump_json(exclude_none=True).encode()
+
+    def decode(self, data: bytes) -> RbrokerPayload:
+        return RbrokerPayload.model_validate_json(data)
+
+
+class RbrokerMsgpackCodec(RbrokerCodec):
+    name = "msgpack"
+    tag = b"\x01"
+
+    def encode(self, payload: RbrokerPayload) -> bytes:
+        if msgpack is None:
+            raise RuntimeError("msgpack is required for the msgpack codec")
+        return self.tag + msgpack.packb(
+            payload.model_dump(mode="json", exclude_none=True)
+        )
+
+    def decode(self, data: bytes) -> RbrokerPayload:
+        if msgpack is None:
+            raise RuntimeError("msgpack is required for the msgpack codec")
+        return RbrokerPayload.model_validate(msgpack.unpackb(data[len(self.tag) :]))
+
+
+RBROKER_CODECS: dict[str, RbrokerCodec] = {
+    codec.name: codec for codec in (RbrokerJsonCodec(), RbrokerMsgpackCodec())
+}
+
+
+class RbrokerRetryPolicy(BaseModel):
+    """
+    消费失败时的重试策略. 重试通过延迟消息重新投递, 超过最大次数后进入死信队列.
+    """
+
+    max_attempts: int = Field(default=1, ge=1, description="最大尝试次数, 1 为不重试")
+    base_delay: float = Field(default=1.0, gt=0, description="首次重试的延迟秒数")
+    max_delay: float = Field(default=60.0, gt=0, description="重试延迟的上限秒数")
+    jitter: bool = Field(default=True, description="是否为延迟加入随机抖动")
+
+    def backoff(self, attempts: int) -> float:
+        """第 attempts 次失败后的重试延迟 (指数退避 + equal jitter)."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        if self.jitter:
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        return delay
+
+
+@dataclass
+class RbrokerWorkerPool:
+    """
+    消费者组的工作者池. idle_timeout 为空时为固定大小的池, 否则在
+    [min_workers, max_workers] 之间根据积压自动伸缩.
+    """
+
+    min_workers: int
+    max_workers: int
+    idle_timeout: float | None = None
+    workers: set[asyncio.Task[None]] = field(default_factory=set)
+    idle: int = 0
+    serial: int = 0
+
+    @property
+    def adaptive(self) -> bool:
+        return self.idle_timeout is not None
+
+
+class RbrokerFairQueue:
+    """
+    按 key 轮询的公平队列. 同一 key 最多同时被 limit 个工作者处理, 有待处理消息的 key
+    之间轮流出队, 避免单个 key 的突发消息占满所有工作者.
+    单个 key 最多积压 backlog_limit 个消息, 为空时按 maxsize / (key 数 + 1) 计算,
+    始终为新的 key 预留空间.
+    """
+
+    def __init__(
+        self,
+        key: Callable[[Any], str],
+        limit: int,
+        maxsize: int = 0,
+        backlog_limit: int | None = None,
+    ):
+        self._key = key
+        self._limit = limit
+        self._maxsize = maxsize
+        self._backlog_limit = backlog_limit
+        self._size = 0
+        # 有待处理消息的 key, 按轮询顺序排列
+        self._pending: OrderedDict[str, deque[Any]] = OrderedDict()
+        self._running: dict[str, int] = {}
+        self._changed = asyncio.Condition()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def backlog_limit(self) -> int | None:
+        """单个 key 的积压上限, None 为不限制."""
+        if self._backlog_limit is not None:
+            return self._backlog_limit
+        if not self._maxsize:
+            return None
+        return max(1, self._maxsize // (len(self._pending) + 1))
+
+    def admits(self, job: Any) -> bool:
+        """job 能否立即入队. 队列已满或其 key 的积压达到上限时返回 False."""
+        if self._maxsize and self._size >= self._maxsize:
+            return False
+        limit = self.backlog_limit()
+        pending = self._pending.get(self._key(job))
+        return limit is None or (len(pending) if pending else 0) < limit
+
+    def _pop(self) -> Any | None:
+        for key, pending in self._pending.items():
+            if self._running.get(key, 0) >= self._limit:
+                continue
+
+            job = pending.popleft()
+            if pending:
+                self._pending.move_to_end(key)
+            else:
+                del self._pending[key]
+
+            self._running[key] = self._running.get(key, 0) + 1
+            self._size -= 1
+            return job
+
+        return None
+
+    async def put(self, job: Any):
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: not self._maxsize or self._size < self._maxsize
+            )
+            self._pending.setdefault(self._key(job), deque()).append(job)
+            self._size += 1
+            self._changed.notify_all()
+
+    async def get(self) -> Any:
+        async with self._changed:
+            while (job := self._pop()) is None:
+                await self._changed.wait()
+            self._changed.notify_all()
+            return job
+
+    async def release(self, job: Any):
+        """job 处理完成, 释放其 key 占用的并发."""
+        key = self._key(job)
+        async with self._changed:
+            self._running[key] -= 1
+            if not self._running[key]:
+                del self._running[key]
+            self._changed.notify_all()
+
+
+RbrokerQueue: TypeAlias = Queue[Any] | RbrokerFairQueue
+
+
+class RbrokerConsumerInfo(base_models.BaseModel):
+    name: str
+    pending: int = Field(description="该消费者的挂起消息数")
+    idle_ms: int = Field(description="该消费者距上次活动的毫秒数")
+
+
+class RbrokerGroupInfo(base_models.BaseModel):
+    name: str
+    lag: int | None = Field(description="尚未投递给该消费者组的消息数")
+    pending: int = Field(description="已投递但尚未 ACK 的消息数")
+    oldest_pending_age_ms: int | None = Field(
+        description="最早一条挂起消息自写入 Stream 起经过的毫秒数"
+    )
+    oldest_pending_idle_ms: int | None = Field(
+        description="最早一条挂起消息自上次投递起经过的毫秒数"
+    )
+    consumers: list[RbrokerConsumerInfo]
+    queue_size: int | None = Field(
+        default=None, description="本进程内等待工作者处理的消息数"
+    )
+    workers: int | None = Field(default=None, description="本进程的工作者数量")
+    idle_workers: int | None = Field(
+        default=None, description="本进程空闲的工作者数量"
+    )
+    inflight: int | None = Field(
+        default=None, description="本进程已读取但尚未 ACK 的消息数"
+    )
+
+
+class RbrokerTopicInfo(base_models.BaseModel):
+    topic: str
+    length: int = Field(description="Stream 长度")
+    delayed: int = Field(description="等待投递的延迟消息数")
+    dlq_length: int = Field(description="死信队列长度")
+    groups: list[RbrokerGroupInfo]
+
+
+def _stream_id(message_id: str) -> tuple[int, int]:
+    ms, _, seq = message_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
 class RBroker:
-    def __init__(self):
+    def __init__(
+        self,
+        dlq_maxlen: int = 10_000,
+        lease: RLease | None = None,
+        codec: str = "json",
+        retention_max_age: int | None = None,
+        retention_maxlen: int | None = None,
+    ):
+        """
+        - retention_max_age: Stream 中消息的最长保留秒数, 超过后即使未被 ACK 也会被裁剪.
+        - retention_maxlen: Stream 的最大长度 (近似), 超过后即使未被 ACK 也会被裁剪.
+        二者为空时, 仅裁剪所有消费者组均已 ACK 的消息.
+        """
         self._consumer_tasks: list[asyncio.Task[None]] = []
-        self._dlq_maxlen = 1000
+        self._dlq_maxlen = dlq_maxlen
+        if codec not in RBROKER_CODECS:
+            raise ValueError(f"Unknown broker codec '{codec}'")
+        if codec == RbrokerMsgpackCodec.name and msgpack is None:
+            raise RuntimeError("msgpack is required for the msgpack codec")
+        self._codec = RBROKER_CODECS[codec]
+        self._retry_policies: dict[tuple[str, str], RbrokerRetryPolicy] = {}
+        self._topics: set[str] = set()
+        self._delayed_batch_size = 100
+        self._delayed_interval = 0.5
+        self._ack_buffers: dict[tuple[str, str], list[str]] = {}
+        self._ack_events: dict[tuple[str, str], asyncio.Event] = {}
+        self._ack_batch_sizes: dict[tuple[str, str], int] = {}
+        self._ack_interval = 0.2
+        # 进程级唯一的消费者标识, 避免不同副本之间的消费者名称 (以及 PEL) 冲突
+        self._consumer_id = (
+            f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        )
+        # 本进程已读取但尚未 ACK 的消息. 由 _reclaim_listen 定期续期, 防止被其他副本抢占
+        self._inflight: dict[tuple[str, str], set[str]] = {}
+        self._prune_idle_ms = 600_000
+        self._consumer_queues: dict[tuple[str, str], RbrokerQueue] = {}
+        self._worker_pools: dict[tuple[str, str], RbrokerWorkerPool] = {}
+        self._fair_defer = 2.0
+        # 分区租约, 保证同一分区 key 的消息不会被并发处理
+        self._lease = lease or RLease(prefix="rbroker-partition")
+        self._partition_keys: dict[
+            tuple[str, str], Callable[[RbrokerMessage], str | None]
+        ] = {}
+        self._partition_defer = 2.0
+        self._put_locks: dict[int, asyncio.Lock] = {}
+        # key 被其他进程占用时, 等待其释放的最长秒数与轮询间隔
+        self._partition_wait = 1.0
+        self._partition_poll = 0.05
+        # 本进程持有租约的分区 key 及其排队中的 (回调, 消息, 完成回调), 由持有者按顺序处理
+        self._partition_waiting: dict[
+            str,
+            deque[
+                tuple[
+                    Callable[[RbrokerMessage], Coroutine[Any, Any, None]],
+                    Any,
+                    Callable[[], Coroutine[Any, Any, None]],
+                ]
+            ],
+        ] = {}
+        self._scale_interval = 1.0
+        self._retention_max_age = retention_max_age
+        self._retention_maxlen = retention_maxlen
+        self._retention_interval = 60.0
 
     @property
     def _client(self):
-        return get_client()
+        # latin-1 保证二进制负载可以无损往返
+        return get_client(encoding="latin-1")
+
+    def _encode(self, rbroker_message: RbrokerPayload) -> bytes:
+        return self._codec.encode(rbroker_message)
+
+    def _decode(self, data: str) -> RbrokerPayload:
+        raw = data.encode("latin-1")
+        for codec in RBROKER_CODECS.values():
+            if codec.tag and raw.startswith(codec.tag):
+                return codec.decode(raw)
+        return RBROKER_CODECS["json"].decode(raw)
+
+    @staticmethod
+    def _undecodable(data: dict[str, Any], exc: Exception) -> RbrokerPayload:
+        """
+        无法解码的消息 (如编码格式不受本副本支持). 原始负载保存在 metadata 的 raw 中,
+        重放时原样投递, 由能够解码的副本处理.
+        """
+        return RbrokerPayload(
+            metadata={"raw": data.get("message", "")},
+            content={},
+            exc_info=RbrokerPayloadExcInfo(
+                message=str(exc), type=exc.__class__.__name__
+            ),
+        )
+
+    @property
+    def topics(self) -> list[str]:
+        """本进程启动了消费者的所有 topic."""
+        return sorted(self._topics)
+
+    def _dlq_key(self, topic: str) -> str:
+        return f"{topic}-dlq"
+
+    def _delayed_key(self, topic: str) -> str:
+        return f"{topic}-delayed"
+
+    def _dedup_key(self, dedup_key: str) -> str:
+        return f"rbroker-dedup:{dedup_key}"
+
+    def _delayed_payload_key(self, topic: str) -> str:
+        return f"{topic}-delayed-payload"
+
+    async def _delayed_listen(self, topic: str):
+        """
+        延迟消息搬运器. 周期性地将到期的延迟消息投递到 topic 对应的 Stream 中.
+        多副本同时运行是安全的, 搬运由 Lua 脚本保证原子性.
+        """
+        while True:
+            try:
+                script = self._client.register_script(PROMOTE_DELAYED_SCRIPT)
+                moved = await script(
+                    keys=[
+                        self._delayed_key(topic),
+                        self._delayed_payload_key(topic),
+                        topic,
+                    ],
+                    args=[int(time.time() * 1000), self._delayed_batch_size],
+                )
+
+                # 若本次搬满了, 说明还有积压的到期消息, 立即进行下一轮.
+                if int(moved) < self._delayed_batch_size:
+                    await asyncio.sleep(self._delayed_interval)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(
+                    f"Delayed promoter '{topic}' loop error: {e}", exc_info=True
+                )
+                await asyncio.sleep(5)
+
+    async def _safe_minid(self, topic: str) -> str | None:
+        """
+        可以安全裁剪的边界: 所有消费者组中最早的挂起消息与最后投递位置的最小值.
+        早于该 ID 的消息均已被所有消费者组 ACK. 没有消费者组时返回 None.
+        """
+        boundaries: list[str] = []
+
+        for group in await self._client.xinfo_groups(topic):
+            boundaries.append(group["last-delivered-id"])
+            pending = await self._client.xpending(topic, group["name"])
+            if pending["pending"]:
+                boundaries.append(pending["min"])
+
+        if not boundaries:
+            return None
+
+        return min(boundaries, key=_stream_id)
+
+    async def trim(self, topic: str) -> int:
+        """按保留策略裁剪 Stream, 返回被删除的消息数."""
+        minid = await self._safe_minid(topic)
+
+        if self._retention_max_age is not None:
+            age_minid = f"{int((time.time() - self._retention_max_age) * 1000)}-0"
+            if minid is None or _stream_id(age_minid) > _stream_id(minid):
+                minid = age_minid
+
+        trimmed = 0
+        if minid is not None:
+            trimmed += await self._client.xtrim(topic, minid=minid, approximate=True)
+        if self._retention_maxlen is not None:
+            trimmed += await self._client.xtrim(
+                topic, maxlen=self._retention_maxlen, approximate=True
+            )
+
+        return trimmed
+
+    async def _trim_listen(self, topic: str):
+        """
+        Stream 保留策略. 周期性地裁剪已被所有消费者组 ACK 的消息, 避免 Stream 无限增长.
+        多副本同时运行是安全的.
+        """
+        while True:
+            try:
+                await asyncio.sleep(self._retention_interval)
+                trimmed = await self.trim(topic)
+                if trimmed:
+                    logging.debug(f"Trimmed {trimmed} entries from '{topic}'")
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(f"Trimmer '{topic}' loop error: {e}", exc_info=True)
+
+    def _ack(self, topic: str, group_id: str, message_id: str):
+        """将消息放入 ACK 缓冲区, 由 _ack_listen 批量提交."""
+        self._inflight[(topic, group_id)].discard(message_id)
+
+        buffer = self._ack_buffers[(topic, group_id)]
+        buffer.append(message_id)
+
+        if len(buffer) >= self._ack_batch_sizes[(topic, group_id)]:
+            self._ack_events[(topic, group_id)].set()
+
+    async def _ack_flush(self, topic: str, group_id: str):
+        buffer = self._ack_buffers[(topic, group_id)]
+        if not buffer:
+            return
+
+        message_ids = buffer.copy()
+        buffer.clear()
+
+        try:
+            await self._client.xack(topic, group_id, *message_ids)
+        except Exception:
+            # 提交失败时放回缓冲区, 等待下一次提交
+            buffer[:0] = message_ids
+            raise
+
+    async def _ack_listen(self, topic: str, group_id: str):
+        event = self._ack_events[(topic, group_id)]
+
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=self._ack_interval)
+                except TimeoutError:
+                    pass
+
+                event.clear()
+                await self._ack_flush(topic, group_id)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(
+                    f"Acker '{topic}:{group_id}' loop error: {e}", exc_info=True
+                )
+                await asyncio.sleep(1)
+
+    async def _dead_letter(
+        self,
+        topic: str,
+        group_id: str,
+        message_id: str,
+        rbroker_message: RbrokerPayload,
+    ):
+        """写入死信队列并 ACK, 二者在同一个 pipeline 中提交."""
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.xadd(
+                self._dlq_key(topic),
+                {"message": self._encode(rbroker_message)},
+                maxlen=self._dlq_maxlen,
+                approximate=True,
+            )
+            pipe.xack(topic, group_id, message_id)
+            await pipe.execute()
+
+        self._inflight[(topic, group_id)].discard(message_id)
+
+    async def _retry(
+        self,
+        topic: str,
+        group_id: str,
+        message_id: str,
+        rbroker_message: RbrokerPayload,
+        delay: float,
+    ):
+        """以延迟消息的方式重新投递, 并 ACK 原消息, 二者在同一个事务中提交."""
+        member = uuid.uuid4().hex
+        score = int((time.time() + delay) * 1000)
+
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self._delayed_key(topic), {member: score})
+            pipe.hset(
+                self._delayed_payload_key(topic),
+                member,
+                self._encode(rbroker_message),
+            )
+            pipe.xack(topic, group_id, message_id)
+            await pipe.execute()
+
+        self._inflight[(topic, group_id)].discard(message_id)
+
+    async def _handle_failure(
+        self,
+        topic: str,
+        group_id: str,
+        message_id: str,
+        rbroker_message: RbrokerPayload,
+        exc: Exception,
+    ):
+        policy = self._retry_policies[(topic, group_id)]
+        attempts = int(rbroker_message.metadata.get("attempts", 0)) + 1
+
+        rbroker_message.metadata["attempts"] = attempts
+        rbroker_message.exc_info = RbrokerPayloadExcInfo(
+            message=str(exc), type=exc.__class__.__name__
+        )
+
+        if attempts < policy.max_attempts:
+            delay = policy.backoff(attempts)
+            logging.warning(
+                f"Worker error on message {message_id} "
+                f"(attempt {attempts}/{policy.max_attempts}), "
+                f"retry in {delay:.1f}s: {exc}"
+            )
+            await self._retry(topic, group_id, message_id, rbroker_message, delay)
+            return
+
+        logging.error(
+            f"Worker error on message {message_id} "
+            f"(attempt {attempts}/{policy.max_attempts}), dead-lettered: {exc}",
+            exc_info=exc,
+        )
+        await self._dead_letter(topic, group_id, message_id, rbroker_message)
+
+    async def _dispatch(
+        self,
+        topic: str,
+        group_id: str,
+        message_id: str,
+        data: dict[str, Any],
+        consumer_queue: RbrokerQueue,
+    ):
+        """解析消息并投递给工作者."""
+        try:
+            rbroker_message = self._decode(data["message"])
+        except Exception as e:
+            # 直接写入死信队列, 避免挂起的消息被反复接管并解码失败
+            logging.error(
+                f"Listener error parsing message {message_id}, dead-lettered: {e}",
+                exc_info=True,
+            )
+            await self._dead_letter(
+                topic, group_id, message_id, self._undecodable(data, e)
+            )
+            return
+
+        job = (topic, group_id, message_id, rbroker_message)
+
+        # 本地队列已满或同一 key 积压过多时延后重新投递, 监听者不会阻塞在入队上,
+        # 其他 key 的消息仍能进入队列
+        if isinstance(consumer_queue, RbrokerFairQueue):
+            if not consumer_queue.admits(job):
+                await self._retry(
+                    topic, group_id, message_id, rbroker_message, self._fair_defer
+                )
+                return
+
+        self._inflight[(topic, group_id)].add(message_id)
+        # 队列已满时按读取顺序入队, 避免后读取的消息越过阻塞中的消息, 打乱同一分区 key 的顺序
+        async with self._put_locks.setdefault(id(consumer_queue), asyncio.Lock()):
+            await consumer_queue.put(job)
+
+    async def _reclaim(
+        self,
+        topic: str,
+        group_id: str,
+        consumer_queue: RbrokerQueue,
+        claim_idle_ms: int,
+        start_id: str,
+        batch_size: int,
+    ) -> str:
+        """
+        续期本进程的在途消息, 并接管其他消费者空闲超过 claim_idle_ms 的挂起消息.
+        返回下一次 XAUTOCLAIM 的起始 ID.
+        """
+        reclaimer_name = f"{group_id}-{self._consumer_id}-reclaimer"
+        inflight = self._inflight[(topic, group_id)]
+
+        # 1. 续期: 重置在途消息的空闲时间
+        if inflight:
+            await self._client.xclaim(
+                topic,
+                group_id,
+                reclaimer_name,
+                min_idle_time=0,
+                message_ids=list(inflight),
+                justid=True,
+            )
+
+        # 2. 接管: 认领空闲超时的挂起消息
+        next_start_id, messages, *_deleted = await self._client.xautoclaim(
+            topic,
+            group_id,
+            reclaimer_name,
+            min_idle_time=claim_idle_ms,
+            start_id=start_id,
+            count=batch_size,
+        )
+
+        for message_id, data in messages:
+            if message_id in inflight:
+                continue
+
+            # 消息已被裁剪, 无法恢复, 直接 ACK 掉
+            if not data:
+                await self._client.xack(topic, group_id, message_id)
+                continue
+
+            logging.warning(
+                f"Reclaimer '{reclaimer_name}' took over idle message {message_id}"
+            )
+            await self._dispatch(topic, group_id, message_id, data, consumer_queue)
+
+        return next_start_id
+
+    async def _prune_consumers(self, topic: str, group_id: str):
+        """移除已没有挂起消息且长期不活跃的消费者 (通常是已退出的副本)."""
+        consumers = await self._client.xinfo_consumers(topic, group_id)
+
+        for consumer in consumers:
+            name = consumer["name"]
+            if name.startswith(f"{group_id}-{self._consumer_id}-"):
+                continue
+
+            if consumer["pending"] == 0 and consumer["idle"] > self._prune_idle_ms:
+                await self._client.xgroup_delconsumer(topic, group_id, name)
+                logging.info(f"Pruned dead consumer '{name}' from '{group_id}'")
+
+    async def _reclaim_listen(
+        self,
+        topic: str,
+        group_id: str,
+        consumer_queue: RbrokerQueue,
+        claim_idle_ms: int,
+        batch_size: int,
+    ):
+        start_id = "0-0"
+        # 续期间隔必须明显小于 claim_idle_ms, 否则在途消息会被其他副本接管
+        interval = max(claim_idle_ms / 1000 / 3, 1)
+
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                start_id = await self._reclaim(
+                    topic,
+                    group_id,
+                    consumer_queue,
+                    claim_idle_ms,
+                    start_id,
+                    batch_size,
+                )
+                await self._prune_consumers(topic, group_id)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(
+                    f"Reclaimer '{topic}:{group_id}' loop error: {e}", exc_info=True
+                )
 
     async def _consume_listen(
         self,
         topic: str,
         group_id: str,
         consumer_name: str,
-        consumer_queue: Queue[Any],
+        consumer_queue: RbrokerQueue,
+        batch_size: int = 1,
     ):
         while True:
             try:
                 response = await self._client.xreadgroup(
-                    group_id, consumer_name, {topic: ">"}, count=1, block=10000
+                    group_id,
+                    consumer_name,
+                    {topic: ">"},
+                    count=batch_size,
+                    block=10000,
                 )
                 if not response:
                     continue
 
-                _stream_key, messages = response[0]
-                message_id, data = messages[0]
+                for _stream_key, messages in response:
+                    for message_id, data in messages:
+                        await self._dispatch(
+                            topic, group_id, message_id, data, consumer_queue
+                        )
 
-                try:
-                    rbroker_message = RbrokerPayload.model_validate_json(
-                        data["message"]
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(
+                    f"Listener '{consumer_name}' loop error: {e}", exc_info=True
+                )
+                await asyncio.sleep(5)
+
+    async def _consume_lanes_listen(
+        self,
+        lanes: dict[str, int],
+        group_id: str,
+        consumer_name: str,
+        consumer_queue: RbrokerQueue,
+        batch_size: int = 1,
+        lane_aging: float = 30.0,
+    ):
+        """
+        从多个优先级通道 (Stream) 中读取消息. 每次读取前按 权重 * (1 + 等待秒数 / lane_aging)
+        为通道打分, 优先读取得分最高且非空的通道. 低优先级通道等待越久得分越高, 从而避免饥饿.
+        """
+        served = {lane: time.monotonic() for lane in lanes}
+
+        while True:
+            try:
+                now = time.monotonic()
+                ordered = sorted(
+                    lanes,
+                    key=lambda lane: (
+                        lanes[lane] * (1 + (now - served[lane]) / lane_aging)
+                    ),
+                    reverse=True,
+                )
+
+                response = None
+                for lane in ordered:
+                    response = await self._client.xreadgroup(
+                        group_id, consumer_name, {lane: ">"}, count=batch_size
+                    )
+                    if response:
+                        break
+                    # 空通道没有等待中的消息, 不累积等待时间
+                    served[lane] = time.monotonic()
+
+                if not response:
+                    # 所有通道均为空, 阻塞等待任意通道的新消息
+                    response = await self._client.xreadgroup(
+                        group_id,
+                        consumer_name,
+                        {lane: ">" for lane in ordered},
+                        count=batch_size,
+                        block=10000,
                     )
-                    job = (topic, group_id, message_id, rbroker_message)
-                    await consumer_queue.put(job)
-                except Exception as e:
-                    logging.error(f"Listener error parsing message: {e}", exc_info=True)
+                    if not response:
+                        continue
+
+                for stream_key, messages in response:
+                    served[stream_key] = time.monotonic()
+                    for message_id, data in messages:
+                        await self._dispatch(
+                            stream_key, group_id, message_id, data, consumer_queue
+                        )
 
             except asyncio.CancelledError:
                 break
@@ -74,37 +914,154 @@ class RBroker:
                 )
                 await asyncio.sleep(5)
 
-    async def _consume_works(
+    async def _next_job(
+        self, consumer_queue: RbrokerQueue, pool: RbrokerWorkerPool
+    ) -> Any | None:
+        """获取下一个任务. 自适应池中的工作者空闲超时且池大于下限时返回 None, 表示退出."""
+        while True:
+            pool.idle += 1
+            try:
+                if not pool.adaptive:
+                    return await consumer_queue.get()
+                return await asyncio.wait_for(
+                    consumer_queue.get(), timeout=pool.idle_timeout
+                )
+            except TimeoutError:
+                current_task = asyncio.current_task()
+                if len(pool.workers) > pool.min_workers and current_task:
+                    pool.workers.discard(current_task)
+                    return None
+            finally:
+                pool.idle -= 1
+
+    async def _invoke(
         self,
-        name: str,
-        consumer_queue: Queue[Any],
         callback: Callable[[RbrokerMessage], Coroutine[Any, Any, None]],
+        job: Any,
     ):
-        while True:
+        topic, group_id, message_id, rbroker_message = job
+
+        dedup_key = rbroker_message.metadata.get("dedup_key")
+        dedup_token = rbroker_message.metadata.get("dedup_token")
+        done_key = f"{dedup_key}:done:{dedup_token}"
+
+        try:
+            if dedup_key:
+                script = self._client.register_script(DEDUP_BEGIN_SCRIPT)
+                if not await script(keys=[dedup_key, done_key], args=[dedup_token]):
+                    logging.info(f"Skip message {message_id}, already processed")
+                    self._ack(topic, group_id, message_id)
+                    return
+
             try:
-                (
+                await callback(rbroker_message.content)
+            except Exception as exc:
+                await self._handle_failure(
+                    topic, group_id, message_id, rbroker_message, exc
+                )
+            else:
+                # 完成标记防止 ACK 前崩溃导致的重复投递被再次处理
+                if dedup_key:
+                    await self._client.set(
+                        done_key, 1, px=rbroker_message.metadata["dedup_ttl"]
+                    )
+                self._ack(topic, group_id, message_id)
+        except Exception:
+            # 未能 ACK 或重新投递的消息不再续期, 空闲超时后由其他消费者接管
+            self._inflight[(topic, group_id)].discard(message_id)
+            raise
+
+    async def _acquire_partition(self, key: str) -> str | None:
+        """获取分区租约, 被占用时等待至多 partition_wait 秒."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._partition_wait
+        while (token := await self._lease.acquire(key)) is None:
+            if loop.time() >= deadline:
+                return None
+            await asyncio.sleep(self._partition_poll)
+        return token
+
+    async def _invoke_partition(
+        self,
+        callback: Callable[[RbrokerMessage], Coroutine[Any, Any, None]],
+        key: str,
+        job: Any,
+        done: Callable[[], Coroutine[Any, Any, None]],
+    ):
+        """
+        按分区 key 互斥处理消息. 本进程内同一 key 的消息排入本地 FIFO, 由持有租约的工作者
+        按到达顺序依次处理, 租约在消息之间直接交接. key 被其他进程占用且未在 partition_wait
+        秒内释放时, 按顺序延后重新投递.
+        每个消息处理完成、重新投递或放弃后调用其 done, 排队中的消息仍占用本地队列的公平调度并发.
+        """
+        # 共享租约的多个 topic 的消息进入同一 FIFO, 各自使用所属 topic 的回调
+        if (waiting := self._partition_waiting.get(key)) is not None:
+            waiting.append((callback, job, done))
+            return
+
+        waiting = self._partition_waiting[key] = deque([(callback, job, done)])
+        try:
+            # 释放租约期间到达的消息由本工作者重新获取租约后继续处理.
+            # 租约丢失时中止当前消息, 与未处理的消息一同交由其他消费者接管
+            while waiting and (token := await self._acquire_partition(key)):
+                async with self._lease.keep(key, token):
+                    while waiting:
+                        await self._invoke(*waiting[0][:2])
+                        await waiting.popleft()[2]()
+
+            while waiting:
+                topic, group_id, message_id, rbroker_message = waiting[0][1]
+                await self._retry(
                     topic,
                     group_id,
                     message_id,
                     rbroker_message,
-                ) = await consumer_queue.get()
+                    self._partition_defer,
+                )
+                await waiting.popleft()[2]()
+        except Exception:
+            # 无法重新投递的消息不再续期, 由其他消费者接管
+            for _, (topic, group_id, message_id, _), job_done in waiting:
+                self._inflight[(topic, group_id)].discard(message_id)
+                await job_done()
+            raise
+        finally:
+            del self._partition_waiting[key]
 
-                try:
-                    await callback(rbroker_message.content)
-                except Exception as exc:
-                    rbroker_message.exc_info = RbrokerPayloadExcInfo(
-                        message=str(exc), type=exc.__class__.__name__
-                    )
-                    await self._client.xadd(
-                        f"{topic}-dlq",
-                        {"message": rbroker_message.model_dump_json()},
-                        maxlen=self._dlq_maxlen,
-                    )
-                    logging.error(
-                        f"Worker error on message {message_id}: {exc}", exc_info=True
+    async def _consume_works(
+        self,
+        name: str,
+        consumer_queue: RbrokerQueue,
+        callback: Callable[[RbrokerMessage], Coroutine[Any, Any, None]],
+        pool: RbrokerWorkerPool,
+    ):
+        while True:
+            try:
+                job = await self._next_job(consumer_queue, pool)
+            except asyncio.CancelledError:
+                break
+
+            if job is None:
+                logging.debug(f"Worker '{name}' exits after idle timeout")
+                break
+
+            topic, group_id, message_id, rbroker_message = job
+            # 交由分区 FIFO 的消息在处理完成后才释放本地队列的并发
+            delegated = False
+            try:
+                partition_key = self._partition_keys.get((topic, group_id))
+                key = partition_key(rbroker_message.content) if partition_key else None
+
+                if key is None:
+                    await self._invoke(callback, job)
+                else:
+                    delegated = True
+                    await self._invoke_partition(
+                        callback,
+                        key,
+                        job,
+                        functools.partial(self._job_done, consumer_queue, job),
                     )
-                finally:
-                    await self._client.xack(topic, group_id, message_id)
 
             except asyncio.CancelledError:
                 break
@@ -112,18 +1069,377 @@ class RBroker:
                 logging.error(
                     f"Worker '{name}' caught an exception: {e}", exc_info=True
                 )
+                # 如分区 key 解析失败, 消息未被 ACK 或重新投递, 交由其他消费者接管
+                self._inflight[(topic, group_id)].discard(message_id)
             finally:
-                if "consumer_queue" in locals():
-                    consumer_queue.task_done()
+                if not delegated:
+                    await self._job_done(consumer_queue, job)
+
+    @staticmethod
+    async def _job_done(consumer_queue: RbrokerQueue, job: Any):
+        if isinstance(consumer_queue, RbrokerFairQueue):
+            await consumer_queue.release(job)
+        else:
+            consumer_queue.task_done()
+
+    def _spawn_workers(
+        self,
+        group_id: str,
+        consumer_queue: RbrokerQueue,
+        callback: Callable[[RbrokerMessage], Coroutine[Any, Any, None]],
+        pool: RbrokerWorkerPool,
+        n: int,
+    ):
+        for _ in range(n):
+            pool.serial += 1
+            worker_name = f"{group_id}-{self._consumer_id}-worker-{pool.serial}"
+            task = asyncio.create_task(
+                self._consume_works(worker_name, consumer_queue, callback, pool)
+            )
+            pool.workers.add(task)
+            task.add_done_callback(pool.workers.discard)
 
-    async def send(self, topic: str, message: RbrokerMessage) -> str:
+    async def _scale_listen(
+        self,
+        topics: list[str],
+        group_id: str,
+        consumer_queue: RbrokerQueue,
+        callback: Callable[[RbrokerMessage], Coroutine[Any, Any, None]],
+        pool: RbrokerWorkerPool,
+    ):
+        """根据本地队列深度与 Stream 积压扩容工作者. 缩容由工作者空闲超时自行完成."""
+        while True:
+            try:
+                await asyncio.sleep(self._scale_interval)
+
+                backlog = consumer_queue.qsize()
+                # 本地队列已空但没有空闲工作者时, 参考 Stream 中尚未投递的积压
+                if (
+                    backlog == 0
+                    and pool.idle == 0
+                    and len(pool.workers) < pool.max_workers
+                ):
+                    for topic in topics:
+                        for group in await self._client.xinfo_groups(topic):
+                            if group["name"] == group_id:
+                                backlog += group.get("lag") or 0
+
+                wanted = min(
+                    pool.max_workers - len(pool.workers), backlog - pool.idle
+                )
+                if wanted > 0:
+                    self._spawn_workers(
+                        group_id, consumer_queue, callback, pool, wanted
+                    )
+                    logging.info(
+                        f"Scaled '{group_id}' workers up by {wanted} "
+                        f"to {len(pool.workers)}"
+                    )
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(f"Scaler '{group_id}' loop error: {e}", exc_info=True)
+
+    async def _send_delayed(
+        self,
+        topic: str,
+        rbroker_message: RbrokerPayload,
+        deliver_at: datetime,
+        delay_key: str | None = None,
+    ) -> str:
+        member = delay_key or uuid.uuid4().hex
+        score = int(deliver_at.timestamp() * 1000)
+
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self._delayed_key(topic), {member: score})
+            pipe.hset(
+                self._delayed_payload_key(topic),
+                member,
+                self._encode(rbroker_message),
+            )
+            await pipe.execute()
+
+        return member
+
+    async def send(
+        self,
+        topic: str,
+        message: RbrokerMessage,
+        deliver_at: datetime | None = None,
+        delay_key: str | None = None,
+        dedup_key: str | None = None,
+        dedup_ttl: int = 3600,
+    ) -> str | None:
+        """
+        发送消息.
+
+        - deliver_at: 延迟投递时间, 到期后由 topic 的消费者进程搬运到 Stream 中.
+        - delay_key: 延迟消息的唯一键. 相同 key 的延迟消息会被覆盖, 即重新调度投递时间.
+        - dedup_key: 去重键, 仅对立即投递的消息生效. 相同 key 的消息在被消费前 (最长 dedup_ttl 秒)
+          只会投递一次, 重复投递时返回 None. 消费成功后, 该消息被重复投递也不会再次处理.
+        """
         rbroker_message = RbrokerPayload(content=message)
+
+        if deliver_at is not None:
+            return await self._send_delayed(
+                topic, rbroker_message, deliver_at=deliver_at, delay_key=delay_key
+            )
+
+        if dedup_key is not None:
+            keys, args = self._dedup_send_args(
+                topic, rbroker_message, dedup_key, dedup_ttl
+            )
+            script = self._client.register_script(DEDUP_SEND_SCRIPT)
+            return await script(keys=keys, args=args)
+
         message_payload: dict[FieldT, EncodableT] = {
-            "message": rbroker_message.model_dump_json()
+            "message": self._encode(rbroker_message)
         }
         message_id = await self._client.xadd(topic, message_payload)
         return message_id
 
+    def _dedup_send_args(
+        self,
+        topic: str,
+        rbroker_message: RbrokerPayload,
+        dedup_key: str,
+        dedup_ttl: int,
+    ) -> tuple[list[str], list[EncodableT]]:
+        dedup_token = uuid.uuid4().hex
+        rbroker_message.metadata.update(
+            dedup_key=self._dedup_key(dedup_key),
+            dedup_token=dedup_token,
+            dedup_ttl=dedup_ttl * 1000,
+        )
+        return (
+            [self._dedup_key(dedup_key), topic],
+            [dedup_token, dedup_ttl * 1000, self._encode(rbroker_message)],
+        )
+
+    async def send_many(
+        self,
+        messages: list[tuple[str, RbrokerMessage, str | None]],
+        dedup_ttl: int = 3600,
+    ) -> list[str | None]:
+        """
+        在一个 pipeline 中批量立即投递. messages 为 (topic, 消息, 去重键),
+        返回各消息的 ID, 被去重的消息为 None.
+        """
+        script = self._client.register_script(DEDUP_SEND_SCRIPT)
+
+        async with self._client.pipeline(transaction=False) as pipe:
+            for topic, message, dedup_key in messages:
+                rbroker_message = RbrokerPayload(content=message)
+                if dedup_key is None:
+                    pipe.xadd(topic, {"message": self._encode(rbroker_message)})
+                    continue
+
+                keys, args = self._dedup_send_args(
+                    topic, rbroker_message, dedup_key, dedup_ttl
+                )
+                await script(keys=keys, args=args, client=pipe)
+
+            return await pipe.execute()
+
+    async def dlq_range(
+        self,
+        topic: str,
+        start: str = "-",
+        end: str = "+",
+        count: int = 100,
+    ) -> list[tuple[str, RbrokerPayload]]:
+        """按 ID 正序读取死信队列."""
+        entries = await self._client.xrange(
+            self._dlq_key(topic), min=start, max=end, count=count
+        )
+        return [
+            (message_id, self._decode(data["message"]))
+            for message_id, data in entries
+        ]
+
+    async def dlq_length(self, topic: str) -> int:
+        return await self._client.xlen(self._dlq_key(topic))
+
+    async def dlq_get(
+        self, topic: str, message_ids: list[str]
+    ) -> list[tuple[str, RbrokerPayload]]:
+        """按 ID 读取死信消息, 不存在的 ID 将被忽略."""
+        async with self._client.pipeline(transaction=False) as pipe:
+            for message_id in message_ids:
+                pipe.xrange(self._dlq_key(topic), min=message_id, max=message_id)
+            results = await pipe.execute()
+
+        return [
+            (message_id, self._decode(data["message"]))
+            for entries in results
+            for message_id, data in entries
+        ]
+
+    async def dlq_replay(
+        self, topic: str, entries: list[tuple[str, RbrokerPayload]]
+    ) -> int:
+        """
+        将死信消息重新投递到原 topic, 并从死信队列中删除. 返回实际重放的数量.
+        重放的消息会清空异常信息与重试次数, 无法解码的消息原样投递.
+        """
+        if not entries:
+            return 0
+
+        script = self._client.register_script(REPLAY_DLQ_SCRIPT)
+
+        async with self._client.pipeline(transaction=False) as pipe:
+            for message_id, rbroker_message in entries:
+                if (raw := rbroker_message.metadata.get("raw")) is not None:
+                    await script(
+                        keys=[self._dlq_key(topic), topic],
+                        args=[message_id, raw.encode("latin-1")],
+                        client=pipe,
+                    )
+                    continue
+
+                rbroker_message.exc_info = None
+                rbroker_message.metadata.pop("attempts", None)
+                rbroker_message.metadata["replays"] = (
+                    int(rbroker_message.metadata.get("replays", 0)) + 1
+                )
+                await script(
+                    keys=[self._dlq_key(topic), topic],
+                    args=[message_id, self._encode(rbroker_message)],
+                    client=pipe,
+                )
+            results = await pipe.execute()
+
+        return sum(int(result) for result in results)
+
+    async def _inspect_group(
+        self, topic: str, group: dict[str, Any], now_ms: int
+    ) -> RbrokerGroupInfo:
+        group_id = group["name"]
+
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.xinfo_consumers(topic, group_id)
+            pipe.xpending_range(topic, group_id, min="-", max="+", count=1)
+            consumers, oldest_pending = await pipe.execute()
+
+        oldest_pending_age_ms = oldest_pending_idle_ms = None
+        if oldest_pending:
+            oldest_id = oldest_pending[0]["message_id"]
+            oldest_pending_age_ms = now_ms - int(oldest_id.split("-")[0])
+            oldest_pending_idle_ms = oldest_pending[0]["time_since_delivered"]
+
+        consumer_queue = self._consumer_queues.get((topic, group_id))
+        inflight = self._inflight.get((topic, group_id))
+        pool = self._worker_pools.get((topic, group_id))
+
+        return RbrokerGroupInfo(
+            name=group_id,
+            lag=group.get("lag"),
+            pending=group["pending"],
+            oldest_pending_age_ms=oldest_pending_age_ms,
+            oldest_pending_idle_ms=oldest_pending_idle_ms,
+            consumers=[
+                RbrokerConsumerInfo(
+                    name=consumer["name"],
+                    pending=consumer["pending"],
+                    idle_ms=consumer["idle"],
+                )
+                for consumer in consumers
+            ],
+            queue_size=consumer_queue.qsize() if consumer_queue else None,
+            inflight=len(inflight) if inflight is not None else None,
+            workers=len(pool.workers) if pool else None,
+            idle_workers=pool.idle if pool else None,
+        )
+
+    async def inspect(self, topic: str) -> RbrokerTopicInfo:
+        """查看 topic 的 Stream 长度、消费者组积压、挂起消息以及本进程内的队列深度."""
+        now_ms = int(time.time() * 1000)
+
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.xlen(topic)
+            pipe.zcard(self._delayed_key(topic))
+            pipe.xlen(self._dlq_key(topic))
+            pipe.xinfo_groups(topic)
+            length, delayed, dlq_length, groups = await pipe.execute()
+
+        return RbrokerTopicInfo(
+            topic=topic,
+            length=length,
+            delayed=delayed,
+            dlq_length=dlq_length,
+            groups=[
+                await self._inspect_group(topic, group, now_ms) for group in groups
+            ],
+        )
+
+    async def inspect_all(self) -> list[RbrokerTopicInfo]:
+        return [await self.inspect(topic) for topic in self.topics]
+
+    async def backlog(self, topics: list[str], group_id: str | None = None) -> int:
+        """
+        topics 中尚未处理完成的消息数, 包括未投递 (lag)、已投递未 ACK (pending) 与延迟消息.
+        group_id 为空时统计所有消费者组.
+        """
+        async with self._client.pipeline(transaction=False) as pipe:
+            for topic in topics:
+                pipe.xinfo_groups(topic)
+                pipe.zcard(self._delayed_key(topic))
+            results = await pipe.execute(raise_on_error=False)
+
+        backlog = 0
+        for groups, delayed in zip(results[::2], results[1::2]):
+            # Stream 尚未创建时 XINFO 返回错误
+            if not isinstance(groups, Exception):
+                for group in groups:
+                    if group_id is None or group["name"] == group_id:
+                        backlog += (group.get("lag") or 0) + group["pending"]
+            backlog += delayed
+        return backlog
+
+    async def _register_topic(
+        self,
+        topic: str,
+        group_id: str,
+        consumer_queue: RbrokerQueue,
+        batch_size: int,
+        claim_idle_ms: int,
+        retry_policy: RbrokerRetryPolicy | None,
+        partition_key: Callable[[RbrokerMessage], str | None] | None,
+    ):
+        """创建消费者组并启动该 Stream 的延迟投递、ACK 与接管任务."""
+        try:
+            await self._client.xgroup_create(topic, group_id, mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        if topic not in self._topics:
+            self._topics.add(topic)
+            self._consumer_tasks.append(
+                asyncio.create_task(self._delayed_listen(topic))
+            )
+            self._consumer_tasks.append(asyncio.create_task(self._trim_listen(topic)))
+
+        self._ack_buffers[(topic, group_id)] = []
+        self._ack_events[(topic, group_id)] = asyncio.Event()
+        self._ack_batch_sizes[(topic, group_id)] = batch_size
+        self._inflight[(topic, group_id)] = set()
+        self._consumer_queues[(topic, group_id)] = consumer_queue
+        self._retry_policies[(topic, group_id)] = retry_policy or RbrokerRetryPolicy()
+        if partition_key is not None:
+            self._partition_keys[(topic, group_id)] = partition_key
+        self._consumer_tasks.append(
+            asyncio.create_task(self._ack_listen(topic, group_id))
+        )
+        self._consumer_tasks.append(
+            asyncio.create_task(
+                self._reclaim_listen(
+                    topic, group_id, consumer_queue, claim_idle_ms, batch_size
+                )
+            )
+        )
+
     async def consumer(
         self,
         topic: str,
@@ -131,33 +1447,130 @@ class RBroker:
         group_id: str | None = None,
         count: int = 1,
         max_workers: int = 10,
+        batch_size: int = 1,
+        claim_idle_ms: int = 30_000,
+        retry_policy: RbrokerRetryPolicy | None = None,
+        min_workers: int | None = None,
+        worker_idle_timeout: float = 60.0,
+        lanes: dict[str, int] | None = None,
+        lane_aging: float = 30.0,
+        fair_key: Callable[[RbrokerMessage], str] | None = None,
+        fair_limit: int = 2,
+        partition_key: Callable[[RbrokerMessage], str | None] | None = None,
+        queue_size: int | None = None,
+        fair_backlog: int | None = None,
         *args: Any,
         **kwargs: Any,
     ):
+        """
+        启动消费者.
+
+        - count: 监听者数量, 每个监听者拥有 max_workers 个工作者.
+        - batch_size: 单次 XREADGROUP 读取的最大消息数, 同时也是 ACK 批量提交的阈值.
+        - claim_idle_ms: 其他消费者的挂起消息空闲超过该时间后, 将被本进程接管.
+        - retry_policy: 消费失败时的重试策略, 默认不重试直接进入死信队列.
+        - min_workers: 设置后启用自适应工作者池, 工作者数量在 [min_workers, count * max_workers]
+          之间根据积压扩容, 空闲超过 worker_idle_timeout 秒后缩容. 否则固定为 count * max_workers.
+        - lanes: 优先级通道, Stream 名称到权重的映射, 需包含 topic. 所有通道共享同一组工作者,
+          按权重优先读取, 等待时间每增加 lane_aging 秒, 通道得分增加一倍权重.
+        - fair_key: 公平调度的 key (如会话 ID). 设置后同一 key 最多同时运行 fair_limit 个消息,
+          不同 key 之间轮流出队, 本地积压过多的 key 的消息会被延后重新投递.
+          fair_limit 只在本进程的本消费者队列内生效, 集群内同一 key 的并发上限为
+          副本数 × 使用同一 key 的消费者数 × fair_limit, 调用方需按副本数设置.
+        - queue_size: 本地队列的容量, 默认为工作者池上限的 2 倍.
+        - fair_backlog: 公平调度时单个 key 在本地队列中的积压上限, 默认按
+          queue_size / (key 数 + 1) 计算. 队列已满时新消息同样延后重新投递.
+        - partition_key: 分区 key (如任务 ID). 设置后同一 key 的消息在所有进程、所有共享同一租约的
+          topic 之间互斥执行. 本进程内同一 key 的消息按到达顺序依次处理,
+          key 被其他进程长时间占用时消息延后重新投递.
+        """
         group_id = group_id or topic + "_group"
-        consumer_queue = Queue[Any](maxsize=max_workers * 2)
+        queue_size = queue_size or count * max_workers * 2
+        consumer_queue: RbrokerQueue
+        if fair_key is not None:
+            consumer_queue = RbrokerFairQueue(
+                key=lambda job: fair_key(job[3].content),
+                limit=fair_limit,
+                maxsize=queue_size,
+                backlog_limit=fair_backlog,
+            )
+        else:
+            consumer_queue = Queue[Any](maxsize=queue_size)
 
-        try:
-            await self._client.xgroup_create(topic, group_id, mkstream=True)
-        except ResponseError as e:
-            if "BUSYGROUP" not in str(e):
-                raise
+        if lanes is not None and topic not in lanes:
+            raise ValueError(f"Lanes of '{topic}' must include the topic itself")
+        topics = list(lanes) if lanes else [topic]
 
-        for i in range(count):
-            consumer_name = f"{group_id}-listener-{i + 1}"
-            task = asyncio.create_task(
-                self._consume_listen(topic, group_id, consumer_name, consumer_queue)
+        for lane in topics:
+            await self._register_topic(
+                lane,
+                group_id,
+                consumer_queue,
+                batch_size,
+                claim_idle_ms,
+                retry_policy,
+                partition_key,
             )
-            self._consumer_tasks.append(task)
 
-            for j in range(max_workers):
-                worker_name = f"{consumer_name}-worker-{j + 1}"
-                task = asyncio.create_task(
-                    self._consume_works(worker_name, consumer_queue, callback)
+        for i in range(count):
+            consumer_name = f"{group_id}-{self._consumer_id}-listener-{i + 1}"
+            if lanes:
+                listener = self._consume_lanes_listen(
+                    lanes,
+                    group_id,
+                    consumer_name,
+                    consumer_queue,
+                    batch_size,
+                    lane_aging,
+                )
+            else:
+                listener = self._consume_listen(
+                    topic, group_id, consumer_name, consumer_queue, batch_size
+                )
+            self._consumer_tasks.append(asyncio.create_task(listener))
+
+        pool = RbrokerWorkerPool(
+            min_workers=min(min_workers, count * max_workers)
+            if min_workers is not None
+            else count * max_workers,
+            max_workers=count * max_workers,
+            idle_timeout=worker_idle_timeout if min_workers is not None else None,
+        )
+        for lane in topics:
+            self._worker_pools[(lane, group_id)] = pool
+        self._spawn_workers(
+            group_id, consumer_queue, callback, pool, pool.min_workers
+        )
+
+        if pool.adaptive:
+            self._consumer_tasks.append(
+                asyncio.create_task(
+                    self._scale_listen(
+                        topics, group_id, consumer_queue, callback, pool
+                    )
                 )
-                self._consumer_tasks.append(task)
+            )
 
-    async def shutdown(self):
-        for task in self._consumer_tasks:
+    async def shutdown(self, flush: bool = True):
+        """
+        停止所有消费者. flush 为 False 时不提交缓冲中的 ACK, 等同于进程崩溃,
+        挂起消息将由其他消费者接管 (用于压测与故障演练).
+        """
+        pools = {id(pool): pool for pool in self._worker_pools.values()}
+        tasks = self._consumer_tasks + [
+            worker for pool in pools.values() for worker in pool.workers
+        ]
+        for task in tasks:
             task.cancel()
-        await asyncio.gather(*self._consumer_tasks, return_exceptions=True)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if not flush:
+            return
+
+        # 提交剩余未 ACK 的消息
+        for topic, group_id in self._ack_buffers:
+            try:
+                await self._ack_flush(topic, group_id)
+            except Exception as e:
+                logging.error(
+                    f"Acker '{topic}:{group_id}' flush error: {e}", exc_info=True
+                )
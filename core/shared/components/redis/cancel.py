@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Any, TypeVar
+from collections.abc import Coroutine
+
+from core.shared.database.redis import get_client
+
+T = TypeVar("T")
+
+
+class RCancelledError(Exception):
+    """协程已被 RCancelRegistry 取消."""
+
+
+class RCancelRegistry:
+    """
+    基于 Redis 发布订阅实现的跨进程取消注册表.
+    通过 run 执行的协程以子任务运行并按 key 注册, 任意进程调用 cancel(key) 后,
+    所有进程中该 key 的子任务都会被取消, 而执行 run 的调用方 (如 Broker 工作者) 不受影响.
+    """
+
+    def __init__(self, channel: str = "cancel"):
+        self.channel = channel
+        self._tasks: dict[str, set[asyncio.Task[Any]]] = {}
+        self._revoked: set[asyncio.Task[Any]] = set()
+
+    @property
+    def _client(self):
+        return get_client()
+
+    async def cancel(self, key: str) -> int:
+        """广播取消 key, 返回收到广播的进程数."""
+        return await self._client.publish(self.channel, key)
+
+    def cancel_local(self, key: str) -> int:
+        """取消本进程中 key 的所有子任务, 返回取消的数量."""
+        tasks = self._tasks.get(key, set())
+        for task in tasks:
+            self._revoked.add(task)
+            task.cancel()
+        return len(tasks)
+
+    async def run(self, key: str, coro: Coroutine[Any, Any, T]) -> T:
+        """
+        以可取消的子任务运行 coro. 被 cancel(key) 取消时抛出 RCancelledError,
+        调用方自身被取消时子任务随之取消并继续传播 CancelledError.
+        """
+        task = asyncio.create_task(coro)
+        self._tasks.setdefault(key, set()).add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if task in self._revoked and not (current and current.cancelling()):
+                raise RCancelledError(key) from None
+            task.cancel()
+            raise
+        finally:
+            self._revoked.discard(task)
+            tasks = self._tasks.get(key)
+            if tasks is not None:
+                tasks.discard(task)
+                if not tasks:
+                    del self._tasks[key]
+
+    async def listen(self):
+        """订阅取消广播, 连接异常时重新订阅."""
+        while True:
+            try:
+                async with self._client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        if cancelled := self.cancel_local(message["data"]):
+                            logging.info(
+                                f"Cancelled {cancelled} tasks of '{message['data']}'"
+                            )
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(f"Cancel registry '{self.channel}' error: {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,421 @@
+import time
+import uuid
+import logging
+import asyncio
+from typing import Any
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from core.shared.database import memory
+from core.shared.database.redis import get_client
+
+
+# 仅当租约仍属于 token 时续期
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 仅当租约仍属于 token 时释放
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# 仅当成员仍在租约表中时续期
+RENEW_MEMBER_SCRIPT = """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# 回收过期成员: 从租约表中移除并累加丢失次数, 返回 {附带数据, 丢失次数}. 已被回收时返回 false
+REAP_MEMBER_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not score or tonumber(score) > tonumber(ARGV[2]) then
+    return false
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+local data = redis.call('HGET', KEYS[2], ARGV[1]) or ''
+redis.call('HDEL', KEYS[2], ARGV[1])
+local losses = redis.call('INCR', KEYS[3])
+redis.call('PEXPIRE', KEYS[3], ARGV[3])
+return {data, losses}
+"""
+
+
+@memory.script_fallback(RENEW_SCRIPT)
+async def _renew(client: memory.MemoryRedis, keys: list[str], args: list[str]) -> int:
+    if await client.get(keys[0]) == args[0]:
+        return int(await client.pexpire(keys[0], int(args[1])))
+    return 0
+
+
+@memory.script_fallback(RELEASE_SCRIPT)
+async def _release(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> int:
+    if await client.get(keys[0]) == args[0]:
+        return await client.delete(keys[0])
+    return 0
+
+
+@memory.script_fallback(RENEW_MEMBER_SCRIPT)
+async def _renew_member(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> int:
+    if await client.zscore(keys[0], args[0]) is None:
+        return 0
+    await client.zadd(keys[0], {args[0]: float(args[1])})
+    return 1
+
+
+@memory.script_fallback(REAP_MEMBER_SCRIPT)
+async def _reap_member(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> list[Any] | None:
+    score = await client.zscore(keys[0], args[0])
+    if score is None or score > float(args[1]):
+        return None
+    await client.zrem(keys[0], args[0])
+    data = await client.hget(keys[1], args[0]) or ""
+    await client.hdel(keys[1], args[0])
+    losses = await client.incr(keys[2])
+    await client.pexpire(keys[2], int(args[2]))
+    return [data, losses]
+
+
+class RLeaseLostError(Exception):
+    """租约已失效 (被其他持有者取代或过期)."""
+
+
+class RLease:
+    """
+    基于 Redis 实现的带过期时间的互斥租约.
+    持有者需在 ttl_ms 内续期, 进程崩溃后租约自动过期, 不会永久阻塞其他持有者.
+    """
+
+    def __init__(self, prefix: str = "lease", ttl_ms: int = 30_000):
+        self.prefix = prefix
+        self.ttl_ms = ttl_ms
+
+    @property
+    def _client(self):
+        return get_client()
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def acquire(self, key: str) -> str | None:
+        """尝试获取租约, 成功返回持有者 token, 否则返回 None."""
+        token = uuid.uuid4().hex
+        if await self._client.set(self._key(key), token, nx=True, px=self.ttl_ms):
+            return token
+        return None
+
+    async def renew(self, key: str, token: str) -> bool:
+        script = self._client.register_script(RENEW_SCRIPT)
+        return bool(await script(keys=[self._key(key)], args=[token, self.ttl_ms]))
+
+    async def release(self, key: str, token: str) -> bool:
+        script = self._client.register_script(RELEASE_SCRIPT)
+        return bool(await script(keys=[self._key(key)], args=[token]))
+
+    async def holder(self, key: str) -> str | None:
+        """当前持有租约的 token, 未被持有时返回 None."""
+        return await self._client.get(self._key(key))
+
+    async def fence(self, key: str) -> int:
+        """生成 key 的下一个 fencing token, 单调递增."""
+        return await self._client.incr(f"{self._key(key)}:fence")
+
+    async def validate(self, key: str, token: str, fence: int | None = None) -> bool:
+        """租约是否仍属于 token, 且 fence 仍是 key 最新的 fencing token."""
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.get(self._key(key))
+            pipe.get(f"{self._key(key)}:fence")
+            holder, latest = await pipe.execute()
+
+        return holder == token and (fence is None or int(latest or 0) == fence)
+
+    async def _keepalive(
+        self, key: str, token: str, holder: asyncio.Task[Any], lost: asyncio.Event
+    ):
+        while True:
+            await asyncio.sleep(self.ttl_ms / 1000 / 3)
+            try:
+                if not await self.renew(key, token):
+                    logging.warning(f"Lease '{self._key(key)}' lost before release")
+                    lost.set()
+                    holder.cancel()
+                    return
+            except Exception as e:
+                logging.error(f"Lease '{self._key(key)}' renew error: {e}")
+
+    @asynccontextmanager
+    async def keep(self, key: str, token: str) -> AsyncIterator[None]:
+        """
+        在上下文中为已获取的租约自动续期, 退出时释放.
+        租约丢失时取消持有者, 并在上下文中抛出 RLeaseLostError.
+        """
+        holder = asyncio.current_task()
+        assert holder is not None
+        lost = asyncio.Event()
+        keepalive = asyncio.create_task(self._keepalive(key, token, holder, lost))
+        try:
+            yield
+        except asyncio.CancelledError:
+            # 仅由租约丢失引起的取消转换为 RLeaseLostError, 持有者自身被取消时继续传播
+            if lost.is_set() and holder.uncancel() == 0:
+                raise RLeaseLostError(
+                    f"Lease '{self._key(key)}' lost before release"
+                ) from None
+            raise
+        finally:
+            keepalive.cancel()
+            if not lost.is_set():
+                try:
+                    await self.release(key, token)
+                except Exception as e:
+                    logging.error(f"Lease '{self._key(key)}' release error: {e}")
+
+    @asynccontextmanager
+    async def hold(
+        self, key: str, timeout: float | None = None, interval: float = 0.5
+    ) -> AsyncIterator[None]:
+        """
+        等待并持有租约. timeout 秒内未获取到时抛出 TimeoutError, 为空时一直等待.
+        持有期间租约丢失时抛出 RLeaseLostError.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        while (token := await self.acquire(key)) is None:
+            if deadline is not None and loop.time() >= deadline:
+                raise TimeoutError(f"Timed out waiting for lease '{self._key(key)}'")
+            await asyncio.sleep(interval)
+
+        async with self.keep(key, token):
+            yield
+
+
+class RLeader:
+    """
+    基于 RLease 的选主. 同一 key 同时最多只有一个 leader, leader 崩溃后租约过期,
+    其他实例在 ttl_ms + interval 内接任. 每次当选都会生成新的 fencing token,
+    leader 在提交写入前通过 validate 校验, 拒绝已被取代的 leader 的写入.
+    """
+
+    def __init__(self, lease: RLease, key: str, interval: float = 1.0):
+        self.key = key
+        self.interval = interval
+        self.fence: int | None = None
+        self._lease = lease
+        self._token: str | None = None
+        self._renewed_at = 0.0
+        self._elected = asyncio.Event()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._token is not None
+
+    async def wait(self) -> int:
+        """等待当选, 返回本次任期的 fencing token."""
+        while self.fence is None or not self.is_leader:
+            await self._elected.wait()
+        return self.fence
+
+    async def validate(self, fence: int) -> bool:
+        """是否仍是 fence 所在任期的 leader."""
+        if self._token is None or self.fence != fence:
+            return False
+        return await self._lease.validate(self.key, self._token, fence)
+
+    def _step_down(self):
+        if self._token is not None:
+            logging.warning(f"Lost leadership of '{self.key}'")
+        self._token = None
+        self.fence = None
+        self._elected.clear()
+
+    async def _campaign(self):
+        token = await self._lease.acquire(self.key)
+        if token is None:
+            return
+
+        self.fence = await self._lease.fence(self.key)
+        self._token = token
+        self._renewed_at = time.monotonic()
+        self._elected.set()
+        logging.info(f"Elected as leader of '{self.key}' with fence {self.fence}")
+
+    async def _renew(self):
+        assert self._token is not None
+        if await self._lease.renew(self.key, self._token):
+            self._renewed_at = time.monotonic()
+        else:
+            self._step_down()
+
+    async def run(self):
+        """持续参与选举. 任期内定期续期, 续期失败或超过 ttl 未能续期时主动让位."""
+        ttl = self._lease.ttl_ms / 1000
+
+        while True:
+            try:
+                if self._token is None:
+                    await self._campaign()
+                    await asyncio.sleep(self.interval)
+                else:
+                    await asyncio.sleep(ttl / 3)
+                    await self._renew()
+
+            except asyncio.CancelledError:
+                if self._token is not None:
+                    try:
+                        await self._lease.release(self.key, self._token)
+                    except Exception as e:
+                        logging.error(f"Leader '{self.key}' release error: {e}")
+                    self._step_down()
+                break
+            except Exception as e:
+                logging.error(f"Leader '{self.key}' loop error: {e}", exc_info=True)
+                # 无法确认租约时, 超过 ttl 后其他实例可能已经接任
+                if self._token and time.monotonic() - self._renewed_at >= ttl:
+                    self._step_down()
+                await asyncio.sleep(self.interval)
+
+
+class RLeaseTable:
+    """
+    基于 ZSET 的租约表, 成员的分数为租约到期时间, 可以批量扫描过期的租约.
+    持有者在 ttl_ms 内续期, 过期成员由 reap 回收并累加丢失次数,
+    丢失次数可作为世代号, 拒绝回收前发出的过期消息.
+    """
+
+    def __init__(
+        self, key: str, ttl_ms: int = 15_000, losses_ttl_ms: int = 86_400_000
+    ):
+        self.key = key
+        self.ttl_ms = ttl_ms
+        self.losses_ttl_ms = losses_ttl_ms
+
+    @property
+    def _client(self):
+        return get_client()
+
+    @property
+    def _data_key(self) -> str:
+        return f"{self.key}:data"
+
+    def _losses_key(self, member: str) -> str:
+        return f"{self.key}:losses:{member}"
+
+    def _deadline(self) -> int:
+        return int(time.time() * 1000) + self.ttl_ms
+
+    async def acquire(self, member: str, data: str = ""):
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.key, {member: self._deadline()})
+            pipe.hset(self._data_key, member, data)
+            await pipe.execute()
+
+    async def renew(self, member: str) -> bool:
+        """续期, 成员已被回收时返回 False."""
+        script = self._client.register_script(RENEW_MEMBER_SCRIPT)
+        return bool(await script(keys=[self.key], args=[member, self._deadline()]))
+
+    async def release(self, member: str):
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.key, member)
+            pipe.hdel(self._data_key, member)
+            await pipe.execute()
+
+    async def losses(self, member: str) -> int:
+        """成员租约的丢失次数."""
+        return int(await self._client.get(self._losses_key(member)) or 0)
+
+    async def alive(self, members: list[str]) -> set[str]:
+        """members 中租约尚未过期的成员."""
+        if not members:
+            return set()
+
+        now_ms = int(time.time() * 1000)
+        async with self._client.pipeline(transaction=False) as pipe:
+            for member in members:
+                pipe.zscore(self.key, member)
+            scores = await pipe.execute()
+
+        return {
+            member
+            for member, score in zip(members, scores)
+            if score is not None and score > now_ms
+        }
+
+    async def reap(self, limit: int = 100) -> list[tuple[str, str, int]]:
+        """回收最多 limit 个过期成员, 返回 (成员, 附带数据, 丢失次数)."""
+        now_ms = int(time.time() * 1000)
+        expired = await self._client.zrangebyscore(self.key, "-inf", now_ms, 0, limit)
+
+        script = self._client.register_script(REAP_MEMBER_SCRIPT)
+        reaped: list[tuple[str, str, int]] = []
+        for member in expired:
+            result = await script(
+                keys=[self.key, self._data_key, self._losses_key(member)],
+                args=[member, now_ms, self.losses_ttl_ms],
+            )
+            # 并发回收时只有一方成功
+            if result:
+                reaped.append((member, result[0], int(result[1])))
+        return reaped
+
+    async def _keepalive(
+        self, member: str, holder: asyncio.Task[Any], lost: asyncio.Event
+    ):
+        while True:
+            await asyncio.sleep(self.ttl_ms / 1000 / 3)
+            try:
+                if not await self.renew(member):
+                    logging.warning(f"Lease '{member}' of '{self.key}' was reaped")
+                    lost.set()
+                    holder.cancel()
+                    return
+            except Exception as e:
+                logging.error(f"Lease '{member}' of '{self.key}' renew error: {e}")
+
+    @asynccontextmanager
+    async def keep(self, member: str, data: str = "") -> AsyncIterator[None]:
+        """
+        在上下文中持有并自动续期成员租约, 退出时释放.
+        租约被回收时取消持有者, 并在上下文中抛出 RLeaseLostError.
+        """
+        await self.acquire(member, data)
+        holder = asyncio.current_task()
+        assert holder is not None
+        lost = asyncio.Event()
+        keepalive = asyncio.create_task(self._keepalive(member, holder, lost))
+        try:
+            yield
+        except asyncio.CancelledError:
+            # 仅由租约丢失引起的取消转换为 RLeaseLostError, 持有者自身被取消时继续传播
+            if lost.is_set() and holder.uncancel() == 0:
+                raise RLeaseLostError(
+                    f"Lease '{member}' of '{self.key}' was reaped"
+                ) from None
+            raise
+        finally:
+            keepalive.cancel()
+            # 已被回收的成员可能已由新的持有者重新获取, 不能再释放
+            if not lost.is_set():
+                try:
+                    await self.release(member)
+                except Exception as e:
+                    logging.error(
+                        f"Lease '{member}' of '{self.key}' release error: {e}"
+                    )
@@ -0,0 +1,349 @@
+import time
+import uuid
+import math
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from pydantic import Field
+
+from core.shared.base import models as base_models
+from core.shared.database import memory
+from core.shared.database.redis import get_client
+
+
+# 清理过期的排队者, 未排队时按 ticket 顺序入队, 排名在 limit 之内即获得槽位
+ACQUIRE_SLOT_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[3], 'LIMIT', 0, 100)
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZREM', KEYS[2], member)
+end
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], redis.call('INCR', KEYS[3]), ARGV[1])
+end
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+if redis.call('ZRANK', KEYS[1], ARGV[1]) < tonumber(ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+# 仅当槽位仍被持有时续期
+RENEW_SLOT_SCRIPT = """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# 令牌桶: 按流逝时间补充令牌后扣除 cost, 令牌不足时返回需要等待的毫秒数.
+# force 为 1 时无条件扣除 (cost 可为负数), 用于按实际用量结算, 令牌数可以为负
+TAKE_TOKENS_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or capacity)
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts') or now)
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local need = math.min(cost, capacity)
+local wait = 0
+if ARGV[5] == '1' or tokens >= need then
+    tokens = math.min(capacity, tokens - cost)
+else
+    wait = math.ceil((need - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], ARGV[6])
+return wait
+"""
+
+
+@memory.script_fallback(ACQUIRE_SLOT_SCRIPT)
+async def _acquire_slot(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> int:
+    expired = await client.zrangebyscore(keys[1], "-inf", float(args[2]), 0, 100)
+    for member in expired:
+        await client.zrem(keys[0], member)
+        await client.zrem(keys[1], member)
+    if await client.zscore(keys[0], args[0]) is None:
+        await client.zadd(keys[0], {args[0]: await client.incr(keys[2])})
+    await client.zadd(keys[1], {args[0]: float(args[3])})
+    members = await client.zrangebyscore(keys[0], "-inf", "+inf")
+    return int(members.index(args[0]) < int(args[1]))
+
+
+@memory.script_fallback(RENEW_SLOT_SCRIPT)
+async def _renew_slot(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> int:
+    if await client.zscore(keys[0], args[0]) is None:
+        return 0
+    await client.zadd(keys[1], {args[0]: float(args[1])})
+    return 1
+
+
+@memory.script_fallback(TAKE_TOKENS_SCRIPT)
+async def _take_tokens(
+    client: memory.MemoryRedis, keys: list[str], args: list[str]
+) -> int:
+    capacity, rate, now, cost = (float(arg) for arg in args[:4])
+    tokens = float(await client.hget(keys[0], "tokens") or capacity)
+    ts = float(await client.hget(keys[0], "ts") or now)
+    tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+    need = min(cost, capacity)
+    wait = 0
+    if args[4] == "1" or tokens >= need:
+        tokens = min(capacity, tokens - cost)
+    else:
+        wait = math.ceil((need - tokens) / rate)
+    await client.hset(keys[0], mapping={"tokens": tokens, "ts": now})
+    await client.pexpire(keys[0], int(args[5]))
+    return wait
+
+
+class RLimiterPolicy(base_models.BaseModel):
+    concurrency: int | None = Field(
+        default=None, description="最大并发调用数, 为空时不限制"
+    )
+    tokens_per_minute: int | None = Field(
+        default=None, description="每分钟最多消耗的 token 数, 为空时不限制"
+    )
+
+
+class RLimiterInfo(base_models.BaseModel):
+    name: str
+    scope: str = Field(description="调用方凭证的摘要")
+    policy: RLimiterPolicy
+    holders: int = Field(description="所有进程中持有槽位的调用数")
+    waiters: int = Field(description="所有进程中排队等待槽位的调用数")
+    tokens: float | None = Field(description="令牌桶中剩余的 token 数")
+    acquired: int = Field(description="本进程获得许可的次数")
+    waiting: int = Field(description="本进程正在等待许可的调用数")
+    wait_avg_ms: float = Field(description="本进程最近获得许可的平均等待毫秒数")
+    wait_p95_ms: float = Field(description="本进程最近获得许可的 p95 等待毫秒数")
+    wait_max_ms: float = Field(description="本进程获得许可的最长等待毫秒数")
+
+
+@dataclass
+class RLimiterWaitStats:
+    """本进程内某个限流键的等待时间统计."""
+
+    acquired: int = 0
+    waiting: int = 0
+    max_ms: float = 0.0
+    samples: deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+    def record(self, wait_ms: float):
+        self.acquired += 1
+        self.max_ms = max(self.max_ms, wait_ms)
+        self.samples.append(wait_ms)
+
+    @property
+    def avg_ms(self) -> float:
+        return sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+    @property
+    def p95_ms(self) -> float:
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+@dataclass
+class RLimiterPermit:
+    """已获得的调用许可, 调用结束后以 settle 按实际 token 用量结算."""
+
+    limiter: "RLimiter"
+    key: str
+    policy: RLimiterPolicy
+    reserved: int
+    settled: bool = False
+
+    async def settle(self, tokens: int):
+        if self.settled or not self.policy.tokens_per_minute:
+            return
+        self.settled = True
+        await self.limiter._take_tokens(
+            self.key, self.policy, tokens - self.reserved, force=True
+        )
+
+
+class RLimiter:
+    """
+    基于 Redis 的跨进程限流器, 按 (name, scope) 分别限制并发数与每分钟 token 数.
+    name 用于匹配限流策略 (如模型名称), scope 区分调用方凭证 (如 API Key), 仅以摘要写入 Redis.
+
+    - 并发槽位为公平信号量: 调用方按 ticket 先后排队, 排名在 concurrency 之内即获得槽位.
+      排队者与持有者都需在 ttl_ms 内续期, 崩溃进程的槽位将自动释放.
+    - token 为令牌桶: 获得槽位后按预估用量扣除令牌, 调用结束后按实际用量补扣或返还.
+    """
+
+    def __init__(
+        self,
+        prefix: str = "limiter",
+        policies: dict[str, RLimiterPolicy] | None = None,
+        default_policy: RLimiterPolicy | None = None,
+        ttl_ms: int = 30_000,
+        poll_interval: float = 0.1,
+    ):
+        self.prefix = prefix
+        self.policies = policies or {}
+        self.default_policy = default_policy or RLimiterPolicy()
+        self.ttl_ms = ttl_ms
+        self.poll_interval = poll_interval
+        self._stats: dict[tuple[str, str], RLimiterWaitStats] = {}
+
+    @property
+    def _client(self):
+        return get_client()
+
+    @staticmethod
+    def digest(scope: str) -> str:
+        return hashlib.sha256(scope.encode()).hexdigest()[:16] if scope else ""
+
+    def policy(self, name: str) -> RLimiterPolicy:
+        return self.policies.get(name, self.default_policy)
+
+    def _key(self, name: str, digest: str) -> str:
+        return f"{self.prefix}:{name}:{digest}"
+
+    def _deadline(self) -> int:
+        return int(time.time() * 1000) + self.ttl_ms
+
+    async def _take_tokens(
+        self, key: str, policy: RLimiterPolicy, cost: int, force: bool = False
+    ) -> int:
+        assert policy.tokens_per_minute
+        script = self._client.register_script(TAKE_TOKENS_SCRIPT)
+        return int(
+            await script(
+                keys=[f"{key}:bucket"],
+                args=[
+                    policy.tokens_per_minute,
+                    policy.tokens_per_minute / 60_000,
+                    int(time.time() * 1000),
+                    cost,
+                    int(force),
+                    120_000,
+                ],
+            )
+        )
+
+    async def _acquire_slot(self, key: str, member: str, concurrency: int):
+        script = self._client.register_script(ACQUIRE_SLOT_SCRIPT)
+        while not await script(
+            keys=[f"{key}:slots", f"{key}:alive", f"{key}:ticket"],
+            args=[member, concurrency, int(time.time() * 1000), self._deadline()],
+        ):
+            await asyncio.sleep(self.poll_interval)
+
+    async def _release_slot(self, key: str, member: str):
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.zrem(f"{key}:slots", member)
+            pipe.zrem(f"{key}:alive", member)
+            await pipe.execute()
+
+    async def _keepalive(self, key: str, member: str):
+        script = self._client.register_script(RENEW_SLOT_SCRIPT)
+        while True:
+            await asyncio.sleep(self.ttl_ms / 1000 / 3)
+            try:
+                if not await script(
+                    keys=[f"{key}:slots", f"{key}:alive"],
+                    args=[member, self._deadline()],
+                ):
+                    logging.warning(f"Limiter slot '{member}' of '{key}' was expired")
+                    return
+            except Exception as e:
+                logging.error(f"Limiter slot '{member}' of '{key}' renew error: {e}")
+
+    @asynccontextmanager
+    async def acquire(
+        self, name: str, scope: str = "", tokens: int = 0
+    ) -> AsyncIterator[RLimiterPermit]:
+        """
+        等待并持有 (name, scope) 的一个并发槽位与 tokens 个令牌, 退出时释放槽位.
+        预估的 tokens 超过每分钟上限时按上限等待, 避免永远无法获得许可.
+        """
+        policy = self.policy(name)
+        digest = self.digest(scope)
+        key = self._key(name, digest)
+        stats = self._stats.setdefault((name, digest), RLimiterWaitStats())
+        member = uuid.uuid4().hex
+
+        started = time.monotonic()
+        stats.waiting += 1
+        keepalive: asyncio.Task[None] | None = None
+        try:
+            if policy.concurrency:
+                await self._acquire_slot(key, member, policy.concurrency)
+                keepalive = asyncio.create_task(self._keepalive(key, member))
+            if policy.tokens_per_minute:
+                while wait_ms := await self._take_tokens(key, policy, tokens):
+                    await asyncio.sleep(min(wait_ms / 1000, 1.0))
+        except BaseException:
+            if keepalive:
+                keepalive.cancel()
+            if policy.concurrency:
+                await self._release_slot(key, member)
+            raise
+        finally:
+            stats.waiting -= 1
+
+        stats.record((time.monotonic() - started) * 1000)
+        try:
+            yield RLimiterPermit(self, key, policy, tokens)
+        finally:
+            if keepalive:
+                keepalive.cancel()
+                try:
+                    await self._release_slot(key, member)
+                except Exception as e:
+                    logging.error(f"Limiter slot '{member}' of '{key}' error: {e}")
+
+    async def inspect(self) -> list[RLimiterInfo]:
+        """本进程使用过的所有限流键的状态."""
+        infos: list[RLimiterInfo] = []
+        now_ms = int(time.time() * 1000)
+        for (name, digest), stats in self._stats.items():
+            policy = self.policy(name)
+            key = self._key(name, digest)
+            async with self._client.pipeline(transaction=False) as pipe:
+                pipe.zcard(f"{key}:slots")
+                pipe.hget(f"{key}:bucket", "tokens")
+                pipe.hget(f"{key}:bucket", "ts")
+                queued, tokens, ts = await pipe.execute()
+
+            remaining: float | None = None
+            if policy.tokens_per_minute:
+                remaining = float(policy.tokens_per_minute)
+                if tokens is not None and ts is not None:
+                    refill = (now_ms - float(ts)) * policy.tokens_per_minute / 60_000
+                    remaining = min(remaining, float(tokens) + max(0.0, refill))
+
+            concurrency = policy.concurrency or queued
+            infos.append(
+                RLimiterInfo(
+                    name=name,
+                    scope=digest,
+                    policy=policy,
+                    holders=min(queued, concurrency),
+                    waiters=max(0, queued - concurrency),
+                    tokens=remaining,
+                    acquired=stats.acquired,
+                    waiting=stats.waiting,
+                    wait_avg_ms=stats.avg_ms,
+                    wait_p95_ms=stats.p95_ms,
+                    wait_max_ms=stats.max_ms,
+                )
+            )
+        return infos
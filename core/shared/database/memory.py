@@ -0,0 +1,893 @@
+"""
+进程内的 Redis 替代实现, 用于本地基准测试与确定性测试.
+
+实现了 RBroker / RCacher / RSession / RLease 用到的字符串、列表、哈希、有序集合、Stream,
+消费者组与发布订阅命令, 返回值与 redis-py (decode_responses=True) 保持一致.
+Lua 脚本无法在进程内执行, 需要由脚本所在模块通过 script_fallback 注册等价的 Python 实现.
+所有命令都不会在执行过程中让出事件循环 (阻塞读取除外), 因此脚本与事务天然是原子的.
+"""
+
+import time
+import asyncio
+import bisect
+from collections import deque
+from dataclasses import dataclass, field
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from redis.exceptions import ResponseError
+
+
+StreamID = tuple[int, int]
+ScriptFallback = Callable[["MemoryRedis", list[str], list[str]], Awaitable[Any]]
+
+_SCRIPT_FALLBACKS: dict[str, ScriptFallback] = {}
+
+
+def script_fallback(source: str) -> Callable[[ScriptFallback], ScriptFallback]:
+    """注册 Lua 脚本在内存后端中的等价实现."""
+
+    def decorator(func: ScriptFallback) -> ScriptFallback:
+        _SCRIPT_FALLBACKS[source] = func
+        return func
+
+    return decorator
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _format_id(stream_id: StreamID) -> str:
+    return f"{stream_id[0]}-{stream_id[1]}"
+
+
+def _parse_id(value: str, upper: bool = False) -> StreamID:
+    if value == "-":
+        return (0, 0)
+    if value == "+":
+        return (2**64 - 1, 2**64 - 1)
+    ms, _, seq = value.partition("-")
+    if not seq:
+        return (int(ms), 2**64 - 1 if upper else 0)
+    return (int(ms), int(seq))
+
+
+@dataclass
+class _Pending:
+    consumer: str
+    delivered_at: int
+    delivery_count: int = 1
+
+
+@dataclass
+class _Group:
+    last_delivered: StreamID
+    entries_read: int = 0
+    pel: dict[StreamID, _Pending] = field(default_factory=dict)
+    # 消费者名称 -> (最后一次尝试读取时间, 最后一次成功读取时间)
+    consumers: dict[str, list[int]] = field(default_factory=dict)
+
+    def touch(self, consumer: str, active: bool = False):
+        now = _now_ms()
+        seen = self.consumers.setdefault(consumer, [now, -1])
+        seen[0] = now
+        if active:
+            seen[1] = now
+
+
+@dataclass
+class _Stream:
+    ids: list[StreamID] = field(default_factory=list)
+    entries: dict[StreamID, dict[str, str]] = field(default_factory=dict)
+    last_id: StreamID = (0, 0)
+    groups: dict[str, _Group] = field(default_factory=dict)
+
+    def next_id(self) -> StreamID:
+        ms = _now_ms()
+        if ms <= self.last_id[0]:
+            return (self.last_id[0], self.last_id[1] + 1)
+        return (ms, 0)
+
+    def delete(self, stream_id: StreamID) -> bool:
+        if stream_id not in self.entries:
+            return False
+        del self.entries[stream_id]
+        self.ids.pop(bisect.bisect_left(self.ids, stream_id))
+        return True
+
+    def range(self, start: StreamID, end: StreamID) -> list[StreamID]:
+        return self.ids[
+            bisect.bisect_left(self.ids, start) : bisect.bisect_right(self.ids, end)
+        ]
+
+
+class _ZSet(dict[str, float]):
+    pass
+
+
+class MemoryStore:
+    """所有客户端共享的数据与过期时间."""
+
+    def __init__(self):
+        self.data: dict[str, Any] = {}
+        self.expires: dict[str, float] = {}
+        self.waiters: set[asyncio.Future[None]] = set()
+        self.channels: dict[str, set["MemoryPubSub"]] = {}
+
+    def notify(self):
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self.waiters.clear()
+
+
+class MemoryScript:
+    def __init__(self, client: "MemoryRedis", source: str):
+        if source not in _SCRIPT_FALLBACKS:
+            raise NotImplementedError("Script has no in-memory fallback")
+        self._client = client
+        self._func = _SCRIPT_FALLBACKS[source]
+
+    async def __call__(
+        self,
+        keys: list[Any] | None = None,
+        args: list[Any] | None = None,
+        client: "MemoryRedis | MemoryPipeline | None" = None,
+    ) -> Any:
+        target = client or self._client
+        str_keys = [target._str(key) for key in keys or []]
+        str_args = [target._str(arg) for arg in args or []]
+
+        if isinstance(target, MemoryPipeline):
+            target._queue(self._func, target._client, str_keys, str_args)
+            return target
+
+        return await self._func(target, str_keys, str_args)
+
+
+class MemoryPipeline:
+    """命令在 execute 时依次执行. 由于内存命令不会让出事件循环, 事务与非事务管道行为一致."""
+
+    def __init__(self, client: "MemoryRedis"):
+        self._client = client
+        self._commands: list[tuple[Callable[..., Awaitable[Any]], tuple[Any, ...]]] = []
+
+    async def __aenter__(self) -> "MemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info: Any):
+        self._commands.clear()
+
+    def _str(self, value: Any) -> str:
+        return self._client._str(value)
+
+    def _queue(self, func: Callable[..., Awaitable[Any]], *args: Any):
+        self._commands.append((func, args))
+
+    def __getattr__(self, name: str) -> Callable[..., "MemoryPipeline"]:
+        method = getattr(self._client, name)
+
+        def queue(*args: Any, **kwargs: Any) -> "MemoryPipeline":
+            self._commands.append((lambda: method(*args, **kwargs), ()))
+            return self
+
+        return queue
+
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        results: list[Any] = []
+        commands, self._commands = self._commands, []
+        for func, args in commands:
+            try:
+                results.append(await func(*args))
+            except ResponseError as e:
+                if raise_on_error:
+                    raise
+                results.append(e)
+        return results
+
+
+class MemoryPubSub:
+    """redis.asyncio.client.PubSub 的进程内替代实现, 仅支持精确匹配的频道."""
+
+    def __init__(self, client: "MemoryRedis"):
+        self._client = client
+        self._channels: set[str] = set()
+        self._messages: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    async def __aenter__(self) -> "MemoryPubSub":
+        return self
+
+    async def __aexit__(self, *exc_info: Any):
+        await self.aclose()
+
+    def _deliver(self, message: dict[str, Any]):
+        self._messages.put_nowait(message)
+
+    async def subscribe(self, *channels: Any):
+        for channel in channels:
+            channel = self._client._str(channel)
+            self._channels.add(channel)
+            self._client._store.channels.setdefault(channel, set()).add(self)
+            self._deliver(
+                {
+                    "type": "subscribe",
+                    "pattern": None,
+                    "channel": channel,
+                    "data": len(self._channels),
+                }
+            )
+
+    async def unsubscribe(self, *channels: Any):
+        for channel in [self._client._str(c) for c in channels] or list(self._channels):
+            self._channels.discard(channel)
+            subscribers = self._client._store.channels.get(channel, set())
+            subscribers.discard(self)
+            if not subscribers:
+                self._client._store.channels.pop(channel, None)
+            self._deliver(
+                {
+                    "type": "unsubscribe",
+                    "pattern": None,
+                    "channel": channel,
+                    "data": len(self._channels),
+                }
+            )
+
+    async def get_message(
+        self, ignore_subscribe_messages: bool = False, timeout: float | None = 0.0
+    ) -> dict[str, Any] | None:
+        while True:
+            try:
+                message = await asyncio.wait_for(self._messages.get(), timeout)
+            except TimeoutError:
+                return None
+            if not ignore_subscribe_messages or message["type"] == "message":
+                return message
+
+    async def listen(self) -> AsyncIterator[dict[str, Any]]:
+        while self._channels or not self._messages.empty():
+            yield await self._messages.get()
+
+    async def aclose(self):
+        if self._channels:
+            await self.unsubscribe()
+
+
+class MemoryRedis:
+    """
+    redis.asyncio.Redis 的进程内替代实现. 仅实现本项目用到的命令.
+    """
+
+    def __init__(self, store: MemoryStore, encoding: str = "utf-8"):
+        self._store = store
+        self._encoding = encoding
+
+    def _str(self, value: Any) -> str:
+        if isinstance(value, bytes):
+            return value.decode(self._encoding)
+        if isinstance(value, float):
+            return repr(value)
+        return str(value)
+
+    # ---- 键空间
+
+    def _get(self, key: str, kind: type | None = None) -> Any:
+        expire_at = self._store.expires.get(key)
+        if expire_at is not None and expire_at <= time.time():
+            self._store.data.pop(key, None)
+            self._store.expires.pop(key, None)
+
+        value = self._store.data.get(key)
+        if value is not None and kind is not None and not isinstance(value, kind):
+            raise ResponseError(
+                "WRONGTYPE Operation against a key holding the wrong kind of value"
+            )
+        return value
+
+    def _remove_if_empty(self, key: str):
+        if not self._store.data.get(key):
+            self._store.data.pop(key, None)
+            self._store.expires.pop(key, None)
+
+    def register_script(self, script: str) -> MemoryScript:
+        return MemoryScript(self, script)
+
+    def pipeline(self, transaction: bool = True) -> MemoryPipeline:
+        return MemoryPipeline(self)
+
+    def pubsub(self) -> MemoryPubSub:
+        return MemoryPubSub(self)
+
+    async def publish(self, channel: str, message: Any) -> int:
+        subscribers = self._store.channels.get(self._str(channel), set())
+        for subscriber in subscribers:
+            subscriber._deliver(
+                {
+                    "type": "message",
+                    "pattern": None,
+                    "channel": self._str(channel),
+                    "data": self._str(message),
+                }
+            )
+        return len(subscribers)
+
+    async def exists(self, *names: str) -> int:
+        return sum(self._get(name) is not None for name in names)
+
+    async def delete(self, *names: str) -> int:
+        deleted = 0
+        for name in names:
+            if self._get(name) is not None:
+                del self._store.data[name]
+                self._store.expires.pop(name, None)
+                deleted += 1
+        return deleted
+
+    async def ttl(self, name: str) -> int:
+        if self._get(name) is None:
+            return -2
+        expire_at = self._store.expires.get(name)
+        if expire_at is None:
+            return -1
+        return max(round(expire_at - time.time()), 0)
+
+    async def pttl(self, name: str) -> int:
+        if self._get(name) is None:
+            return -2
+        expire_at = self._store.expires.get(name)
+        if expire_at is None:
+            return -1
+        return max(int((expire_at - time.time()) * 1000), 0)
+
+    async def expire(self, name: str, seconds: int) -> bool:
+        return await self.pexpire(name, int(seconds) * 1000)
+
+    async def pexpire(self, name: str, milliseconds: int) -> bool:
+        if self._get(name) is None:
+            return False
+        self._store.expires[name] = time.time() + int(milliseconds) / 1000
+        return True
+
+    # ---- 字符串
+
+    async def get(self, name: str) -> str | None:
+        return self._get(name, str)
+
+    async def set(
+        self,
+        name: str,
+        value: Any,
+        ex: int | None = None,
+        px: int | None = None,
+        nx: bool = False,
+        xx: bool = False,
+    ) -> bool | None:
+        exists = self._get(name) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+
+        self._store.data[name] = self._str(value)
+        self._store.expires.pop(name, None)
+        if ex is not None:
+            self._store.expires[name] = time.time() + int(ex)
+        if px is not None:
+            self._store.expires[name] = time.time() + int(px) / 1000
+        return True
+
+    async def incr(self, name: str, amount: int = 1) -> int:
+        value = int(self._get(name, str) or 0) + amount
+        self._store.data[name] = str(value)
+        return value
+
+    # ---- 列表
+
+    async def llen(self, name: str) -> int:
+        return len(self._get(name, deque) or ())
+
+    async def lpush(self, name: str, *values: Any) -> int:
+        items = self._get(name, deque)
+        if items is None:
+            items = self._store.data[name] = deque()
+        for value in values:
+            items.appendleft(self._str(value))
+        return len(items)
+
+    async def rpop(self, name: str) -> str | None:
+        items = self._get(name, deque)
+        if not items:
+            return None
+        value = items.pop()
+        self._remove_if_empty(name)
+        return value
+
+    async def lrange(self, name: str, start: int, end: int) -> list[str]:
+        items = list(self._get(name, deque) or ())
+        end = len(items) if end == -1 else end + 1
+        return items[start:end]
+
+    # ---- 哈希
+
+    async def hset(
+        self,
+        name: str,
+        key: Any = None,
+        value: Any = None,
+        mapping: dict[Any, Any] | None = None,
+    ) -> int:
+        fields = self._get(name, dict)
+        if fields is None:
+            fields = self._store.data[name] = {}
+
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+
+        added = 0
+        for k, v in items.items():
+            k = self._str(k)
+            added += k not in fields
+            fields[k] = self._str(v)
+        return added
+
+    async def hget(self, name: str, key: str) -> str | None:
+        return (self._get(name, dict) or {}).get(key)
+
+    async def hgetall(self, name: str) -> dict[str, str]:
+        return dict(self._get(name, dict) or {})
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        fields = self._get(name, dict) or {}
+        deleted = sum(fields.pop(key, None) is not None for key in keys)
+        self._remove_if_empty(name)
+        return deleted
+
+    # ---- 有序集合, 以 member -> score 的字典存储
+
+    def _zset(self, name: str) -> dict[str, float]:
+        members = self._get(name, _ZSet)
+        if members is None:
+            members = self._store.data[name] = _ZSet()
+        return members
+
+    async def zadd(self, name: str, mapping: dict[Any, float]) -> int:
+        members = self._zset(name)
+        added = 0
+        for member, score in mapping.items():
+            member = self._str(member)
+            added += member not in members
+            members[member] = float(score)
+        return added
+
+    async def zrem(self, name: str, *values: Any) -> int:
+        members = self._zset(name)
+        removed = sum(members.pop(self._str(v), None) is not None for v in values)
+        self._remove_if_empty(name)
+        return removed
+
+    async def zcard(self, name: str) -> int:
+        return len(self._get(name, _ZSet) or ())
+
+    async def zscore(self, name: str, value: Any) -> float | None:
+        return (self._get(name, _ZSet) or {}).get(self._str(value))
+
+    async def zrangebyscore(
+        self,
+        name: str,
+        min: float | str,
+        max: float | str,
+        start: int | None = None,
+        num: int | None = None,
+        withscores: bool = False,
+    ) -> list[Any]:
+        low, high = float(min), float(max)
+        members = sorted(
+            (
+                (score, member)
+                for member, score in (self._get(name, _ZSet) or {}).items()
+                if low <= score <= high
+            )
+        )
+        if start is not None and num is not None:
+            members = members[start : start + num if num >= 0 else None]
+        if withscores:
+            return [(member, score) for score, member in members]
+        return [member for _, member in members]
+
+    # ---- Stream
+
+    def _stream(self, name: str, create: bool = False) -> _Stream:
+        stream = self._get(name, _Stream)
+        if stream is None:
+            if not create:
+                raise ResponseError("no such key")
+            stream = self._store.data[name] = _Stream()
+        return stream
+
+    def _group(self, name: str, groupname: str) -> tuple[_Stream, _Group]:
+        stream = self._get(name, _Stream)
+        if stream is None or groupname not in stream.groups:
+            raise ResponseError(
+                f"NOGROUP No such key '{name}' or consumer group '{groupname}'"
+            )
+        return stream, stream.groups[groupname]
+
+    def _entry(
+        self, stream: _Stream, stream_id: StreamID
+    ) -> tuple[str, dict[str, str]]:
+        return _format_id(stream_id), dict(stream.entries[stream_id])
+
+    def _trim(
+        self, stream: _Stream, maxlen: int | None = None, minid: str | None = None
+    ) -> int:
+        trimmed = 0
+        if minid is not None:
+            boundary = _parse_id(minid)
+            while stream.ids and stream.ids[0] < boundary:
+                trimmed += stream.delete(stream.ids[0])
+        if maxlen is not None:
+            while len(stream.ids) > maxlen:
+                trimmed += stream.delete(stream.ids[0])
+        return trimmed
+
+    async def xadd(
+        self,
+        name: str,
+        fields: dict[Any, Any],
+        id: str = "*",
+        maxlen: int | None = None,
+        approximate: bool = True,
+        nomkstream: bool = False,
+        minid: str | None = None,
+    ) -> str | None:
+        if nomkstream and self._get(name, _Stream) is None:
+            return None
+
+        stream = self._stream(name, create=True)
+        stream_id = stream.next_id() if id == "*" else _parse_id(id)
+        if stream_id <= stream.last_id:
+            raise ResponseError(
+                "The ID specified in XADD is equal or smaller than the target "
+                "stream top item"
+            )
+
+        stream.ids.append(stream_id)
+        stream.entries[stream_id] = {
+            self._str(k): self._str(v) for k, v in fields.items()
+        }
+        stream.last_id = stream_id
+        self._trim(stream, maxlen=maxlen, minid=minid)
+        self._store.notify()
+        return _format_id(stream_id)
+
+    async def xlen(self, name: str) -> int:
+        stream = self._get(name, _Stream)
+        return len(stream.ids) if stream else 0
+
+    async def xdel(self, name: str, *ids: str) -> int:
+        stream = self._get(name, _Stream)
+        if stream is None:
+            return 0
+        return sum(stream.delete(_parse_id(self._str(i))) for i in ids)
+
+    async def xtrim(
+        self,
+        name: str,
+        maxlen: int | None = None,
+        approximate: bool = True,
+        minid: str | None = None,
+        limit: int | None = None,
+    ) -> int:
+        stream = self._get(name, _Stream)
+        if stream is None:
+            return 0
+        return self._trim(stream, maxlen=maxlen, minid=minid)
+
+    def _range_bounds(self, min: str, max: str) -> tuple[StreamID, StreamID]:
+        if min.startswith("("):
+            ms, seq = _parse_id(min[1:], upper=True)
+            start = (ms, seq + 1)
+        else:
+            start = _parse_id(min)
+        if max.startswith("("):
+            ms, seq = _parse_id(max[1:])
+            end = (ms, seq - 1) if seq else (ms - 1, 2**64 - 1)
+        else:
+            end = _parse_id(max, upper=True)
+        return start, end
+
+    async def xrange(
+        self, name: str, min: str = "-", max: str = "+", count: int | None = None
+    ) -> list[tuple[str, dict[str, str]]]:
+        stream = self._get(name, _Stream)
+        if stream is None:
+            return []
+        ids = stream.range(*self._range_bounds(min, max))
+        return [self._entry(stream, i) for i in ids[:count]]
+
+    async def xrevrange(
+        self, name: str, max: str = "+", min: str = "-", count: int | None = None
+    ) -> list[tuple[str, dict[str, str]]]:
+        stream = self._get(name, _Stream)
+        if stream is None:
+            return []
+        ids = stream.range(*self._range_bounds(min, max))[::-1]
+        return [self._entry(stream, i) for i in ids[:count]]
+
+    async def xgroup_create(
+        self, name: str, groupname: str, id: str = "$", mkstream: bool = False
+    ) -> bool:
+        if self._get(name, _Stream) is None and not mkstream:
+            raise ResponseError(
+                "The XGROUP subcommand requires the key to exist. Note that for "
+                "CREATE you may want to use the MKSTREAM option to create an empty "
+                "stream automatically."
+            )
+
+        stream = self._stream(name, create=True)
+        if groupname in stream.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+
+        last_delivered = stream.last_id if id == "$" else _parse_id(id)
+        stream.groups[groupname] = _Group(last_delivered=last_delivered)
+        return True
+
+    async def xgroup_delconsumer(
+        self, name: str, groupname: str, consumername: str
+    ) -> int:
+        _stream, group = self._group(name, groupname)
+        owned = [i for i, p in group.pel.items() if p.consumer == consumername]
+        for stream_id in owned:
+            del group.pel[stream_id]
+        group.consumers.pop(consumername, None)
+        return len(owned)
+
+    def _read_group(
+        self, name: str, groupname: str, consumername: str, count: int | None
+    ) -> list[tuple[str, dict[str, str]]]:
+        stream, group = self._group(name, groupname)
+        group.touch(consumername)
+
+        start = bisect.bisect_right(stream.ids, group.last_delivered)
+        ids = stream.ids[start : start + count if count else None]
+        if not ids:
+            return []
+
+        now = _now_ms()
+        for stream_id in ids:
+            group.pel[stream_id] = _Pending(consumer=consumername, delivered_at=now)
+        group.last_delivered = ids[-1]
+        group.entries_read += len(ids)
+        group.touch(consumername, active=True)
+        return [self._entry(stream, i) for i in ids]
+
+    async def xreadgroup(
+        self,
+        groupname: str,
+        consumername: str,
+        streams: dict[str, str],
+        count: int | None = None,
+        block: int | None = None,
+        noack: bool = False,
+    ) -> list[list[Any]]:
+        if any(self._str(i) != ">" for i in streams.values()):
+            raise NotImplementedError("Only '>' is supported by the memory backend")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + block / 1000 if block else None
+
+        while True:
+            response: list[list[Any]] = []
+            for name in streams:
+                entries = self._read_group(name, groupname, consumername, count)
+                if entries:
+                    if noack:
+                        _stream, group = self._group(name, groupname)
+                        for entry_id, _ in entries:
+                            group.pel.pop(_parse_id(entry_id), None)
+                    response.append([name, entries])
+
+            if response or block is None:
+                return response
+
+            remaining = deadline - loop.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return []
+
+            waiter = loop.create_future()
+            self._store.waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=remaining)
+            except TimeoutError:
+                return []
+            finally:
+                self._store.waiters.discard(waiter)
+
+    async def xack(self, name: str, groupname: str, *ids: str) -> int:
+        _stream, group = self._group(name, groupname)
+        return sum(
+            group.pel.pop(_parse_id(self._str(i)), None) is not None for i in ids
+        )
+
+    def _claim(
+        self, group: _Group, consumername: str, stream_id: StreamID, justid: bool
+    ):
+        pending = group.pel[stream_id]
+        pending.consumer = consumername
+        pending.delivered_at = _now_ms()
+        if not justid:
+            pending.delivery_count += 1
+        group.touch(consumername, active=True)
+
+    async def xclaim(
+        self,
+        name: str,
+        groupname: str,
+        consumername: str,
+        min_idle_time: int,
+        message_ids: list[str],
+        justid: bool = False,
+        **kwargs: Any,
+    ) -> list[Any]:
+        stream, group = self._group(name, groupname)
+        now = _now_ms()
+        claimed: list[Any] = []
+
+        for message_id in message_ids:
+            stream_id = _parse_id(self._str(message_id))
+            pending = group.pel.get(stream_id)
+            if pending is None or now - pending.delivered_at < min_idle_time:
+                continue
+            if stream_id not in stream.entries:
+                del group.pel[stream_id]
+                continue
+
+            self._claim(group, consumername, stream_id, justid)
+            claimed.append(
+                _format_id(stream_id) if justid else self._entry(stream, stream_id)
+            )
+
+        return claimed
+
+    async def xautoclaim(
+        self,
+        name: str,
+        groupname: str,
+        consumername: str,
+        min_idle_time: int,
+        start_id: str = "0-0",
+        count: int | None = None,
+        justid: bool = False,
+    ) -> list[Any]:
+        stream, group = self._group(name, groupname)
+        count = count or 100
+        now = _now_ms()
+        start = _parse_id(start_id)
+
+        claimed: list[Any] = []
+        deleted: list[str] = []
+        candidates = sorted(i for i in group.pel if i >= start)
+
+        for stream_id in candidates:
+            if len(claimed) >= count:
+                return [_format_id(stream_id), claimed, deleted]
+
+            if now - group.pel[stream_id].delivered_at < min_idle_time:
+                continue
+            if stream_id not in stream.entries:
+                del group.pel[stream_id]
+                deleted.append(_format_id(stream_id))
+                continue
+
+            self._claim(group, consumername, stream_id, justid)
+            claimed.append(
+                _format_id(stream_id) if justid else self._entry(stream, stream_id)
+            )
+
+        return ["0-0", claimed, deleted]
+
+    async def xpending(self, name: str, groupname: str) -> dict[str, Any]:
+        _stream, group = self._group(name, groupname)
+        if not group.pel:
+            return {"pending": 0, "min": None, "max": None, "consumers": []}
+
+        ids = sorted(group.pel)
+        consumers: dict[str, int] = {}
+        for pending in group.pel.values():
+            consumers[pending.consumer] = consumers.get(pending.consumer, 0) + 1
+
+        return {
+            "pending": len(ids),
+            "min": _format_id(ids[0]),
+            "max": _format_id(ids[-1]),
+            "consumers": [
+                {"name": consumer, "pending": pending}
+                for consumer, pending in consumers.items()
+            ],
+        }
+
+    async def xpending_range(
+        self,
+        name: str,
+        groupname: str,
+        min: str,
+        max: str,
+        count: int,
+        consumername: str | None = None,
+        idle: int | None = None,
+    ) -> list[dict[str, Any]]:
+        _stream, group = self._group(name, groupname)
+        start, end = self._range_bounds(min, max)
+        now = _now_ms()
+
+        result: list[dict[str, Any]] = []
+        for stream_id in sorted(group.pel):
+            pending = group.pel[stream_id]
+            if not start <= stream_id <= end:
+                continue
+            if consumername is not None and pending.consumer != consumername:
+                continue
+            if idle is not None and now - pending.delivered_at < idle:
+                continue
+
+            result.append(
+                {
+                    "message_id": _format_id(stream_id),
+                    "consumer": pending.consumer,
+                    "time_since_delivered": now - pending.delivered_at,
+                    "times_delivered": pending.delivery_count,
+                }
+            )
+            if len(result) >= count:
+                break
+
+        return result
+
+    async def xinfo_groups(self, name: str) -> list[dict[str, Any]]:
+        stream = self._stream(name)
+        return [
+            {
+                "name": groupname,
+                "consumers": len(group.consumers),
+                "pending": len(group.pel),
+                "last-delivered-id": _format_id(group.last_delivered),
+                "entries-read": group.entries_read,
+                "lag": len(stream.ids)
+                - bisect.bisect_right(stream.ids, group.last_delivered),
+            }
+            for groupname, group in stream.groups.items()
+        ]
+
+    async def xinfo_consumers(self, name: str, groupname: str) -> list[dict[str, Any]]:
+        _stream, group = self._group(name, groupname)
+        now = _now_ms()
+        pending: dict[str, int] = {}
+        for entry in group.pel.values():
+            pending[entry.consumer] = pending.get(entry.consumer, 0) + 1
+
+        return [
+            {
+                "name": consumer,
+                "pending": pending.get(consumer, 0),
+                "idle": now - seen,
+                "inactive": now - active if active >= 0 else -1,
+            }
+            for consumer, (seen, active) in group.consumers.items()
+        ]
+
+
+_store = MemoryStore()
+_clients: dict[str, MemoryRedis] = {}
+
+
+def get_client(encoding: str = "utf-8") -> MemoryRedis:
+    """返回共享同一份进程内数据的客户端."""
+    if encoding not in _clients:
+        _clients[encoding] = MemoryRedis(_store, encoding=encoding)
+    return _clients[encoding]
+
+
+def flushall():
+    """清空进程内数据, 用于测试之间的隔离."""
+    _store.data.clear()
+    _store.expires.clear()
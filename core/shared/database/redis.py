@@ -2,6 +2,7 @@ import redis.asyncio as redis
 from redis.asyncio.sentinel import Sentinel
 
 from core.config import env_helper
+from core.shared.database import memory
 
 
 sentinel_hosts = [
@@ -19,12 +20,20 @@ sentinel_client = Sentinel(
 )
 
 
-def get_client():
+def get_client(encoding: str = "utf-8"):
+    """
+    encoding 为 latin-1 时, 任意二进制值都能无损地解码为 str 并编码回原始字节.
+    REDIS_BACKEND 为 memory 时返回进程内实现, 用于本地基准测试与测试.
+    """
+    if env_helper.REDIS_BACKEND == "memory":
+        return memory.get_client(encoding=encoding)
+
     return sentinel_client.master_for(  # pyright: ignore[reportUnknownMemberType]
         service_name=env_helper.REDIS_MASTER_NAME,
         password=env_helper.REDIS_PASSWORD,
         db=int(env_helper.REDIS_DB),
         decode_responses=True,
+        encoding=encoding,
     )
 
 
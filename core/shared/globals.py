@@ -1,10 +1,41 @@
+from core.config import env_helper
 from core.shared.middleware.context import g
 from core.shared.components import RBroker
 from core.shared.components import RCacher
 from core.shared.components import RSession
 from core.shared.components import Agent
+from core.shared.components import RLease
+from core.shared.components import RCancelRegistry
+from core.shared.components import RLimiter, RLimiterPolicy
 
-broker = RBroker()
+lease = RLease()
+broker = RBroker(
+    lease=lease,
+    codec=env_helper.BROKER_CODEC,
+    retention_max_age=env_helper.BROKER_RETENTION_MAX_AGE,
+    retention_maxlen=env_helper.BROKER_RETENTION_MAXLEN,
+)
 cacher = RCacher()
+canceller = RCancelRegistry(channel="task-cancel")
+limiter = RLimiter(
+    prefix="llm-limiter",
+    policies={
+        name: RLimiterPolicy.model_validate(policy)
+        for name, policy in env_helper.LLM_LIMITS.items()
+    },
+    default_policy=RLimiterPolicy(
+        concurrency=env_helper.LLM_DEFAULT_CONCURRENCY,
+        tokens_per_minute=env_helper.LLM_DEFAULT_TOKENS_PER_MINUTE,
+    ),
+)
 
-__all__ = ["g", "broker", "cacher", "Agent", "RSession"]
+__all__ = [
+    "g",
+    "broker",
+    "cacher",
+    "lease",
+    "canceller",
+    "limiter",
+    "Agent",
+    "RSession",
+]